@@ -0,0 +1,549 @@
+# backend\asgi.py
+# ASGI Server: Starlette application serving the same API as run.py with async handlers. SQLite and aggregator work
+# runs on worker threads, bounded per endpoint class so a burst of slow reports never holds the threads the panels need.
+
+import os
+import sys
+import json
+import gzip
+import sqlite3
+import logging
+import contextlib
+import anyio
+import anyio.to_thread
+
+# Add project root to path for imports
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+# Worker threads per endpoint class (each holds at most one pooled reader at a time; fan-out reads go through the
+# shared query executor). Every class has its own limiter, so one class queueing up leaves the others untouched.
+ENDPOINT_CLASSES = {
+    "panels": int(os.environ.get('ASGI_PANEL_THREADS', 16)),  # summary, hourly, gaps, quantiles, stats, dashboard
+    "report": int(os.environ.get('ASGI_REPORT_THREADS', 2)),  # /api/report: the slowest endpoint
+    "map": int(os.environ.get('ASGI_MAP_THREADS', 4)),        # /api/zones payloads
+    "export": int(os.environ.get('ASGI_EXPORT_THREADS', 2)),  # /api/trips/export batches
+    "auth": int(os.environ.get('ASGI_AUTH_THREADS', 4)),      # password hashing is CPU-bound
+}
+# Enough readers for every class at full capacity plus the executor's fan-out, so threads never wait on the pool
+os.environ.setdefault('DB_QUERY_WORKERS', '8')
+os.environ.setdefault('DB_POOL_SIZE', str(sum(ENDPOINT_CLASSES.values()) + int(os.environ['DB_QUERY_WORKERS'])))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from backend.logic.aggregators import TripAggregator
+from backend.logic.cache import ResultCache
+from backend.logic.dashboard import DASHBOARD_PANELS, DEFAULT_PANELS
+from backend.logic.dimensions import DimensionCache
+from backend.logic.export import TripExporter, EXPORT_FORMATS, MAX_PAGE_SIZE, PAGE_SIZE
+from backend.logic.responses import CACHE_CONTROL, ResponseCache, encode_json, etag_matches
+from backend.security.auth_logic import AuthLogic
+from backend.security.validator import RequestValidator
+from backend.dal.connection import get_connection_pool
+from backend.dal.executor import get_query_executor
+from backend.etl.processing.zone_simplifier import ZONE_DETAIL_LEVELS
+
+# Configure Logging (same handlers as run.py)
+log_dir = os.path.join(PROJECT_ROOT, 'data', 'logs')
+os.makedirs(log_dir, exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(log_dir, 'app.log')),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("NYC-Taxi-API")
+FRONTEND_DIR = os.path.join(PROJECT_ROOT, 'frontend')
+
+tokens = {} # In-memory token storage (resets on restart)
+
+# Result cache for every aggregator-backed endpoint; emptied whenever the ETL commits new data
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 512)),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MB', 32)) * 1024 * 1024,
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 300)),
+    version=TripAggregator.data_version
+)
+
+# Encoded and compressed bodies of recent responses, by ETag
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MB', 16)) * 1024 * 1024
+)
+
+# Precomputed map payloads, memoized per (level, format) and invalidated by etag
+zone_payload_cache = {}
+
+# Created on first use, inside the worker's event loop
+limiters = {}
+
+
+def get_limiter(endpoint_class):
+    limiter = limiters.get(endpoint_class)
+    if limiter is None:
+        limiter = limiters[endpoint_class] = anyio.CapacityLimiter(ENDPOINT_CLASSES[endpoint_class])
+    return limiter
+
+
+def json_response(body, status=200, headers=None):
+    return Response(body, status_code=status, headers=headers, media_type='application/json' if status != 304 else None)
+
+
+def error_response(message, status):
+    return json_response(encode_json({"error": message}), status)
+
+
+async def cached_response(request, endpoint_class, name, filters, compute, *args, part=None, missing=None):
+    """
+    JSON response for a result_cache entry (or its `part` key) with a weak ETag from the data version and the
+    canonical filters, as run.py's cached_response. The version check, any computation, encoding and compression
+    run on a worker thread of the endpoint class, so the event loop only moves bytes.
+    """
+    status, body, headers = await anyio.to_thread.run_sync(lambda: response_cache.respond(
+        result_cache, name, filters, compute, *args, part=part, missing=missing,
+        cache_control=CACHE_CONTROL[endpoint_class],
+        if_none_match=request.headers.get('if-none-match'),
+        accept_encoding=request.headers.get('accept-encoding')
+    ), limiter=get_limiter(endpoint_class))
+    return json_response(body, status, headers)
+
+
+def request_filters(request, scoped=True):
+    """Date filters, plus borough and zone_id for the endpoints that take a spatial scope"""
+    filters = {
+        "start_date": request.query_params.get('start_date'),
+        "end_date": request.query_params.get('end_date'),
+    }
+    if scoped:
+        filters["borough"] = request.query_params.get('borough', 'all')
+        filters["zone_id"] = request.query_params.get('zone_id')
+    return filters
+
+
+def date_error(request):
+    """400 response for a malformed start_date/end_date, as run.py's date_error, else None"""
+    valid, message = RequestValidator.validate_date_params(request.query_params)
+    return None if valid else error_response(message, 400)
+
+
+def approx_requested(request):
+    """?approx=true answers from the stratified trip sample, with confidence intervals (exact by default)"""
+    return request.query_params.get('approx', '').lower() in ('1', 'true', 'yes')
+
+
+def cached_endpoint(name, endpoint_class, compute, approx=False, part=None):
+    """
+    Handler for a result-cached aggregator endpoint: compute(filters, approx) is cached under name (with the
+    approx flag as a key argument when the endpoint takes ?approx) and the response is its `part` key, if given
+    """
+    async def handler(request):
+        invalid = date_error(request)
+        if invalid:
+            return invalid
+        filters = request_filters(request)
+        use_approx = approx and approx_requested(request)
+        try:
+            return await cached_response(
+                request, endpoint_class, name, filters, lambda: compute(filters, use_approx),
+                *((use_approx,) if approx else ()), part=part
+            )
+        except Exception as e:
+            return error_response(str(e), 500)
+    return handler
+
+
+# --- Frontend ---
+
+async def index(request):
+    return FileResponse(os.path.join(FRONTEND_DIR, 'index.html'))
+
+
+async def dashboard(request):
+    return FileResponse(os.path.join(FRONTEND_DIR, 'dashboard.html'))
+
+
+# --- Auth ---
+
+def _signup(email, password):
+    hashed_password = AuthLogic.hash_password(password)
+    try:
+        with get_connection_pool().writer() as conn:
+            conn.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (email, hashed_password))
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def _login(email, password):
+    with get_connection_pool().connect() as conn:
+        row = conn.execute("SELECT password_hash FROM users WHERE email = ?", (email,)).fetchone()
+    return bool(row) and AuthLogic.verify_password(password, row[0])
+
+
+async def _json_body(request):
+    """Parsed JSON body, or None when it is not valid JSON (Flask's get_json answers that with a 400)"""
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+async def signup(request):
+    data = await _json_body(request)
+    if data is None:
+        return error_response("Request body must be valid JSON", 400)
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return error_response("Email and password are required", 400)
+    try:
+        created = await anyio.to_thread.run_sync(_signup, email, password, limiter=get_limiter("auth"))
+    except Exception as e:
+        return error_response(str(e), 500)
+    if not created:
+        return error_response("User already exists", 409)
+    return json_response(encode_json({"message": "User created successfully"}), 201)
+
+
+async def login(request):
+    data = await _json_body(request)
+    if data is None:
+        return error_response("Request body must be valid JSON", 400)
+    email = data.get('email')
+    password = data.get('password')
+
+    try:
+        valid = await anyio.to_thread.run_sync(_login, email, password, limiter=get_limiter("auth"))
+    except Exception as e:
+        return error_response(str(e), 500)
+    if not valid:
+        return error_response("Invalid credentials", 401)
+    token = AuthLogic.generate_token()
+    tokens[token] = email # Store session
+    return json_response(encode_json({"token": token, "email": email}), headers={"Cache-Control": CACHE_CONTROL["auth"]})
+
+
+async def health_check(request):
+    threads = {}
+    for endpoint_class, total in ENDPOINT_CLASSES.items():
+        stats = get_limiter(endpoint_class).statistics()
+        threads[endpoint_class] = {"busy": stats.borrowed_tokens, "limit": total, "waiting": stats.tasks_waiting}
+    return json_response(encode_json({
+        "status": "healthy",
+        "service": "NYC Taxi API",
+        "server": "asgi",
+        "threads": threads,
+        "db_pool": get_connection_pool().stats(),
+        "query_executor": get_query_executor().stats(),
+        "result_cache": result_cache.stats(),
+        "response_cache": response_cache.stats()
+    }), headers={"Cache-Control": CACHE_CONTROL["health"]})
+
+
+# --- Aggregator endpoints ---
+
+get_trip_summary = cached_endpoint(
+    "global_summary", "panels", lambda f, approx: TripAggregator.get_global_summary(f, approx=approx),
+    approx=True, part='summary'
+)
+get_hourly_activity = cached_endpoint(
+    "hourly_stats", "panels", lambda f, approx: TripAggregator.get_hourly_stats(f, approx=approx), approx=True
+)
+get_coverage_gaps = cached_endpoint(
+    "coverage_gaps", "panels", lambda f, approx: TripAggregator.get_coverage_gaps(f, approx=approx), approx=True
+)
+get_trip_quantiles = cached_endpoint("quantiles", "panels", lambda f, approx: TripAggregator.get_quantiles(f))
+get_report = cached_endpoint("detailed_report", "report", lambda f, approx: TripAggregator.get_detailed_report(f))
+
+
+async def get_congestion_report(request):
+    """Congestion index, citywide over all dates (shares the summary's cache entry)"""
+    filters = {"borough": "all"}
+    try:
+        return await cached_response(
+            request, "panels", "global_summary", filters, lambda: TripAggregator.get_global_summary(filters), False,
+            part='congestion'
+        )
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_dashboard(request):
+    """Several panels for one filter set from shared scans (?panels=summary,hourly,gaps,revenue,...)"""
+    invalid = date_error(request)
+    if invalid:
+        return invalid
+    filters = request_filters(request)
+    requested = request.query_params.get('panels')
+    panels = [p.strip() for p in requested.split(',') if p.strip()] if requested else list(DEFAULT_PANELS)
+    unknown = [p for p in panels if p not in DASHBOARD_PANELS]
+    if unknown:
+        return error_response(f"Unknown panels: {', '.join(unknown)}. Choose from {', '.join(DASHBOARD_PANELS)}", 400)
+    try:
+        return await cached_response(
+            request, "panels", "dashboard", filters, lambda: TripAggregator.get_dashboard(filters, panels),
+            tuple(sorted(set(panels)))
+        )
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def _export_chunks(fmt, filters, after_id, limit):
+    """TripExporter.stream() with every batch read and encoded on an export thread; no thread waits on the client"""
+    chunks = TripExporter.stream(fmt, filters, after_id, limit)
+    limiter = get_limiter("export")
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, chunks, None, limiter=limiter)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # A client that disconnects cancels this task mid-stream: close the batch generator right away (shielded,
+        # so the cancellation doesn't skip it) instead of leaving its cursor state to the garbage collector
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(chunks.close)
+
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse that closes its body iterator when streaming stops, including on a client disconnect
+    (Starlette cancels the stream task and would otherwise leave the generator suspended until it is collected)"""
+
+    async def stream_response(self, send):
+        try:
+            await super().stream_response(send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+
+async def export_trips(request):
+    """
+    Raw trips for the date/borough/zone filters: ?format=csv|ndjson streams them in keyset batches (optional ?limit
+    caps the rows), ?format=json returns one page of ?limit rows with a next_cursor to pass back as ?cursor=
+    """
+    valid, message = RequestValidator.validate_export_params(request.query_params, EXPORT_FORMATS, MAX_PAGE_SIZE)
+    if not valid:
+        return error_response(message, 400)
+    filters = request_filters(request)
+    fmt = request.query_params.get('format', 'csv')
+    limit = int(request.query_params['limit']) if request.query_params.get('limit') else None
+    cursor = request.query_params.get('cursor')
+    try:
+        after_id = TripExporter.decode_cursor(cursor, filters) if cursor else 0
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    headers = {"Cache-Control": CACHE_CONTROL["export"]}
+    if fmt == 'json':
+        try:
+            body = await anyio.to_thread.run_sync(
+                lambda: encode_json(TripExporter.page(filters, cursor, limit or PAGE_SIZE)), limiter=get_limiter("export")
+            )
+        except Exception as e:
+            return error_response(str(e), 500)
+        return json_response(body, headers=headers)
+    headers["Content-Disposition"] = f"attachment; filename=trips.{fmt}"
+    return ExportResponse(_export_chunks(fmt, filters, after_id, limit), media_type=EXPORT_FORMATS[fmt], headers=headers)
+
+
+async def get_borough_stats(request):
+    borough = request.path_params['borough']
+    invalid = date_error(request)
+    if invalid:
+        return invalid
+    filters = request_filters(request, scoped=False)
+    approx = approx_requested(request)
+    try:
+        return await cached_response(
+            request, "panels", "borough_stats", filters,
+            lambda: TripAggregator.get_borough_stats(borough, filters, approx=approx), borough, approx
+        )
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_zone_stats(request):
+    zone_id = request.path_params['zone_id']
+    invalid = date_error(request)
+    if invalid:
+        return invalid
+    filters = request_filters(request, scoped=False)
+    approx = approx_requested(request)
+    try:
+        return await cached_response(
+            request, "panels", "zone_stats", filters,
+            lambda: TripAggregator.get_zone_stats(zone_id, filters, approx=approx), zone_id, approx,
+            missing="Zone not found"
+        )
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+# --- Map payloads ---
+
+def _zone_payload(level, fmt, if_none_match=None, accept_encoding=None):
+    """
+    ('payload', etag, gzip bytes) from zone_payloads, ('legacy', (status, body, headers)) from the raw geometry
+    without them, or None for TopoJSON without payloads
+    """
+    conn = get_connection_pool().connect()
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT etag FROM zone_payloads WHERE level = ? AND format = ?", (level, fmt))
+            row = cur.fetchone()
+        except sqlite3.OperationalError:
+            row = None # Database created before zone_payloads existed
+
+        if row:
+            etag = row[0]
+            cached = zone_payload_cache.get((level, fmt))
+            if not cached or cached[0] != etag:
+                cur.execute("SELECT payload FROM zone_payloads WHERE level = ? AND format = ?", (level, fmt))
+                cached = (etag, bytes(cur.fetchone()[0]))
+                zone_payload_cache[(level, fmt)] = cached
+            return ("payload",) + cached
+
+        if fmt == 'topojson':
+            return None
+
+        # Legacy path: full-precision geometry, serialized once per zones_version
+        def legacy_zones():
+            cur.execute("SELECT location_id, borough, zone, geojson FROM taxi_zones")
+            return [
+                {"id": r[0], "borough": r[1], "zone": r[2], "geometry": json.loads(r[3]) if r[3] else None}
+                for r in cur.fetchall()
+            ]
+
+        etag = ResponseCache.etag(DimensionCache.zones_version(cur), "zones")
+        return "legacy", response_cache.conditional(
+            etag, legacy_zones, CACHE_CONTROL["map"], if_none_match=if_none_match, accept_encoding=accept_encoding
+        )
+    finally:
+        conn.close()
+
+
+async def get_zones(request):
+    """
+    Spatial data for the map. ?level=0..3 picks a simplification level (0 = full detail),
+    ?format=geojson|topojson. Serves the gzip payload precomputed by the ETL as-is.
+    """
+    levels = [detail['level'] for detail in ZONE_DETAIL_LEVELS]
+    try:
+        level = int(request.query_params.get('level', 0))
+    except ValueError:
+        level = None
+    if level not in levels:
+        return error_response(f"level must be one of {', '.join(map(str, levels))}", 400)
+    fmt = request.query_params.get('format', 'geojson')
+    if fmt not in ('geojson', 'topojson'):
+        return error_response("format must be 'geojson' or 'topojson'", 400)
+    try:
+        found = await anyio.to_thread.run_sync(
+            _zone_payload, level, fmt, request.headers.get('if-none-match'), request.headers.get('accept-encoding'),
+            limiter=get_limiter("map")
+        )
+    except Exception as e:
+        return error_response(str(e), 500)
+    if found is None:
+        return error_response("TopoJSON payloads have not been built; run the ETL pipeline", 404)
+    if found[0] == "legacy":
+        status, body, headers = found[1]
+        return json_response(body, status, headers)
+    return await _zone_payload_response(request, *found[1:])
+
+
+async def _zone_payload_response(request, etag, payload):
+    """Stored gzip bytes go out untouched; only clients without gzip support get them inflated"""
+    headers = {"Vary": "Accept-Encoding", "ETag": f'"{etag}"', "Cache-Control": CACHE_CONTROL["map"]}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload, media_type='application/json', headers=headers)
+    body = await anyio.to_thread.run_sync(gzip.decompress, payload, limiter=get_limiter("map"))
+    return Response(body, media_type='application/json', headers=headers)
+
+
+class RequestLogMiddleware:
+    """Logs every HTTP request like run.py's before_request hook"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            logger.info(f"Request: {scope['method']} {scope['path']} {scope['query_string'].decode()}")
+        await self.app(scope, receive, send)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    for endpoint_class in ENDPOINT_CLASSES:
+        get_limiter(endpoint_class)
+    get_connection_pool()
+    logger.info(f"ASGI worker {os.getpid()} ready: threads {ENDPOINT_CLASSES}")
+    yield
+    # The server has stopped accepting requests and drained the in-flight ones (or hit its grace timeout)
+    get_query_executor().close()
+    get_connection_pool().close()
+    logger.info(f"ASGI worker {os.getpid()} stopped")
+
+
+routes = [
+    Route('/', index),
+    Route('/dashboard', dashboard),
+    Route('/api/auth/signup', signup, methods=['POST']),
+    Route('/api/auth/login', login, methods=['POST']),
+    Route('/api/health', health_check),
+    Route('/api/trips/summary', get_trip_summary),
+    Route('/api/trips/revenue', get_congestion_report),
+    Route('/api/trips/hourly', get_hourly_activity),
+    Route('/api/trips/gaps', get_coverage_gaps),
+    Route('/api/trips/quantiles', get_trip_quantiles),
+    Route('/api/trips/export', export_trips),
+    Route('/api/dashboard', get_dashboard),
+    Route('/api/boroughs/{borough}/stats', get_borough_stats),
+    Route('/api/report', get_report),
+    Route('/api/zones', get_zones),
+    Route('/api/zones/{zone_id:int}/stats', get_zone_stats),
+    Mount('/', StaticFiles(directory=FRONTEND_DIR)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]), # As flask_cors
+        Middleware(RequestLogMiddleware),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the API with uvicorn worker processes")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ASGI_WORKERS', os.cpu_count() or 1)),
+                        help="Worker processes; each has its own pool, executor, caches and limiters")
+    parser.add_argument('--grace', type=int, default=int(os.environ.get('ASGI_GRACEFUL_TIMEOUT', 30)),
+                        help="Seconds in-flight requests get to finish on shutdown")
+    args = parser.parse_args()
+
+    logger.info("Starting NYC Taxi API Server (ASGI)...")
+    uvicorn.run(
+        "backend.asgi:app", app_dir=PROJECT_ROOT, host=args.host, port=args.port, workers=args.workers,
+        timeout_graceful_shutdown=args.grace, access_log=False, lifespan="on"
+    )
@@ -0,0 +1,226 @@
+# backend\dal\connection.py
+# Connection Manager: Process-wide SQLite connection pool for the API. Read-only connections are opened once,
+# tuned once and reused across requests; writes go through one separate, serialized read-write connection.
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+import contextlib
+from urllib.request import pathname2url
+
+# TAXI_DB_PATH points the API at another database file (e.g. the seeded one in dal/query_plans.py)
+DB_PATH = os.environ.get('TAXI_DB_PATH') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db'
+)
+
+# Applied once per reader connection (negative cache_size is KiB)
+READ_PRAGMAS = [
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA query_only = ON",
+]
+WRITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+]
+
+
+class PooledConnection:
+    """A checked-out reader: behaves like sqlite3.Connection, but close() returns it to the pool"""
+
+    __slots__ = ('_conn', '_pool')
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection returned to the pool.")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool._release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Up to `size` read-only (mode=ro) connections, created lazily and handed out LIFO so the
+    warmest page cache is reused. When all are busy a request waits up to `overflow_wait` seconds
+    for one, then opens a temporary unpooled reader that is closed on release: a burst beyond the
+    pool (e.g. Flask's threaded dev server) runs slower instead of failing.
+    Nested checkouts on one thread (an aggregator calling another) share that thread's connection,
+    so a full pool can never deadlock on itself.
+    """
+
+    def __init__(self, db_path=DB_PATH, size=8, timeout=30, cached_statements=256, overflow_wait=0.5):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.overflow_wait = overflow_wait
+        self.cached_statements = cached_statements
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._stats = {
+            "opened": 0, "open": 0, "in_use": 0, "acquired": 0, "reused": 0,
+            "waits": 0, "wait_seconds": 0.0, "discarded": 0, "writes": 0, "overflow": 0
+        }
+
+    def _open_reader(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(
+            uri, uri=True, timeout=self.timeout, check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connect(self):
+        """Checks out a reader; close() it (or use `with`) to give it back"""
+        if getattr(self._local, 'depth', 0):
+            self._local.depth += 1
+            with self._lock:
+                self._stats["acquired"] += 1
+                self._stats["reused"] += 1
+            return PooledConnection(self._local.conn, self)
+
+        reused, overflow = True, False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                reused = self._stats["open"] >= self.size
+                if not reused:
+                    self._stats["open"] += 1
+            if reused:
+                start = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.overflow_wait)
+                except queue.Empty:
+                    conn, reused, overflow = self._open_reader(), False, True
+                with self._lock:
+                    self._stats["waits"] += 1
+                    self._stats["wait_seconds"] += time.perf_counter() - start
+                    self._stats["overflow"] += overflow
+            else:
+                try:
+                    conn = self._open_reader()
+                except Exception:
+                    with self._lock:
+                        self._stats["open"] -= 1
+                    raise
+                with self._lock:
+                    self._stats["opened"] += 1
+
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["acquired"] += 1
+            self._stats["reused"] += reused
+        self._local.conn, self._local.depth, self._local.overflow = conn, 1, overflow
+        return PooledConnection(conn, self)
+
+    def held(self):
+        """True while the calling thread has a reader checked out (nested work should reuse it)"""
+        return bool(getattr(self._local, 'depth', 0))
+
+    def _release(self, conn):
+        self._local.depth -= 1
+        if self._local.depth:
+            return # Still used by an outer checkout on this thread
+        self._local.conn = None
+        if self._local.overflow:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            conn.close() # Temporary reader opened past the pool size
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Unusable connection: drop it so the slot is reopened on demand
+            with self._lock:
+                self._stats["in_use"] -= 1
+                self._stats["open"] -= 1
+                self._stats["discarded"] += 1
+            conn.close()
+            return
+        with self._lock:
+            self._stats["in_use"] -= 1
+        self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def writer(self):
+        """The single read-write connection, one user at a time; commits on success, rolls back on error"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+                for pragma in WRITE_PRAGMAS:
+                    self._writer.execute(pragma)
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+            finally:
+                self._stats["writes"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        stats["avg_wait_ms"] = round(stats.pop("wait_seconds") / stats["waits"] * 1000, 3) if stats["waits"] else 0.0
+        stats["writer_open"] = self._writer is not None
+        return stats
+
+    def close(self):
+        """Closes idle readers and the writer (checked-out readers are closed when returned)"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._stats["open"] -= 1
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(db_path=None):
+    """Process-wide pool per database file (rebuilt in a forked worker, never shared across processes)"""
+    db_path = db_path or DB_PATH
+    pool = _pools.get(db_path)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None or pool.pid != os.getpid():
+                pool = ConnectionPool(
+                    db_path,
+                    size=int(os.environ.get('DB_POOL_SIZE', 8)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+                    overflow_wait=float(os.environ.get('DB_POOL_OVERFLOW_WAIT', 0.5))
+                )
+                _pools[db_path] = pool
+    return pool
@@ -0,0 +1,162 @@
+# backend\dal\executor.py
+# Query Executor: Fans the independent read queries of one request out over a thread pool, each on its own
+# pooled read-only connection (SQLite releases the GIL while it steps a statement), and gathers the results
+# with per-query timings.
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend.dal.connection import DB_PATH, get_connection_pool
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from dal.connection import DB_PATH, get_connection_pool
+
+
+class QueryResults(dict):
+    """{name: result} of one QueryExecutor.run(), with .timings ({name: seconds}) and .elapsed (wall seconds)"""
+
+    def __init__(self):
+        super().__init__()
+        self.timings = {}
+        self.elapsed = 0.0
+        self.parallel = False
+
+
+class QueryExecutor:
+    """
+    Runs the independent read queries of one request concurrently: run({name: query}) -> QueryResults.
+    A query is either (sql, params), whose rows are fetched, or a callable taking a connection.
+    Each query checks out its own pooled reader, so the batch takes about as long as its slowest query
+    instead of the sum. The batch runs inline, in order, when there is nothing to overlap or when the
+    calling thread already holds a reader (an aggregator nested in another, or a traced connection):
+    the queries then share that connection, and a caller waiting on workers never pins a pool slot.
+    """
+
+    def __init__(self, pool=None, max_workers=4):
+        self.pool = pool or get_connection_pool()
+        self.max_workers = max_workers
+        self._threads = ThreadPoolExecutor(max_workers, thread_name_prefix="query") if max_workers > 1 else None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "parallel_batches": 0, "queries": 0, "query_seconds": 0.0, "wall_seconds": 0.0}
+
+    def _run_one(self, query):
+        start = time.perf_counter()
+        conn = self.pool.connect()
+        try:
+            result = query(conn) if callable(query) else conn.execute(*query).fetchall()
+        finally:
+            conn.close()
+        return result, time.perf_counter() - start
+
+    def run(self, queries):
+        start = time.perf_counter()
+        results = QueryResults()
+        results.parallel = self._threads is not None and len(queries) > 1 and not self.pool.held()
+        if results.parallel:
+            futures = {name: self._threads.submit(self._run_one, query) for name, query in queries.items()}
+            for name, future in futures.items():
+                results[name], results.timings[name] = future.result()
+        else:
+            for name, query in queries.items():
+                results[name], results.timings[name] = self._run_one(query)
+        results.elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["parallel_batches"] += results.parallel
+            self._stats["queries"] += len(queries)
+            self._stats["query_seconds"] += sum(results.timings.values())
+            self._stats["wall_seconds"] += results.elapsed
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        query_seconds, wall_seconds = stats.pop("query_seconds"), stats.pop("wall_seconds")
+        stats["workers"] = self.max_workers
+        stats["avg_batch_ms"] = round(wall_seconds / stats["batches"] * 1000, 3) if stats["batches"] else 0.0
+        # Sum of query times over wall time: 1.0 = no overlap
+        stats["overlap"] = round(query_seconds / wall_seconds, 2) if wall_seconds else 0.0
+        return stats
+
+    def close(self):
+        """Lets queued batches finish, then stops the worker threads (graceful server shutdown)"""
+        if self._threads is not None:
+            self._threads.shutdown(wait=True)
+            self._threads = None
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_query_executor(db_path=None):
+    """Process-wide executor per database file (its threads are never shared with a forked worker)"""
+    db_path = db_path or DB_PATH
+    key = (db_path, os.getpid())
+    executor = _executors.get(key)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(key)
+            if executor is None:
+                executor = QueryExecutor(
+                    get_connection_pool(db_path), max_workers=int(os.environ.get('DB_QUERY_WORKERS', 4))
+                )
+                _executors[key] = executor
+    return executor
+
+
+if __name__ == "__main__":
+    # Benchmark: the multi-query aggregators with their reads in sequence vs fanned out over the pool
+    import argparse
+    import statistics
+    import dal.executor as shared
+    from logic.aggregators import TripAggregator
+
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent sub-queries per endpoint")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per call and mode")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DB_QUERY_WORKERS', 4)))
+    args = parser.parse_args()
+
+    class RecordingExecutor(shared.QueryExecutor):
+        """Keeps the QueryResults of every batch for the report below"""
+        batches = []
+
+        def run(self, queries):
+            results = super().run(queries)
+            self.batches.append(results)
+            return results
+
+    pool = shared.get_connection_pool()
+    modes = {
+        "sequential": RecordingExecutor(pool, max_workers=1),
+        "concurrent": RecordingExecutor(pool, max_workers=args.workers),
+    }
+    filters = {"start_date": "2019-01-02", "end_date": "2019-01-20"}
+    calls = [
+        ("borough Manhattan", lambda: TripAggregator.get_borough_stats("Manhattan", dict(filters))),
+        ("borough all", lambda: TripAggregator.get_borough_stats("all", dict(filters))),
+        ("zone 161", lambda: TripAggregator.get_zone_stats(161, dict(filters))),
+        ("report Queens", lambda: TripAggregator.get_detailed_report(dict(filters, borough="Queens"))),
+        ("report zone 161", lambda: TripAggregator.get_detailed_report(dict(filters, borough="all", zone_id="161"))),
+    ]
+    for name, call in calls:
+        line = []
+        for mode, executor in modes.items():
+            shared._executors[(shared.DB_PATH, os.getpid())] = executor
+            call()  # Warm up connections and page cache
+            walls, batches = [], []
+            for _ in range(args.runs):
+                del executor.batches[:]
+                start = time.perf_counter()
+                call()
+                walls.append(time.perf_counter() - start)
+                batches.append(executor.batches[-1])
+            wall = statistics.median(walls)
+            timings = batches[walls.index(sorted(walls)[len(walls) // 2])].timings
+            line.append(f"{mode} {wall * 1000:7.1f} ms")
+        print(f"{name:18} {' | '.join(line)} | sub-queries: sum {sum(timings.values()) * 1000:.1f} ms, "
+              f"slowest {max(timings.values()) * 1000:.1f} ms ({max(timings, key=timings.get)})")
@@ -4,11 +4,11 @@
 import sqlite3
 import os
 
-def init_db():
+def init_db(db_path=None):
     try:
         # Define paths
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        db_path = os.path.join(base_dir, 'database', 'taxi_data.db')
+        db_path = db_path or os.path.join(base_dir, 'database', 'taxi_data.db')
         schema_path = os.path.join(base_dir, 'database', 'schema.sql')
 
         print(f"Initializing SQLite database at: {db_path}")
@@ -0,0 +1,187 @@
+# backend\dal\query_plans.py
+# Query-Plan Regression Check: Seeds a throwaway database from schema.sql, runs every aggregator query shape
+# with the SQL traced, and fails when EXPLAIN QUERY PLAN shows a full fact-table scan, a non-covering trips
+# lookup or a temp B-tree the shape has not been declared to need.
+
+import os
+import re
+import sys
+import sqlite3
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Allow running as a script (python backend/dal/query_plans.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FACT_TABLES = ('trips', 'trip_rollups')
+BOROUGHS = ['EWR', 'Queens', 'Bronx', 'Manhattan', 'Staten Island', 'Brooklyn']
+JAN_2019 = 429528 # pickup_time_id of 2019-01-01 00:00 (hours since the epoch)
+
+# Filter combinations the dashboard sends
+FILTERS = {
+    "all": {"borough": "all"},
+    "dates": {"borough": "all", "start_date": "2019-01-05", "end_date": "2019-01-12"},
+    "borough": {"borough": "Manhattan", "start_date": "2019-01-05", "end_date": "2019-01-12"},
+    "zone": {"borough": "all", "zone_id": 12, "start_date": "2019-01-05", "end_date": "2019-01-12"},
+}
+
+# (shape, call, temp B-trees it may use per fact source). Declared temp B-trees are the ones no index
+# can remove: ranking aggregated groups (ORDER BY trip_count/ratio), hour-of-day buckets, and grouping
+# by zone the rows a pickup_time_id range seek returned (at most one group per zone).
+SHAPES = [
+    ("summary", lambda T, f: T.get_global_summary(dict(f)),
+     {"trip_rollups": {"GROUP BY"}, "trips": {"GROUP BY"}}),
+    ("hourly", lambda T, f: T.get_hourly_stats(dict(f)),
+     {"trip_rollups": {"GROUP BY"}, "trips": {"GROUP BY"}}),
+    ("gaps", lambda T, f: T.get_coverage_gaps(dict(f)),
+     {"trip_rollups": {"GROUP BY", "ORDER BY"}, "trips": {"GROUP BY", "ORDER BY"}}),
+    ("report", lambda T, f: T.get_detailed_report(dict(f)),
+     {"trip_rollups": {"GROUP BY", "ORDER BY"}, "trips": {"GROUP BY", "ORDER BY"}}),
+    ("borough", lambda T, f: T.get_borough_stats(f["borough"], dict(f)),
+     {"trip_rollups": {"GROUP BY", "ORDER BY"}, "trips": {"GROUP BY", "ORDER BY"}}),
+    ("zone_stats", lambda T, f: T.get_zone_stats(12, dict(f)),
+     {"trip_rollups": set(), "trips": set()}),
+    ("quantiles", lambda T, f: T.get_quantiles(dict(f), exact=True),
+     {"trip_rollups": set(), "trips": set()}),
+]
+
+
+def seed_database(db_path, trips=50000, seed=0):
+    """Schema + 263 zones + a month of synthetic trips (rollups maintained by the normal write path)"""
+    from dal.init_db import init_db
+    from dal.trip_dal import TripDAL
+
+    init_db(db_path)
+    rng = np.random.default_rng(seed)
+    dal = TripDAL(db_path)
+    dal.insert_zones([
+        {"attributes": {"LocationID": i, "borough": BOROUGHS[i % len(BOROUGHS)], "zone": f"Zone {i}"}, "geometry": None}
+        for i in range(1, 264)
+    ])
+    time_id = JAN_2019 + rng.integers(0, 31 * 24, trips)
+    # Skewed, unrelated pickup and dropoff popularity (as in real data), so some zones are coverage gaps
+    popularity = lambda: rng.permutation(1.0 / np.arange(1, 264) ** 0.8)
+    pu_weights, do_weights = popularity(), popularity()
+    frame = pd.DataFrame({
+        'VendorID': rng.integers(1, 3, trips), 'passenger_count': rng.integers(1, 6, trips),
+        'trip_distance': rng.exponential(3, trips).round(2), 'RatecodeID': 1, 'payment_type': rng.integers(1, 5, trips),
+        'fare_amount': rng.uniform(3, 60, trips).round(2), 'total_amount': rng.uniform(5, 80, trips).round(2),
+        'PULocationID': rng.choice(np.arange(1, 264), trips, p=pu_weights / pu_weights.sum()),
+        'DOLocationID': rng.choice(np.arange(1, 264), trips, p=do_weights / do_weights.sum()),
+        'speed_mph': rng.uniform(1, 90, trips), 'trip_duration_seconds': rng.integers(60, 3600, trips).astype(float),
+        'pickup_hour': time_id % 24, 'pickup_time_id': time_id, 'dropoff_time_id': time_id,
+    })
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ingestion_manifest (source_path, fingerprint) VALUES ('seed', 'seed')")
+    conn.commit()
+    conn.close()
+    dal.commit_chunk('seed', 0, trips, frame)
+    dal.ensure_rollups()
+    dal.ensure_sketches()
+
+
+def fact_aliases(sql):
+    """{name or alias: fact table} for the fact tables a statement reads"""
+    aliases = {}
+    for table, alias in re.findall(r"(?:FROM|JOIN)\s+(trips|trip_rollups)\b(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'JOIN', 'GROUP', 'ORDER', 'LEFT', 'INNER', 'ON', 'LIMIT'):
+            aliases[alias] = table
+    return aliases
+
+
+def check_plan(sql, plan, aliases, allowed, filtered):
+    """
+    Problems in one statement's plan. allowed = temp B-tree kinds declared for the shape;
+    filtered = the call had a date/zone filter, so fact tables must be searched, not scanned.
+    A single-zone trips filter must be part of the index seek (zone, pickup_time_id).
+    """
+    problems = []
+    if "trips" in aliases.values():
+        for column in re.findall(r"\b(pickup_location_id|dropoff_location_id) = \d+", sql):
+            if not any(line.startswith("SEARCH") and f"({column}=?" in line for line in plan):
+                problems.append(f"{column} filter is not an index seek: {' | '.join(plan)}")
+    for line in plan:
+        scan = re.match(r"(SCAN|SEARCH) (\w+)(.*)", line)
+        if scan and scan.group(2) in aliases:
+            how = scan.group(3)
+            if scan.group(1) == "SCAN" and ("USING" not in how or filtered):
+                problems.append(f"full scan of {aliases[scan.group(2)]}: {line}")
+            elif aliases[scan.group(2)] == "trips" and "COVERING INDEX" not in how:
+                problems.append(f"trips rows read through the table, not a covering index: {line}")
+        temp = re.match(r"USE TEMP B-TREE FOR (.*)", line)
+        if temp:
+            kind = "GROUP BY" if "GROUP BY" in temp.group(1) else "ORDER BY" if "ORDER BY" in temp.group(1) else temp.group(1)
+            if kind not in allowed:
+                problems.append(f"undeclared temp B-tree: {line}")
+    return problems
+
+
+def run_checks(db_path, verbose=False):
+    """Runs every shape x filter on rollups and on the trips fallback; returns the failures"""
+    os.environ['TAXI_DB_PATH'] = db_path
+    from logic.aggregators import TripAggregator
+    TripAggregator.backend = 'sql'
+
+    writer = sqlite3.connect(db_path)
+    explain = sqlite3.connect(db_path)
+    failures, checked = [], 0
+    original = writer.execute("SELECT value FROM etl_state WHERE key = 'rollups_ready'").fetchone()
+    try:
+        for source, ready in (("trip_rollups", '1'), ("trips", '0')):
+            writer.execute("UPDATE etl_state SET value = ? WHERE key = 'rollups_ready'", (ready,))
+            writer.commit()
+            for shape, call, allowances in SHAPES:
+                for filter_name, filters in FILTERS.items():
+                    # Nested checkouts share this connection, so the trace sees every statement of the call
+                    conn = TripAggregator.connect()
+                    statements = []
+                    conn.set_trace_callback(statements.append)
+                    try:
+                        call(TripAggregator, filters)
+                    finally:
+                        conn.set_trace_callback(None)
+                        conn.close()
+                    for sql in statements:
+                        if not re.match(r"\s*(SELECT|WITH)\b", sql, re.I):
+                            continue
+                        aliases = fact_aliases(sql)
+                        if not aliases:
+                            continue
+                        plan = [row[3] for row in explain.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                        checked += 1
+                        label = f"[{source}] {shape}/{filter_name}"
+                        if verbose:
+                            print(f"{label}: {' '.join(sql.split())[:160]}")
+                            for line in plan:
+                                print(f"    {line}")
+                        filtered = filter_name != "all"
+                        for problem in check_plan(sql, plan, aliases, allowances[source], filtered):
+                            failures.append(f"{label}: {problem}\n    {' '.join(sql.split())[:240]}")
+    finally:
+        writer.execute("UPDATE etl_state SET value = ? WHERE key = 'rollups_ready'", (original[0] if original else '0',))
+        writer.commit()
+        writer.close()
+        explain.close()
+    return checked, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN regression check for the aggregator queries")
+    parser.add_argument('--db', help="Check an existing database instead of a freshly seeded one")
+    parser.add_argument('--verbose', action='store_true', help="Print every statement and its plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(tmp, 'plans.db')
+            seed_database(db_path)
+        checked, failures = run_checks(db_path, args.verbose)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{checked} statements checked, {len(failures)} plan regressions")
+    sys.exit(1 if failures else 0)
@@ -4,50 +4,279 @@
 
 import sqlite3
 import os
+import sys
 import json
+import time
+import itertools
+import numpy as np
+import pandas as pd
+
+try:
+    from backend.logic.sketches import BUCKETS, QuantileSketch, SKETCH_MEASURES
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.sketches import BUCKETS, QuantileSketch, SKETCH_MEASURES
+
+# Source columns recorded with two decimals in the TLC files
+CENT_COLUMNS = {
+    'trip_distance', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+    'improvement_surcharge', 'total_amount', 'congestion_surcharge'
+}
+
+# Page cache of the ETL write connections: the covering trips indexes and the rollups are updated all over
+# their B-trees, and the 2 MB default keeps evicting the pages the next chunk needs
+WRITE_CACHE_MB = 256
+
+# trip_rollups measures, in column order; every one of them adds up across trips
+ROLLUP_MEASURES = [
+    'trip_count', 'fare_sum', 'revenue_sum', 'distance_sum', 'speed_sum', 'speed_count', 'passenger_sum',
+    'speed_anomalies', 'fare_anomalies', 'f_speed_sum', 'f_speed_count'
+]
+ROLLUP_KEYS = ['pickup_location_id', 'dropoff_location_id', 'pickup_time_id']
+ROLLUP_ACCUMULATE = f'''
+    ON CONFLICT (pickup_location_id, dropoff_location_id, pickup_time_id) DO UPDATE SET
+        {', '.join(f"{m} = {m} + excluded.{m}" for m in ROLLUP_MEASURES)}
+'''
+# Adds (:sign = 1) or removes (:sign = -1) the rollup measures of the trips in a trip_id range.
+# {side} is one of ROLLUP_SIDES: the pickup-side and dropoff-side marginals (the other zone is 0 = any).
+ROLLUP_DELTA_SQL = f'''
+    INSERT INTO trip_rollups ({', '.join(ROLLUP_KEYS + ROLLUP_MEASURES)})
+    SELECT {{pickup}}, {{dropoff}}, pickup_time_id,
+        :sign * COUNT(*),
+        :sign * COALESCE(SUM(fare_amount), 0),
+        :sign * COALESCE(SUM(total_amount), 0),
+        :sign * COALESCE(SUM(trip_distance), 0),
+        :sign * COALESCE(SUM(speed_mph), 0),
+        :sign * COUNT(speed_mph),
+        :sign * COALESCE(SUM(passenger_count), 0),
+        :sign * SUM(CASE WHEN speed_mph > 80 THEN 1 ELSE 0 END),
+        :sign * SUM(CASE WHEN trip_distance < 1 AND fare_amount > 100 THEN 1 ELSE 0 END),
+        :sign * COALESCE(SUM(CASE WHEN speed_mph <= 80 THEN speed_mph ELSE 0 END), 0),
+        :sign * SUM(CASE WHEN speed_mph <= 80 THEN 1 ELSE 0 END)
+    FROM trips
+    WHERE trip_id BETWEEN :first AND :last AND {{zone}} IS NOT NULL AND pickup_time_id IS NOT NULL
+    GROUP BY {{zone}}, pickup_time_id
+    {ROLLUP_ACCUMULATE}
+'''
+# The same upsert for deltas aggregated in memory (ChunkUpkeep)
+ROLLUP_UPSERT_SQL = f'''
+    INSERT INTO trip_rollups ({', '.join(ROLLUP_KEYS + ROLLUP_MEASURES)})
+    VALUES ({', '.join('?' for _ in ROLLUP_KEYS + ROLLUP_MEASURES)})
+    {ROLLUP_ACCUMULATE}
+'''
+ROLLUP_SIDES = [
+    {"pickup": "pickup_location_id", "dropoff": "0", "zone": "pickup_location_id"},
+    {"pickup": "0", "dropoff": "dropoff_location_id", "zone": "dropoff_location_id"},
+]
+
+# Stratified trip sample for approximate queries (see trip_sample in schema.sql and logic/approx.py):
+# at most SAMPLE_PER_STRATUM trips per (pickup zone, pickup day), the ones with the smallest random sample_key.
+SAMPLE_PER_STRATUM = 16
+SAMPLE_REBUILD_BATCH = 500000 # trip ids per merge step when ensure_sample() rebuilds from the fact table
+SAMPLE_TEMP_TABLES = [
+    "CREATE TEMP TABLE IF NOT EXISTS sample_batch (trip_id INTEGER PRIMARY KEY, pickup_location_id INTEGER, day INTEGER, sample_key INTEGER)",
+    "CREATE TEMP TABLE IF NOT EXISTS sample_dirty (pickup_location_id INTEGER, day INTEGER, delta INTEGER, PRIMARY KEY (pickup_location_id, day)) WITHOUT ROWID",
+    "DELETE FROM temp.sample_batch",
+    "DELETE FROM temp.sample_dirty",
+]
+# The trips of a trip_id range, each with a fresh random key, and the population change of their strata
+SAMPLE_BATCH_SQL = [
+    '''
+    INSERT INTO temp.sample_batch (trip_id, pickup_location_id, day, sample_key)
+    SELECT trip_id, pickup_location_id, pickup_time_id / 24, random()
+    FROM trips
+    WHERE trip_id BETWEEN :first AND :last AND pickup_location_id IS NOT NULL AND pickup_time_id IS NOT NULL
+    ''',
+    '''
+    INSERT INTO temp.sample_dirty (pickup_location_id, day, delta)
+    SELECT pickup_location_id, day, :sign * COUNT(*) FROM temp.sample_batch GROUP BY 1, 2
+    ''',
+]
+SAMPLE_POPULATION_SQL = '''
+    INSERT INTO trip_sample_strata (pickup_location_id, day, population)
+    SELECT pickup_location_id, day, delta FROM temp.sample_dirty WHERE 1
+    ON CONFLICT (pickup_location_id, day) DO UPDATE SET population = population + excluded.population
+'''
+# Merged strata keep their current sample as candidates next to the new trips
+SAMPLE_KEEP_SQL = '''
+    INSERT INTO temp.sample_batch (trip_id, pickup_location_id, day, sample_key)
+    SELECT s.trip_id, s.pickup_location_id, s.day, s.sample_key
+    FROM temp.sample_dirty d
+    JOIN trip_sample s ON s.pickup_location_id = d.pickup_location_id AND s.day = d.day
+'''
+# Strata that lost trips are redrawn from what is left of them in trips (the range is about to be deleted)
+SAMPLE_REDRAW_SQL = [
+    "DELETE FROM temp.sample_batch",
+    '''
+    INSERT INTO temp.sample_batch (trip_id, pickup_location_id, day, sample_key)
+    SELECT t.trip_id, t.pickup_location_id, d.day, random()
+    FROM temp.sample_dirty d
+    JOIN trips t ON t.pickup_location_id = d.pickup_location_id AND t.pickup_time_id BETWEEN d.day * 24 AND d.day * 24 + 23
+    WHERE t.trip_id NOT BETWEEN :first AND :last
+    ''',
+]
+# Touched strata get their new sampled count, or go once they have no trips left, and lose their sample rows
+SAMPLE_RESET_SQL = [
+    '''
+    UPDATE trip_sample_strata SET sampled = MIN(population, :k)
+    WHERE (pickup_location_id, day) IN (SELECT pickup_location_id, day FROM temp.sample_dirty)
+    ''',
+    '''
+    DELETE FROM trip_sample_strata
+    WHERE population <= 0 AND (pickup_location_id, day) IN (SELECT pickup_location_id, day FROM temp.sample_dirty)
+    ''',
+    "DELETE FROM trip_sample WHERE (pickup_location_id, day) IN (SELECT pickup_location_id, day FROM temp.sample_dirty)",
+]
+# Trip columns copied into trip_sample next to the stratum, rank and key
+SAMPLE_PAYLOAD = [
+    'dropoff_location_id', 'pickup_time_id', 'passenger_count', 'trip_distance', 'speed_mph', 'fare_amount',
+    'total_amount', 'trip_duration_seconds'
+]
+# ...and are rewritten with the :k smallest keys among their candidates, ranked, and their weights
+SAMPLE_REWRITE_SQL = f'''
+    INSERT INTO trip_sample (
+        day, pickup_location_id, sample_rank, sample_key, trip_id, {', '.join(SAMPLE_PAYLOAD)}, weight
+    )
+    SELECT b.day, b.pickup_location_id, b.key_rank, b.sample_key, t.trip_id, {', '.join(f"t.{c}" for c in SAMPLE_PAYLOAD)},
+        st.population * 1.0 / st.sampled
+    FROM (
+        SELECT trip_id, pickup_location_id, day, sample_key,
+            ROW_NUMBER() OVER (PARTITION BY pickup_location_id, day ORDER BY sample_key, trip_id) AS key_rank
+        FROM temp.sample_batch
+    ) b
+    JOIN trips t ON t.trip_id = b.trip_id
+    JOIN trip_sample_strata st ON st.pickup_location_id = b.pickup_location_id AND st.day = b.day
+    WHERE b.key_rank <= :k
+'''
+# The current sample of the touched strata, with its payload, for merges done in memory (ChunkUpkeep)
+SAMPLE_STORED_SQL = f'''
+    SELECT s.trip_id, s.pickup_location_id, s.day, s.sample_key, {', '.join(f"s.{c}" for c in SAMPLE_PAYLOAD)}
+    FROM temp.sample_dirty d
+    JOIN trip_sample s ON s.pickup_location_id = d.pickup_location_id AND s.day = d.day
+'''
+SAMPLE_WEIGHTS_SQL = '''
+    SELECT st.pickup_location_id, st.day, st.population * 1.0 / st.sampled AS weight
+    FROM temp.sample_dirty d
+    JOIN trip_sample_strata st ON st.pickup_location_id = d.pickup_location_id AND st.day = d.day
+'''
+
+# Quantile sketches per (pickup zone, pickup day) (see trip_sketches in schema.sql and logic/sketches.py)
+SKETCH_REBUILD_BATCH = 200000 # trip ids per merge step when ensure_sketches() rebuilds from the fact table
+SKETCH_RANGE_SQL = f'''
+    SELECT pickup_location_id, pickup_time_id / 24, {', '.join(SKETCH_MEASURES.values())}
+    FROM trips
+    WHERE trip_id BETWEEN ? AND ? AND pickup_location_id IS NOT NULL AND pickup_time_id IS NOT NULL
+'''
+SKETCH_KEYS = ['pickup_location_id', 'day', 'measure', 'bucket']
+SKETCH_TEMP_TABLES = [
+    "CREATE TEMP TABLE IF NOT EXISTS sketch_dirty (pickup_location_id INTEGER, day INTEGER, PRIMARY KEY (pickup_location_id, day)) WITHOUT ROWID",
+    "DELETE FROM temp.sketch_dirty",
+]
+SKETCH_CURRENT_SQL = '''
+    SELECT s.pickup_location_id, s.day, s.measure, s.buckets
+    FROM temp.sketch_dirty d
+    JOIN trip_sketches s ON s.day = d.day AND s.pickup_location_id = d.pickup_location_id
+'''
+
+# etl_state keys of the summaries TripDAL.commit_chunk merges once per source, and the value that marks each one
+# current; while one is stale the API answers from trips instead (logic/approx.py, TripAggregator.sketches_ready)
+DEFERRED_SUMMARIES = {'sample_per_stratum': str(SAMPLE_PER_STRATUM), 'sketches_ready': '1'}
 
 class TripDAL:
     """Data Access Layer for Trip operations"""
     def __init__(self, db_path):
         self.db_path = db_path
+        self.time_keys = set() # time_dim keys known to be committed (skips re-inserting them)
+        # Sample candidates and sketch counts of committed chunks: a chunk's merge would rewrite the sample and
+        # sketches of nearly every stratum it touches, so they are merged once per source instead (_merge_deferred)
+        self.upkeep = ChunkUpkeep()
+        self.stale = set() # DEFERRED_SUMMARIES keys this writer marked stale until the pending merge
+
+    # Map raw CSV columns to schema.sql names
+    COLUMN_MAPPING = {
+        'VendorID': 'vendor_id',
+        'RatecodeID': 'rate_code_id',
+        'PULocationID': 'pickup_location_id',
+        'DOLocationID': 'dropoff_location_id',
+        'payment_type': 'payment_type_id',
+        'tpep_pickup_datetime': 'pickup_time', # For now, use raw datetime or handle IDs
+        'tpep_dropoff_datetime': 'dropoff_time'
+    }
+
+    # Let's ensure columns match schema.sql exactly
+    # Note: trips table doesn't have pickup_time/dropoff_time, it has IDs.
+    TARGET_COLUMNS = [
+        'vendor_id', 'passenger_count', 'trip_distance', 'rate_code_id', 
+        'payment_type_id', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 
+        'pickup_location_id', 'dropoff_location_id', 'tolls_amount', 
+        'improvement_surcharge', 'total_amount', 'congestion_surcharge', 
+        'speed_mph', 'fare_per_mile', 'trip_duration_seconds',
+        'pickup_date', 'pickup_hour', 'pickup_time_id', 'dropoff_time_id'
+    ]
+
+    # time_dim is keyed by hours since the Unix epoch (see FeatureEngineer.add_persisted_features)
+    TIME_KEY_COLUMNS = ('pickup_time_id', 'dropoff_time_id')
+
+    @classmethod
+    def _prepare_trips_frame(cls, trips_df):
+        """Renames raw columns to schema names and projects onto the trips table columns"""
+        df_to_save = trips_df.rename(columns=cls.COLUMN_MAPPING)
+
+        # Force columns to match and handle missing
+        df_final = df_to_save.reindex(columns=cls.TARGET_COLUMNS)
+
+        # Typed ingestion keeps money/distance as float32 in memory; store them at cent precision
+        # so SQLite doesn't end up with values like 0.30000001192092896
+        for col in df_final.columns:
+            if df_final[col].dtype == 'float32' and col in CENT_COLUMNS:
+                df_final[col] = df_final[col].astype('float64').round(2)
+        return df_final
+
+    @classmethod
+    def _column_buffers(cls, trips_df):
+        """
+        Builds the trips INSERT straight from the frame's column arrays - no rename/reindex/copy of
+        the DataFrame. Returns (target columns, iterator of row tuples). NaN floats bind as NULL.
+        """
+        source_for = {target: source for source, target in cls.COLUMN_MAPPING.items()}
+        buffers = []
+        for col in cls.TARGET_COLUMNS:
+            source = source_for.get(col, col)
+            if source not in trips_df.columns:
+                buffers.append(itertools.repeat(None))
+                continue
+            series = trips_df[source]
+            if series.dtype == 'float32' and col in CENT_COLUMNS:
+                buffers.append(np.round(series.to_numpy(dtype=np.float64), 2).tolist())
+            elif isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.hasnans:
+                buffers.append(series.to_numpy(dtype=object, na_value=None).tolist())
+            else:
+                buffers.append(series.to_numpy().tolist())
+        return cls.TARGET_COLUMNS, zip(*buffers)
+
+    @classmethod
+    def _stored_values(cls, trips_df, col):
+        """A trips column of the frame as float64, as the INSERT stores it (cent rounding), NaN for NULL"""
+        source = {target: source for source, target in cls.COLUMN_MAPPING.items()}.get(col, col)
+        if source not in trips_df.columns:
+            return np.full(len(trips_df), np.nan)
+        series = trips_df[source]
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        if series.dtype == 'float32' and col in CENT_COLUMNS:
+            values = np.round(values, 2)
+        return values
 
     def insert_trips(self, trips_df):
         """Efficiently inserts trip data into the database using bulk operations"""
         conn = sqlite3.connect(self.db_path, timeout=30)
         try:
-            df_to_save = trips_df.copy()
-            
-            # Map raw CSV columns to schema.sql names
-            column_mapping = {
-                'VendorID': 'vendor_id',
-                'RatecodeID': 'rate_code_id',
-                'PULocationID': 'pickup_location_id',
-                'DOLocationID': 'dropoff_location_id',
-                'payment_type': 'payment_type_id',
-                'tpep_pickup_datetime': 'pickup_time', # For now, use raw datetime or handle IDs
-                'tpep_dropoff_datetime': 'dropoff_time'
-            }
-            df_to_save = df_to_save.rename(columns=column_mapping)
-            
-            # Filter only columns that exist in the target table
-            # Note: trips table doesn't have pickup_time/dropoff_time, it has IDs.
-            # For simplicity, we'll temporarily drop columns that don't match or add them to schema
-            # But let's follow the schema: speed_mph, fare_per_mile, tip_percentage (renamed to tip_percent?)
-            
-            # Let's ensure columns match schema.sql exactly
-            target_columns = [
-                'vendor_id', 'passenger_count', 'trip_distance', 'rate_code_id', 
-                'payment_type_id', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 
-                'pickup_location_id', 'dropoff_location_id', 'tolls_amount', 
-                'improvement_surcharge', 'total_amount', 'congestion_surcharge', 
-                'speed_mph', 'fare_per_mile', 'trip_duration_seconds',
-                'pickup_date', 'pickup_hour'
-            ]
-            
-            # Force columns to match and handle missing
-            df_final = df_to_save.reindex(columns=target_columns)
-            
+            df_final = self._prepare_trips_frame(trips_df)
             df_final.to_sql('trips', conn, if_exists='append', index=False)
+            # This path doesn't maintain trip_rollups, trip_sample or trip_sketches; the next pipeline run rebuilds them
+            self._set_state(conn, 'rollups_ready', '0')
+            self._set_state(conn, 'sample_per_stratum', '0')
+            self._set_state(conn, 'sketches_ready', '0')
+            self._bump_data_version(conn)
             conn.commit()
             print(f"Successfully inserted {len(df_final)} rows into 'trips' table.")
         except Exception as e:
@@ -57,11 +286,402 @@ class TripDAL:
         finally:
             conn.close()
 
+    # --- Ingestion manifest (resumable / idempotent loads) ---
+
+    def get_manifest(self, source_path):
+        """Returns the manifest row for a source file as a dict, or None if it was never loaded"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM ingestion_manifest WHERE source_path = ?", (source_path,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def start_source(self, source_path, fingerprint, file_size, file_mtime):
+        """Registers a source file (or refreshes its stat info) without touching its progress"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self._start_source(conn, source_path, fingerprint, file_size, file_mtime)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _start_source(conn, source_path, fingerprint, file_size, file_mtime):
+        conn.execute('''
+            INSERT INTO ingestion_manifest (source_path, fingerprint, file_size, file_mtime)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(source_path) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                file_size = excluded.file_size,
+                file_mtime = excluded.file_mtime,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (source_path, fingerprint, file_size, file_mtime))
+
+    def reset_source(self, source_path):
+        """Removes every trip previously loaded from a source file along with its manifest entries"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self._merge_deferred(conn) # The purge must see every pending addition
+            purged = self._reset_source(conn, source_path)
+            conn.commit()
+            self.stale.clear()
+            print(f"Purged {purged} previously loaded chunks of {source_path}.")
+        finally:
+            conn.close()
+
+    @classmethod
+    def _reset_source(cls, conn, source_path):
+        """reset_source() on an open transaction (caller commits); returns the number of chunks purged"""
+        ranges = conn.execute(
+            "SELECT first_trip_id, last_trip_id FROM ingestion_chunks WHERE source_path = ? AND row_count > 0",
+            (source_path,)
+        ).fetchall()
+        for first_id, last_id in ranges:
+            cls._apply_rollups(conn, first_id, last_id, -1)
+            cls._apply_sample(conn, first_id, last_id, -1)
+            cls._apply_sketches(conn, first_id, last_id, -1)
+            conn.execute("DELETE FROM trips WHERE trip_id BETWEEN ? AND ?", (first_id, last_id))
+        conn.execute("DELETE FROM trip_rollups WHERE trip_count = 0")
+        conn.execute("DELETE FROM ingestion_chunks WHERE source_path = ?", (source_path,))
+        conn.execute("DELETE FROM data_quality WHERE source_path = ?", (source_path,))
+        conn.execute("DELETE FROM ingestion_manifest WHERE source_path = ?", (source_path,))
+        cls._bump_data_version(conn)
+        return len(ranges)
+
+    def commit_chunk(self, source_path, chunk_index, rows_read, trips_df, quality=None):
+        """
+        Writes one chunk and advances the manifest in a single transaction, so a crash leaves
+        either both or neither. Re-committing a chunk that is already recorded replaces its rows.
+        quality is the cleaning report from DataCleaner.clean_trip_data(..., with_report=True).
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(f"PRAGMA cache_size=-{WRITE_CACHE_MB * 1024}")
+        pending = list(self.upkeep.sample), list(self.upkeep.sketches)
+        try:
+            self._write_chunk(conn, source_path, chunk_index, rows_read, trips_df, quality, self.time_keys, self.upkeep)
+            self.upkeep.merge(conn, summaries=False)
+            marked = self._defer_summaries(conn)
+            conn.commit()
+            self.stale |= marked
+            print(f"Committed chunk {chunk_index + 1} of {os.path.basename(source_path)}: {len(trips_df)} rows.")
+        except Exception:
+            conn.rollback()
+            self.time_keys.clear()
+            self.upkeep.clear()
+            self.upkeep.sample, self.upkeep.sketches = pending # Those of the chunks committed before this one
+            raise
+        finally:
+            conn.close()
+
+    def _defer_summaries(self, conn):
+        """Marks the current DEFERRED_SUMMARIES stale while deltas are pending; returns the keys this transaction marked"""
+        if not (self.upkeep.sample or self.upkeep.sketches):
+            return set()
+        marked = set()
+        for key, current in DEFERRED_SUMMARIES.items():
+            row = conn.execute("SELECT value FROM etl_state WHERE key = ?", (key,)).fetchone()
+            if key not in self.stale and row and row[0] == current: # Otherwise the next ensure_*() rebuilds it anyway
+                self._set_state(conn, key, '0') # A crash before the merge leaves the rebuild to ensure_*()
+                marked.add(key)
+        return marked
+
+    def _merge_deferred(self, conn):
+        """Merges the pending sample candidates and sketch counts and marks them current again (caller commits)"""
+        self.upkeep.merge(conn)
+        for key in self.stale:
+            self._set_state(conn, key, DEFERRED_SUMMARIES[key])
+        if self.stale:
+            self._bump_data_version(conn)
+
+    @classmethod
+    def _write_chunk(cls, conn, source_path, chunk_index, rows_read, trips_df, quality=None, time_keys=None, upkeep=None):
+        """
+        Chunk insert + bookkeeping (time_dim, rollups, sample, sketches, manifest, data quality) on an open transaction (caller commits).
+        time_keys is the writer's in-memory set of time_dim keys already inserted; callers clear it on rollback.
+        upkeep is the writer's ChunkUpkeep: the chunk's rollup, sample and sketch deltas are added to it and the caller merges them
+        before it commits. Without one they are merged here.
+        """
+        merge_now = upkeep is None
+        upkeep = ChunkUpkeep() if merge_now else upkeep
+        cur = conn.cursor()
+        cls._insert_time_keys(cur, trips_df, time_keys if time_keys is not None else set())
+        previous = cur.execute(
+            "SELECT first_trip_id, last_trip_id, row_count FROM ingestion_chunks WHERE source_path = ? AND chunk_index = ?",
+            (source_path, chunk_index)
+        ).fetchone()
+        if previous and previous[2] > 0:
+            upkeep.merge(cur) # The removal must see every pending addition
+            cls._apply_rollups(cur, previous[0], previous[1], -1)
+            cls._apply_sample(cur, previous[0], previous[1], -1)
+            cls._apply_sketches(cur, previous[0], previous[1], -1)
+            cur.execute("DELETE FROM trips WHERE trip_id BETWEEN ? AND ?", previous[:2])
+
+        first_id = last_id = None
+        row_count = len(trips_df)
+        if row_count:
+            # executemany rather than to_sql: pandas commits inside to_sql, which would split the transaction
+            columns, rows = cls._column_buffers(trips_df)
+            placeholders = ", ".join("?" for _ in columns)
+            cur.executemany(f"INSERT INTO trips ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            # A single writer inside one transaction gets a contiguous AUTOINCREMENT range
+            last_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+            first_id = last_id - row_count + 1
+            upkeep.add(trips_df, first_id)
+        if merge_now:
+            upkeep.merge(cur)
+
+        cur.execute('''
+            INSERT OR REPLACE INTO ingestion_chunks (source_path, chunk_index, first_trip_id, last_trip_id, row_count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (source_path, chunk_index, first_id, last_id, row_count))
+        if quality is not None:
+            cur.execute("DELETE FROM data_quality WHERE source_path = ? AND chunk_index = ?", (source_path, chunk_index))
+            cur.executemany(
+                "INSERT INTO data_quality (source_path, chunk_index, rule, rows_in, rejected) VALUES (?, ?, ?, ?, ?)",
+                [(source_path, chunk_index, rule, quality['rows_in'], count) for rule, count in quality['rejected'].items()]
+            )
+        cur.execute('''
+            UPDATE ingestion_manifest
+            SET last_chunk = ?, rows_read = ?,
+                rows_loaded = (SELECT COALESCE(SUM(row_count), 0) FROM ingestion_chunks WHERE source_path = ?),
+                status = 'in_progress', updated_at = CURRENT_TIMESTAMP
+            WHERE source_path = ?
+        ''', (chunk_index, rows_read, source_path, source_path))
+        cls._bump_data_version(cur)
+
+    @staticmethod
+    def _apply_rollups(cur, first_id, last_id, sign):
+        """Folds the trips in [first_id, last_id] into trip_rollups (sign=1) or takes them out (sign=-1)"""
+        params = {"sign": sign, "first": first_id, "last": last_id}
+        for side in ROLLUP_SIDES:
+            cur.execute(ROLLUP_DELTA_SQL.format(**side), params)
+
+    def ensure_rollups(self):
+        """Rebuilds trip_rollups from the fact table unless they are known to be current"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            row = conn.execute("SELECT value FROM etl_state WHERE key = 'rollups_ready'").fetchone()
+            if row and row[0] == '1':
+                return
+            start = time.perf_counter()
+            with conn:
+                conn.execute("DELETE FROM trip_rollups")
+                self._apply_rollups(conn, 0, 2 ** 63 - 1, 1)
+                self._set_state(conn, 'rollups_ready', '1')
+                self._bump_data_version(conn)
+            rollup_rows = conn.execute("SELECT COUNT(*) FROM trip_rollups").fetchone()[0]
+            print(f"Rebuilt trip_rollups ({rollup_rows} rows) in {time.perf_counter() - start:.1f}s.")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _apply_sample(cur, first_id, last_id, sign, per_stratum=SAMPLE_PER_STRATUM):
+        """
+        Merges the trips in [first_id, last_id] into trip_sample (sign=1), or takes them out before
+        they are deleted (sign=-1), and refreshes the weights of the strata they belong to.
+        """
+        params = {"sign": sign, "first": first_id, "last": last_id, "k": per_stratum}
+        for sql in SAMPLE_TEMP_TABLES:
+            cur.execute(sql)
+        for sql in SAMPLE_BATCH_SQL:
+            cur.execute(sql, params)
+        cur.execute(SAMPLE_POPULATION_SQL)
+        if sign > 0:
+            cur.execute(SAMPLE_KEEP_SQL)
+        else:
+            for sql in SAMPLE_REDRAW_SQL:
+                cur.execute(sql, params)
+        for sql in SAMPLE_RESET_SQL:
+            cur.execute(sql, params)
+        cur.execute(SAMPLE_REWRITE_SQL, params)
+
+    def ensure_sample(self):
+        """Redraws trip_sample from the fact table unless it is current and drawn at SAMPLE_PER_STRATUM"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            row = conn.execute("SELECT value FROM etl_state WHERE key = 'sample_per_stratum'").fetchone()
+            if row and row[0] == str(SAMPLE_PER_STRATUM):
+                return
+            start = time.perf_counter()
+            with conn:
+                conn.execute("DELETE FROM trip_sample")
+                conn.execute("DELETE FROM trip_sample_strata")
+                first_id, last_id = conn.execute("SELECT MIN(trip_id), MAX(trip_id) FROM trips").fetchone()
+                # Bottom-k samples merge exactly, so the rebuild is the per-chunk merge over id batches
+                for batch_start in range(first_id or 0, (last_id or -1) + 1, SAMPLE_REBUILD_BATCH):
+                    self._apply_sample(conn, batch_start, batch_start + SAMPLE_REBUILD_BATCH - 1, 1)
+                self._set_state(conn, 'sample_per_stratum', str(SAMPLE_PER_STRATUM))
+                self._bump_data_version(conn)
+            sample_rows, strata = conn.execute(
+                "SELECT COALESCE(SUM(sampled), 0), COUNT(*) FROM trip_sample_strata"
+            ).fetchone()
+            print(f"Rebuilt trip_sample ({sample_rows} rows in {strata} strata) in {time.perf_counter() - start:.1f}s.")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _apply_sketches(cur, first_id, last_id, sign):
+        """
+        Adds the speed/fare/duration values of the trips in [first_id, last_id] to the quantile sketches of
+        their (pickup zone, day) (sign=1), or subtracts them before the trips are deleted (sign=-1)
+        """
+        rows = cur.execute(SKETCH_RANGE_SQL, (first_id, last_id)).fetchall()
+        if not rows:
+            return
+        values = np.array(rows, dtype=np.float64) # NULL -> NaN, which the sketches skip
+        col = dict(zip(['pickup_location_id', 'day'] + list(SKETCH_MEASURES.values()), values.T))
+        col['pickup_time_id'] = col.pop('day') * 24
+        ChunkUpkeep._merge_sketches(cur, sign * ChunkUpkeep._sketch_deltas(col))
+
+    def ensure_sketches(self):
+        """Rebuilds trip_sketches from the fact table unless they are known to be current"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            row = conn.execute("SELECT value FROM etl_state WHERE key = 'sketches_ready'").fetchone()
+            if row and row[0] == '1':
+                return
+            start = time.perf_counter()
+            with conn:
+                conn.execute("DELETE FROM trip_sketches")
+                first_id, last_id = conn.execute("SELECT MIN(trip_id), MAX(trip_id) FROM trips").fetchone()
+                # Bucket counts add up, so the rebuild is the per-chunk merge over id batches
+                for batch_start in range(first_id or 0, (last_id or -1) + 1, SKETCH_REBUILD_BATCH):
+                    self._apply_sketches(conn, batch_start, batch_start + SKETCH_REBUILD_BATCH - 1, 1)
+                self._set_state(conn, 'sketches_ready', '1')
+                self._bump_data_version(conn)
+            sketches = conn.execute("SELECT COUNT(*) FROM trip_sketches").fetchone()[0]
+            print(f"Rebuilt trip_sketches ({sketches} sketches) in {time.perf_counter() - start:.1f}s.")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _set_state(conn, key, value):
+        conn.execute('''
+            INSERT INTO etl_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+        ''', (key, value))
+
+    @staticmethod
+    def _bump_data_version(conn):
+        """Advances etl_state.data_version inside the caller's transaction; the API's result cache keys on it"""
+        conn.execute('''
+            INSERT INTO etl_state (key, value) VALUES ('data_version', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP
+        ''')
+
+    @staticmethod
+    def _bump_zones_version(conn):
+        """Advances etl_state.zones_version; the API's dimension cache (logic/dimensions.py) reloads when it moves"""
+        conn.execute('''
+            INSERT INTO etl_state (key, value) VALUES ('zones_version', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP
+        ''')
+
+    @classmethod
+    def _insert_time_keys(cls, cur, trips_df, time_keys):
+        """Adds the time_dim rows for any hour keys in the chunk that this writer hasn't seen yet"""
+        keys = [trips_df[c].dropna().to_numpy(dtype=np.int64) for c in cls.TIME_KEY_COLUMNS if c in trips_df.columns]
+        if not keys:
+            return
+        new_keys = np.setdiff1d(np.concatenate(keys), np.fromiter(time_keys, dtype=np.int64, count=len(time_keys)))
+        if len(new_keys):
+            cur.executemany('''
+                INSERT OR IGNORE INTO time_dim (time_id, datetime, hour, day_of_week, day_of_month, month, year, is_weekend)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', cls.time_dim_rows(new_keys))
+            time_keys.update(new_keys.tolist())
+
+    @staticmethod
+    def time_dim_rows(keys):
+        """
+        Vectorized time_dim rows for hour keys (hours since epoch):
+        (time_id, 'YYYY-MM-DD HH:00:00', hour, day_of_week (Mon=0), day_of_month, month, year, is_weekend)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        hours = keys.astype('datetime64[h]')
+        days = hours.astype('datetime64[D]')
+        months = hours.astype('datetime64[M]')
+        day_of_week = (days.astype(np.int64) + 3) % 7 # 1970-01-01 was a Thursday
+        columns = (
+            keys,
+            np.char.replace(np.datetime_as_string(hours, unit='s'), 'T', ' '),
+            keys % 24,
+            day_of_week,
+            (days - months.astype('datetime64[D]')).astype(np.int64) + 1,
+            months.astype(np.int64) % 12 + 1,
+            hours.astype('datetime64[Y]').astype(np.int64) + 1970,
+            day_of_week >= 5
+        )
+        return zip(*(c.tolist() for c in columns))
+
+    def backfill_time_keys(self):
+        """
+        Fills pickup_time_id on trips loaded before time_dim was populated, from their stored
+        pickup_date + pickup_hour, and adds the matching time_dim rows. dropoff_time_id stays NULL
+        for those rows: the dropoff hour can't be recovered from what was stored.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                updated = conn.execute('''
+                    UPDATE trips SET pickup_time_id = CAST(strftime('%s', pickup_date) AS INTEGER) / 3600 + pickup_hour
+                    WHERE pickup_time_id IS NULL AND pickup_date IS NOT NULL AND pickup_hour IS NOT NULL
+                ''').rowcount
+                if updated:
+                    missing = [r[0] for r in conn.execute('''
+                        SELECT DISTINCT pickup_time_id FROM trips
+                        WHERE pickup_time_id IS NOT NULL
+                          AND pickup_time_id NOT IN (SELECT time_id FROM time_dim)
+                    ''')]
+                    self._insert_time_keys(conn.cursor(), pd.DataFrame({'pickup_time_id': missing}), set())
+                    # Those trips now have a stratum; ensure_sample() and ensure_sketches() rebuild with them
+                    self._set_state(conn, 'sample_per_stratum', '0')
+                    self._set_state(conn, 'sketches_ready', '0')
+                    self._bump_data_version(conn)
+                    print(f"Backfilled time keys for {updated} trips ({len(missing)} new time_dim hours).")
+        finally:
+            conn.close()
+
+    def complete_source(self, source_path):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self._merge_deferred(conn)
+            self._mark_complete(conn, source_path)
+            conn.commit()
+            self.stale.clear()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _mark_complete(conn, source_path):
+        conn.execute(
+            "UPDATE ingestion_manifest SET status = 'complete', updated_at = CURRENT_TIMESTAMP WHERE source_path = ?",
+            (source_path,)
+        )
+
+    def close(self):
+        """
+        TripDAL holds no connection between calls - present so it can stand in for BulkTripWriter.
+        Merges sample candidates and sketch counts still pending from a load that stopped mid-file.
+        """
+        if not (self.upkeep.sample or self.upkeep.sketches or self.stale):
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self._merge_deferred(conn)
+            conn.commit()
+            self.stale.clear()
+        finally:
+            conn.close()
+
     def insert_zones(self, zones_data):
         """Inserts taxi zone data using INSERT OR IGNORE to avoid duplicates"""
         conn = sqlite3.connect(self.db_path, timeout=30)
         try:
             cur = conn.cursor()
+            changes_before = conn.total_changes
             for zone in zones_data:
                 attr = zone['attributes']
                 geom = zone['geometry']
@@ -74,9 +694,387 @@ class TripDAL:
                     attr.get('zone'), 
                     json.dumps(geom)
                 ))
+            inserted = conn.total_changes - changes_before
+            if inserted:
+                # Only new zones invalidate the API's caches; a rerun over loaded zones leaves every ETag valid
+                self._bump_data_version(conn)
+                self._bump_zones_version(conn)
             conn.commit()
-            print(f"Successfully inserted {len(zones_data)} zones into 'taxi_zones' table.")
+            print(f"Successfully inserted {inserted} of {len(zones_data)} zones into 'taxi_zones' table.")
         except Exception as e:
             print(f"Error inserting zones: {e}")
         finally:
             conn.close()
+
+    def insert_zone_payloads(self, payloads):
+        """Replaces the precomputed map payloads (see etl/processing/zone_simplifier.py) in one transaction"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute("DELETE FROM zone_payloads")
+                conn.executemany('''
+                    INSERT INTO zone_payloads (level, format, tolerance, raw_bytes, payload, etag)
+                    VALUES (:level, :format, :tolerance, :raw_bytes, :payload, :etag)
+                ''', payloads)
+            print(f"Successfully stored {len(payloads)} zone map payloads.")
+        except Exception as e:
+            print(f"Error storing zone payloads: {e}")
+        finally:
+            conn.close()
+
+
+class ChunkUpkeep:
+    """
+    trip_rollups, trip_sample and trip_sketches deltas of the chunks written since the last merge(), aggregated
+    from each chunk's columns in memory rather than read back from trips, and written with one set of
+    statements per commit group. Only additions are kept here; removals read the trips being deleted
+    (TripDAL._apply_rollups / _apply_sample / _apply_sketches), after a merge.
+    """
+    def __init__(self):
+        self.rng = np.random.default_rng()
+        self.clear()
+
+    def clear(self):
+        self.rollups = [] # Per chunk: measures summed per ROLLUP_KEYS
+        self.sample = [] # Per chunk: (bottom-k candidates, population per stratum)
+        self.sketches = [] # Per chunk: value counts per SKETCH_KEYS
+
+    def add(self, trips_df, first_id):
+        """Aggregates a chunk whose rows were inserted as trip_ids first_id, first_id + 1, ..."""
+        col = {c: TripDAL._stored_values(trips_df, c) for c in (
+            'pickup_location_id', 'dropoff_location_id', 'pickup_time_id', 'fare_amount', 'total_amount',
+            'trip_distance', 'speed_mph', 'passenger_count', 'trip_duration_seconds'
+        )}
+        self.rollups.append(self._rollup_deltas(col))
+        self.sample.append(self._sample_deltas(col, first_id))
+        self.sketches.append(self._sketch_deltas(col))
+
+    @staticmethod
+    def _rollup_deltas(col):
+        """ROLLUP_DELTA_SQL in NumPy: the pickup-side and dropoff-side sums of the chunk (NaN = NULL)"""
+        speed, fare, distance = col['speed_mph'], col['fare_amount'], col['trip_distance']
+        measures = pd.DataFrame({
+            'trip_count': np.ones(len(speed), dtype=np.int64),
+            'fare_sum': np.nan_to_num(fare),
+            'revenue_sum': np.nan_to_num(col['total_amount']),
+            'distance_sum': np.nan_to_num(distance),
+            'speed_sum': np.nan_to_num(speed),
+            'speed_count': ~np.isnan(speed),
+            'passenger_sum': np.nan_to_num(col['passenger_count']).astype(np.int64),
+            'speed_anomalies': speed > 80,
+            'fare_anomalies': (distance < 1) & (fare > 100),
+            'f_speed_sum': np.where(speed <= 80, speed, 0.0),
+            'f_speed_count': speed <= 80,
+        })
+        sides = []
+        for zone, other in (('pickup_location_id', 'dropoff_location_id'), ('dropoff_location_id', 'pickup_location_id')):
+            keep = ~np.isnan(col[zone]) & ~np.isnan(col['pickup_time_id'])
+            side = measures[keep]
+            sides.append(side.assign(**{
+                zone: col[zone][keep].astype(np.int64), other: 0, 'pickup_time_id': col['pickup_time_id'][keep].astype(np.int64)
+            }))
+        return pd.concat(sides).groupby(ROLLUP_KEYS).sum()
+
+    def _sample_deltas(self, col, first_id):
+        """
+        SAMPLE_BATCH_SQL in pandas: each trip with a stratum gets a random key like SQLite's random(); only the
+        SAMPLE_PER_STRATUM smallest keys of each stratum can make the merged sample, so only they are kept,
+        along with the SAMPLE_PAYLOAD columns they are written with
+        """
+        keep = ~np.isnan(col['pickup_location_id']) & ~np.isnan(col['pickup_time_id'])
+        trips = pd.DataFrame({
+            'trip_id': first_id + np.flatnonzero(keep),
+            'pickup_location_id': col['pickup_location_id'][keep].astype(np.int64),
+            'day': col['pickup_time_id'][keep].astype(np.int64) // 24,
+            'sample_key': self.rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, keep.sum(), dtype=np.int64, endpoint=True),
+            **{c: col[c][keep] for c in SAMPLE_PAYLOAD},
+        })
+        return self._bottom_k(trips), trips.groupby(['pickup_location_id', 'day']).size()
+
+    @staticmethod
+    def _bottom_k(candidates):
+        """The SAMPLE_PER_STRATUM candidates per stratum that rank first in SAMPLE_REWRITE_SQL"""
+        ranked = candidates.sort_values(['pickup_location_id', 'day', 'sample_key', 'trip_id'])
+        return ranked.groupby(['pickup_location_id', 'day']).head(SAMPLE_PER_STRATUM)
+
+    @staticmethod
+    def _sketch_deltas(col):
+        """Bucket counts of the chunk's sketched values per (pickup zone, day, measure, bucket) (NaN = NULL)"""
+        keep = ~np.isnan(col['pickup_location_id']) & ~np.isnan(col['pickup_time_id'])
+        zone = col['pickup_location_id'][keep].astype(np.int64)
+        day = col['pickup_time_id'][keep].astype(np.int64) // 24
+        parts = []
+        for measure, column in SKETCH_MEASURES.items():
+            values = col[column][keep]
+            has = ~np.isnan(values)
+            parts.append(pd.DataFrame({
+                'pickup_location_id': zone[has], 'day': day[has], 'measure': measure,
+                'bucket': QuantileSketch.bucket_index(values[has])
+            }))
+        return pd.concat(parts).groupby(SKETCH_KEYS).size()
+
+    @staticmethod
+    def _merge_sketches(cur, deltas):
+        """
+        Adds signed bucket counts (from _sketch_deltas) to the stored sketches; emptied sketches are deleted.
+        Works on the (bucket, count) pairs of every touched sketch at once: the stored blobs are joined into
+        one array, summed with the deltas per (sketch, bucket), and each new blob is a slice of one encoded buffer.
+        """
+        if deltas.empty:
+            return
+        deltas = deltas.sort_index()
+        zone, day, measure, bucket = (deltas.index.get_level_values(k).to_numpy() for k in SKETCH_KEYS)
+        counts = deltas.to_numpy(dtype=np.int64)
+        new_stratum = np.r_[True, (zone[1:] != zone[:-1]) | (day[1:] != day[:-1])]
+        new_sketch = new_stratum | np.r_[True, measure[1:] != measure[:-1]]
+        owner = np.cumsum(new_sketch) - 1 # Sketch number of each delta
+        starts = np.flatnonzero(new_sketch)
+        sketches = list(zip(zone[starts].tolist(), day[starts].tolist(), measure[starts].tolist()))
+
+        for sql in SKETCH_TEMP_TABLES:
+            cur.execute(sql)
+        strata = np.flatnonzero(new_stratum)
+        cur.executemany(
+            "INSERT INTO temp.sketch_dirty (pickup_location_id, day) VALUES (?, ?)",
+            zip(zone[strata].tolist(), day[strata].tolist())
+        )
+        number = {key: i for i, key in enumerate(sketches)}
+        stored = [(number[(z, d, m)], blob) for z, d, m, blob in cur.execute(SKETCH_CURRENT_SQL) if (z, d, m) in number]
+        if stored:
+            owners, blobs = zip(*stored)
+            pairs = np.frombuffer(b''.join(blobs), dtype='<i4').reshape(-1, 2)
+            owner = np.r_[owner, np.repeat(owners, [len(blob) // 8 for blob in blobs])]
+            bucket = np.r_[bucket, pairs[:, 0]]
+            counts = np.r_[counts, pairs[:, 1]]
+
+        keys, inverse = np.unique(owner * BUCKETS + bucket, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+        keys, counts = keys[counts != 0], counts[counts != 0]
+        owner = keys // BUCKETS
+        totals = np.bincount(owner, weights=counts, minlength=len(sketches)).astype(np.int64).tolist()
+        encoded = np.column_stack((keys % BUCKETS, counts)).astype('<i4').tobytes() # QuantileSketch.encode layout
+        offsets = (np.searchsorted(owner, np.arange(len(sketches) + 1)) * 8).tolist()
+
+        upserts, deletes = [], []
+        for i, (zone_id, day_id, name) in enumerate(sketches):
+            if totals[i] > 0:
+                upserts.append((day_id, zone_id, name, totals[i], encoded[offsets[i]:offsets[i + 1]]))
+            else:
+                deletes.append((day_id, zone_id, name))
+        cur.executemany('''
+            INSERT OR REPLACE INTO trip_sketches (day, pickup_location_id, measure, value_count, buckets)
+            VALUES (?, ?, ?, ?, ?)
+        ''', upserts)
+        cur.executemany("DELETE FROM trip_sketches WHERE day = ? AND pickup_location_id = ? AND measure = ?", deletes)
+
+    @classmethod
+    def _merge_sample(cls, cur, candidates, populations):
+        """
+        Adds trip counts per stratum (from _sample_deltas) to trip_sample_strata and merges the candidates
+        into trip_sample. The bottom-k of a touched stratum is taken in pandas from its stored sample and
+        the new candidates, which carry their payload, so no trips row is read back (unlike SAMPLE_REWRITE_SQL).
+        """
+        for sql in SAMPLE_TEMP_TABLES:
+            cur.execute(sql)
+        cur.executemany(
+            "INSERT INTO temp.sample_dirty (pickup_location_id, day, delta) VALUES (?, ?, ?)",
+            zip(populations.index.get_level_values(0).tolist(), populations.index.get_level_values(1).tolist(), populations.tolist())
+        )
+        cur.execute(SAMPLE_POPULATION_SQL)
+        columns = ['trip_id', 'pickup_location_id', 'day', 'sample_key'] + SAMPLE_PAYLOAD
+        stored = pd.DataFrame(cur.execute(SAMPLE_STORED_SQL).fetchall(), columns=columns)
+        stored = stored.astype({c: np.int64 for c in columns[:4]} | {c: np.float64 for c in SAMPLE_PAYLOAD}) # NULL = NaN
+        for sql in SAMPLE_RESET_SQL:
+            cur.execute(sql, {"k": SAMPLE_PER_STRATUM})
+        weights = pd.DataFrame(cur.execute(SAMPLE_WEIGHTS_SQL).fetchall(), columns=['pickup_location_id', 'day', 'weight'])
+
+        sample = cls._bottom_k(pd.concat([stored, candidates[columns]], ignore_index=True))
+        sample = sample.assign(sample_rank=sample.groupby(['pickup_location_id', 'day']).cumcount() + 1)
+        sample = sample.merge(weights, on=['pickup_location_id', 'day']).sort_values(['day', 'pickup_location_id', 'sample_rank'])
+        values = [sample[c].tolist() for c in ('day', 'pickup_location_id', 'sample_rank', 'sample_key', 'trip_id')]
+        values += [np.where(np.isnan(v), None, v).tolist() for v in (sample[c].to_numpy() for c in SAMPLE_PAYLOAD)]
+        cur.executemany(f'''
+            INSERT INTO trip_sample (
+                day, pickup_location_id, sample_rank, sample_key, trip_id, {', '.join(SAMPLE_PAYLOAD)}, weight
+            ) VALUES ({', '.join('?' * (len(SAMPLE_PAYLOAD) + 6))})
+        ''', zip(*values, sample['weight'].tolist()))
+
+    def merge(self, cur, summaries=True):
+        """
+        Writes everything added since the last merge to trip_rollups, trip_sample and trip_sketches;
+        summaries=False writes only the rollups and leaves the sample candidates and sketch counts pending
+        """
+        if self.rollups:
+            deltas = pd.concat(self.rollups).groupby(level=ROLLUP_KEYS).sum()
+            columns = [deltas.index.get_level_values(k) for k in ROLLUP_KEYS] + [deltas[m] for m in ROLLUP_MEASURES]
+            cur.executemany(ROLLUP_UPSERT_SQL, zip(*(c.tolist() for c in columns)))
+            self.rollups = []
+        if summaries and self.sample:
+            self._merge_sample(
+                cur, pd.concat(c for c, _ in self.sample), pd.concat(p for _, p in self.sample).groupby(level=[0, 1]).sum()
+            )
+            self.sample = []
+        if summaries and self.sketches:
+            self._merge_sketches(cur, pd.concat(self.sketches).groupby(level=SKETCH_KEYS).sum())
+            self.sketches = []
+
+
+class BulkTripWriter:
+    """
+    High-throughput load path with the same start_source/reset_source/commit_chunk/complete_source interface as TripDAL.
+    - one connection for the whole load, tuned for writing (synchronous=OFF, large page cache)
+    - one transaction per `commit_every` chunks instead of one per chunk; the manifest is advanced
+      in the same transaction, so a crash only rolls back to the last committed group of chunks
+    - optionally drops the secondary indexes on trips and rebuilds them once in close()
+    If a load dies with the indexes dropped, the next pipeline run restores them via schema.sql.
+    """
+    def __init__(self, db_path, commit_every=10, drop_indexes=False, cache_mb=WRITE_CACHE_MB):
+        self.db_path = db_path
+        self.commit_every = max(1, commit_every)
+        # Explicit BEGIN/COMMIT; the parallel pipeline creates the writer on one thread and commits from another
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(f"PRAGMA cache_size=-{cache_mb * 1024}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.pending_chunks = 0
+        self.rows_written = 0
+        self.time_keys = set()
+        self.upkeep = ChunkUpkeep() # Rollup, sample and sketch deltas of the open transaction, merged in flush()
+        self.started = time.perf_counter()
+
+        self.dropped_indexes = []
+        if drop_indexes:
+            self.dropped_indexes = self.conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'trips' AND sql IS NOT NULL"
+            ).fetchall()
+            for name, _ in self.dropped_indexes:
+                self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+            print(f"Dropped {len(self.dropped_indexes)} trips indexes for the bulk load.")
+
+    def _begin(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
+    def _rollback(self):
+        self.conn.rollback()
+        self.pending_chunks = 0
+        self.time_keys.clear()
+        self.upkeep.clear()
+
+    def commit_chunk(self, source_path, chunk_index, rows_read, trips_df, quality=None):
+        self._begin()
+        try:
+            TripDAL._write_chunk(self.conn, source_path, chunk_index, rows_read, trips_df, quality, self.time_keys, self.upkeep)
+        except Exception:
+            self._rollback()
+            raise
+        self.rows_written += len(trips_df)
+        self.pending_chunks += 1
+        if self.pending_chunks >= self.commit_every:
+            self.flush()
+
+    def start_source(self, source_path, fingerprint, file_size, file_mtime):
+        self._begin()
+        TripDAL._start_source(self.conn, source_path, fingerprint, file_size, file_mtime)
+
+    def reset_source(self, source_path):
+        # Part of the open transaction: the purge commits (or rolls back) with the file's first reloaded chunks
+        self._begin()
+        self.upkeep.merge(self.conn) # The purge must see every pending addition
+        purged = TripDAL._reset_source(self.conn, source_path)
+        print(f"Purged {purged} previously loaded chunks of {source_path}.")
+
+    def complete_source(self, source_path):
+        self._begin()
+        TripDAL._mark_complete(self.conn, source_path)
+        self.flush()
+
+    def flush(self):
+        if self.conn.in_transaction:
+            try:
+                self.upkeep.merge(self.conn)
+            except Exception:
+                self._rollback()
+                raise
+            self.conn.commit()
+            elapsed = time.perf_counter() - self.started
+            print(f"Bulk load: {self.rows_written} rows committed ({self.rows_written / max(elapsed, 1e-9):,.0f} rows/s).")
+        self.pending_chunks = 0
+
+    def close(self):
+        try:
+            self.flush()
+            if self.dropped_indexes:
+                start = time.perf_counter()
+                for _, sql in self.dropped_indexes:
+                    self.conn.execute(sql)
+                print(f"Rebuilt {len(self.dropped_indexes)} trips indexes in {time.perf_counter() - start:.1f}s.")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        finally:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # Benchmark: legacy to_sql path vs per-chunk commit_chunk vs BulkTripWriter, in rows/second
+    import tempfile
+    try:
+        from backend.etl.features.feature_engineer import FeatureEngineer
+    except ImportError:
+        from etl.features.feature_engineer import FeatureEngineer
+
+    schema_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'schema.sql')
+    rows, chunks = 100000, 5
+    total = rows * chunks
+    rng = np.random.default_rng(0)
+    # Time-ordered pickups at a real month's density (~245k trips a day), with time keys from the feature stage,
+    # so every path maintains time_dim, the rollups, the sample and the sketches as a real load does
+    pickup = pd.Timestamp('2019-01-01') + pd.to_timedelta(np.sort(rng.integers(0, total * 86400 // 245000, total)), unit='s')
+    trips = FeatureEngineer.add_persisted_features(pd.DataFrame({
+        'VendorID': rng.integers(1, 3, total), 'passenger_count': rng.integers(1, 6, total),
+        'trip_distance': rng.exponential(3, total).round(2), 'RatecodeID': 1, 'payment_type': rng.integers(1, 5, total),
+        'fare_amount': rng.uniform(3, 60, total).round(2), 'extra': 0.5, 'mta_tax': 0.5, 'tip_amount': rng.uniform(0, 10, total).round(2),
+        'PULocationID': rng.integers(1, 266, total), 'DOLocationID': rng.integers(1, 266, total), 'tolls_amount': 0.0,
+        'improvement_surcharge': 0.3, 'total_amount': rng.uniform(5, 80, total).round(2), 'congestion_surcharge': 2.5,
+        'tpep_pickup_datetime': pickup, 'tpep_dropoff_datetime': pickup + pd.to_timedelta(rng.integers(60, 3600, total), unit='s'),
+    }))
+    chunk_frames = [trips.iloc[i * rows:(i + 1) * rows] for i in range(chunks)]
+
+    def fresh_db(directory, name):
+        path = os.path.join(directory, name)
+        conn = sqlite3.connect(path)
+        with open(schema_path) as f:
+            conn.executescript(f.read())
+        conn.execute("INSERT INTO ingestion_manifest (source_path, fingerprint) VALUES ('bench', 'bench')")
+        conn.commit()
+        conn.close()
+        return path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+
+        dal = TripDAL(fresh_db(tmp, 'legacy.db'))
+        start = time.perf_counter()
+        for chunk in chunk_frames:
+            dal.insert_trips(chunk)
+        results['insert_trips (to_sql, no upkeep)'] = time.perf_counter() - start
+
+        dal = TripDAL(fresh_db(tmp, 'chunked.db'))
+        start = time.perf_counter()
+        for i, chunk in enumerate(chunk_frames):
+            dal.commit_chunk('bench', i, (i + 1) * rows, chunk)
+        dal.complete_source('bench') # Merges the deferred sample and sketches
+        results['commit_chunk (per chunk)'] = time.perf_counter() - start
+
+        for drop in (False, True):
+            writer = BulkTripWriter(fresh_db(tmp, f'bulk_{drop}.db'), commit_every=chunks, drop_indexes=drop)
+            start = time.perf_counter()
+            for i, chunk in enumerate(chunk_frames):
+                writer.commit_chunk('bench', i, (i + 1) * rows, chunk)
+            writer.complete_source('bench')
+            writer.close()
+            results[f'BulkTripWriter (drop_indexes={drop})'] = time.perf_counter() - start
+
+        print(f"\n{total} rows per run")
+        for name, seconds in results.items():
+            print(f"{name:40s} {total / seconds:>12,.0f} rows/s")
@@ -2,65 +2,361 @@
 # Data Ingestion Module: Provides classes for loading taxi trip data from CSV and spatial metadata from Shapefiles.
 
 import pandas as pd
+import numpy as np
 import os
+import time
+import hashlib
+import logging
 import shapefile # pyshp
 import json
 
+try:
+    from etl.ingestion.zone_geometry import ZoneGeometryArrays
+except ImportError: # Running this file directly (see the test snippet below)
+    from zone_geometry import ZoneGeometryArrays
+
+try:
+    import resource # Unix only; used for the process peak RSS
+except ImportError:
+    resource = None
+
+logger = logging.getLogger("DataLoader")
+
+# Yellow taxi column schema, declared once.
+# Only the columns the `trips` table (and feature engineering) need are listed; anything else
+# in the file is skipped at parse time. Nullable integer dtypes keep IDs compact while still
+# allowing the blanks that appear in newer TLC files.
+YELLOW_TAXI_SCHEMA = {
+    'VendorID': 'Int8',
+    'passenger_count': 'Int8',
+    'trip_distance': 'float32',
+    'RatecodeID': 'Int8',
+    'PULocationID': 'Int16',
+    'DOLocationID': 'Int16',
+    'payment_type': 'Int8',
+    'fare_amount': 'float32',
+    'extra': 'float32',
+    'mta_tax': 'float32',
+    'tip_amount': 'float32',
+    'tolls_amount': 'float32',
+    'improvement_surcharge': 'float32',
+    'total_amount': 'float32',
+    'congestion_surcharge': 'float32',
+}
+YELLOW_TAXI_DATETIME_COLUMNS = ['tpep_pickup_datetime', 'tpep_dropoff_datetime']
+YELLOW_TAXI_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _peak_rss_mb():
+    """Process-wide peak resident set size in MB, a high-water mark that never goes down (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+def _current_rss_mb():
+    """Current resident set size in MB from /proc/self/statm (None where there is no /proc)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+def require_pyarrow(feature):
+    """Imports pyarrow, or fails up front with a message naming the option that needs it"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(f"{feature} requires pyarrow; install it with `pip install pyarrow` (see requirements.txt)") from None
+    return pyarrow
+
+def _regroup_batches(batches, chunksize, skip_rows=0):
+    """Regroups Arrow record batches (whose size follows blocks/row groups) into chunksize-row tables"""
+    import pyarrow as pa
+
+    pending, pending_rows = [], 0
+    for batch in batches:
+        if skip_rows:
+            # Resuming mid-file: drop rows that were already committed
+            dropped = min(skip_rows, batch.num_rows)
+            batch, skip_rows = batch.slice(dropped), skip_rows - dropped
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while chunksize and pending_rows >= chunksize:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunksize)
+            rest = table.slice(chunksize)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
+
 class DataLoader:
     """Base class for data ingestion"""
     def __init__(self, file_path):
         self.file_path = file_path
+        self.chunk_stats = [] # Per-chunk parse time / memory, filled while iterating
 
     def load(self):
         raise NotImplementedError("Subclasses must implement load()")
 
+    @staticmethod
+    def _arrow_to_frame(table, dtypes):
+        # Integer columns with nulls would come back as float64 - map them onto nullable dtypes
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        return df.astype(dtypes, copy=False)
+
+    def _measure_chunks(self, reader):
+        """Wraps a chunk iterator, recording parse time and memory for every chunk"""
+        self.chunk_stats = []
+        previous_rss = _current_rss_mb()
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            rss = _current_rss_mb()
+            stats = {
+                "chunk": len(self.chunk_stats) + 1,
+                "rows": len(chunk),
+                "parse_seconds": round(time.perf_counter() - start, 3),
+                "frame_mb": round(float(chunk.memory_usage(deep=True).sum()) / (1024 * 1024), 1),
+                "rss_mb": rss, # Resident set size once this chunk is parsed
+                "rss_delta_mb": round(rss - previous_rss, 1) if rss is not None and previous_rss is not None else None,
+                "process_peak_rss_mb": _peak_rss_mb() # Cumulative high-water mark, not this chunk's
+            }
+            previous_rss = rss
+            self.chunk_stats.append(stats)
+            delta = "" if stats['rss_delta_mb'] is None else f" ({stats['rss_delta_mb']:+} MB)"
+            logger.info(
+                f"Chunk {stats['chunk']}: {stats['rows']} rows parsed in {stats['parse_seconds']}s, "
+                f"frame {stats['frame_mb']} MB, RSS {stats['rss_mb']} MB{delta}, "
+                f"process peak {stats['process_peak_rss_mb']} MB"
+            )
+            yield chunk
+
 class CSVLoader(DataLoader):
     """Loads raw trip data or lookup tables from CSV"""
-    def load(self, chunksize=None):
+    def load(self, chunksize=None, typed=False, engine='c', skip_rows=0):
+        """
+        typed=False: plain pd.read_csv (used for lookup tables)
+        typed=True:  yellow-taxi schema - column projection, compact dtypes and datetimes parsed
+                     in the reader with a fixed format. engine='pyarrow' streams through the
+                     multithreaded Arrow CSV reader instead of the pandas C parser.
+        skip_rows:   number of data rows (after the header) to skip, used to resume a partial load
+        """
+        if typed and engine == 'pyarrow':
+            require_pyarrow("--csv-engine pyarrow")
         print(f"Loading CSV from: {self.file_path}")
-        return pd.read_csv(self.file_path, chunksize=chunksize)
+        header = pd.read_csv(self.file_path, nrows=0).columns
+        # Resuming: skip the header and the committed rows as one integer count and name the columns from the
+        # header read above. A range() would be materialised as a set of every skipped row number, and a
+        # callable would be called back for every row of the file, not just the skipped prefix.
+        resume = {"skiprows": skip_rows + 1, "header": None, "names": list(header)} if skip_rows else {}
+        if not typed:
+            return pd.read_csv(self.file_path, chunksize=chunksize, **resume)
+
+        dtypes = {c: t for c, t in YELLOW_TAXI_SCHEMA.items() if c in header}
+        date_cols = [c for c in YELLOW_TAXI_DATETIME_COLUMNS if c in header]
+
+        if engine == 'pyarrow':
+            reader = self._read_arrow_chunks(dtypes, date_cols, chunksize or 100000, skip_rows)
+        else:
+            # The C parser is several times slower on nullable integer dtypes, so IDs are parsed
+            # as float32 (exact for these small codes) and narrowed once per chunk
+            parse_dtypes = {c: ('float32' if t.startswith('Int') else t) for c, t in dtypes.items()}
+            nullable_ints = {c: t for c, t in dtypes.items() if t.startswith('Int')}
+            reader = pd.read_csv(
+                self.file_path,
+                usecols=list(dtypes) + date_cols,
+                dtype=parse_dtypes,
+                parse_dates=date_cols,
+                date_format=YELLOW_TAXI_DATETIME_FORMAT,
+                chunksize=chunksize,
+                **resume
+            )
+            if chunksize is None:
+                reader = iter([reader])
+            reader = (chunk.astype(nullable_ints, copy=False) for chunk in reader)
+        return self._measure_chunks(reader)
+
+    def _read_arrow_chunks(self, dtypes, date_cols, chunksize, skip_rows=0):
+        """Streams record batches from pyarrow.csv and regroups them into ~chunksize-row frames"""
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        arrow_types = {c: pa.from_numpy_dtype(pd.api.types.pandas_dtype(t.lower())) for c, t in dtypes.items()}
+        arrow_types.update({c: pa.timestamp('s') for c in date_cols})
+        stream = pa_csv.open_csv(
+            self.file_path,
+            read_options=pa_csv.ReadOptions(block_size=16 << 20, skip_rows_after_names=skip_rows),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(dtypes) + date_cols,
+                column_types=arrow_types,
+                timestamp_parsers=[YELLOW_TAXI_DATETIME_FORMAT]
+            )
+        )
+
+        for table in _regroup_batches(stream, chunksize):
+            yield self._arrow_to_frame(table, dtypes)
+
+class ParquetLoader(DataLoader):
+    """Streams TLC trip data from Parquet record batches (same chunk interface as CSVLoader)"""
+    def load(self, chunksize=None, columns=None, start_date=None, end_date=None, require_locations=True, skip_rows=0):
+        """
+        Yields DataFrames of at most `chunksize` rows.
+        Column projection and predicates are pushed down into the Arrow scanner, so row groups
+        that can't match (via Parquet statistics) are skipped without being decoded:
+        - columns: defaults to the yellow-taxi schema columns present in the file
+        - start_date / end_date: inclusive 'YYYY-MM-DD' bounds on tpep_pickup_datetime
+        - require_locations: drop rows with null PU/DO location IDs inside the reader
+        - skip_rows: rows (after filtering) to skip, used to resume a partial load
+        """
+        import pyarrow.dataset as ds
+
+        print(f"Loading Parquet from: {self.file_path}")
+        dataset = ds.dataset(self.file_path, format='parquet')
+        available = set(dataset.schema.names)
+        if columns is None:
+            columns = [c for c in list(YELLOW_TAXI_SCHEMA) + YELLOW_TAXI_DATETIME_COLUMNS if c in available]
+
+        scanner = dataset.scanner(
+            columns=columns,
+            filter=self._build_filter(dataset.schema, start_date, end_date, require_locations),
+            batch_size=chunksize or 100000
+        )
+        dtypes = {c: t for c, t in YELLOW_TAXI_SCHEMA.items() if c in columns}
+        frames = (self._arrow_to_frame(table, dtypes) for table in _regroup_batches(scanner.to_batches(), chunksize, skip_rows))
+        return self._measure_chunks(frames)
+
+    @staticmethod
+    def _build_filter(schema, start_date, end_date, require_locations):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        expr = None
+        def both(a, b):
+            return b if a is None else a & b
+
+        pickup = 'tpep_pickup_datetime'
+        if pickup in schema.names and (start_date or end_date):
+            ts_type = schema.field(pickup).type
+            if start_date:
+                expr = both(expr, ds.field(pickup) >= pa.scalar(pd.Timestamp(start_date), type=ts_type))
+            if end_date:
+                # Inclusive end date -> strictly before midnight of the next day
+                upper = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+                expr = both(expr, ds.field(pickup) < pa.scalar(upper, type=ts_type))
+        if require_locations:
+            for col in ('PULocationID', 'DOLocationID'):
+                if col in schema.names:
+                    expr = both(expr, ds.field(col).is_valid())
+        return expr
 
 class ShapefileLoader(DataLoader):
     """Loads spatial data from ESRI Shapefiles and converts to GeoJSON-like format"""
+    # EPSG:2263 is NAD83 / New York Long Island (standard for NYC data)
+    # EPSG:4326 is WGS84 (Lat/Long) for Leaflet
+    SOURCE_CRS = "EPSG:2263"
+    TARGET_CRS = "EPSG:4326"
+    CACHE_VERSION = 1
+
+    def __init__(self, file_path, cache_dir=None):
+        super().__init__(file_path)
+        # Reprojected geometry is cached next to the shapefile, keyed by the shapefile's content hash
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), 'cache')
+        self.load_stats = {}
+        self.arrays = None
+
     def load(self):
         print(f"Loading Shapefile from: {self.file_path}")
         try:
-            import pyproj
-            # EPSG:2263 is NAD83 / New York Long Island (standard for NYC data)
-            # EPSG:4326 is WGS84 (Lat/Long) for Leaflet
-            transformer = pyproj.Transformer.from_crs("EPSG:2263", "EPSG:4326", always_xy=True)
-            
-            sf = shapefile.Reader(self.file_path)
-            fields = [f[0] for f in sf.fields][1:] # Skip DeletionFlag
-            records = []
-            for sr in sf.shapeRecords():
-                atr = dict(zip(fields, sr.record))
-                geom = sr.shape.__geo_interface__
-                
-                # Reproject coordinates
-                if geom['type'] == 'Polygon':
-                    new_coords = []
-                    for ring in geom['coordinates']:
-                        new_coords.append([list(transformer.transform(x, y)) for x, y in ring])
-                    geom['coordinates'] = new_coords
-                elif geom['type'] == 'MultiPolygon':
-                    new_poly_coords = []
-                    for poly in geom['coordinates']:
-                        new_rings = []
-                        for ring in poly:
-                            new_rings.append([list(transformer.transform(x, y)) for x, y in ring])
-                        new_poly_coords.append(new_rings)
-                    geom['coordinates'] = new_poly_coords
-                
-                records.append({
-                    "attributes": atr,
-                    "geometry": geom
-                })
+            start = time.perf_counter()
+            arrays, cache_hit = self.load_arrays()
+            self.arrays = arrays  # Kept for consumers that work on the flat arrays (map payloads)
+            records = arrays.to_records()
+            self.load_stats = {
+                "zones": len(records),
+                "vertices": int(len(arrays.coords)),
+                "cache": "warm" if cache_hit else "cold",
+                "seconds": round(time.perf_counter() - start, 3)
+            }
+            logger.info(
+                f"Loaded {self.load_stats['zones']} zones ({self.load_stats['vertices']} vertices) "
+                f"in {self.load_stats['seconds']}s - {self.load_stats['cache']} geometry cache"
+            )
             return records
         except Exception as e:
             print(f"Error loading shapefile: {e}")
             return []
 
+    def load_arrays(self):
+        """Returns (ZoneGeometryArrays in WGS84, cache_hit); pyproj is only touched on a cache miss"""
+        cache_path = os.path.join(self.cache_dir, f"zones_{self._source_hash()[:16]}.npz")
+        if os.path.exists(cache_path):
+            try:
+                return ZoneGeometryArrays.load(cache_path), True
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable geometry cache {cache_path}: {e}")
+
+        arrays = self._reproject()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp.npz"
+            arrays.save(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write geometry cache {cache_path}: {e}")
+        return arrays, False
+
+    def _source_hash(self):
+        """Content hash of the shapefile components plus everything that changes the cached output"""
+        digest = hashlib.sha256(f"{self.CACHE_VERSION}|{self.SOURCE_CRS}|{self.TARGET_CRS}".encode())
+        stem = os.path.splitext(self.file_path)[0]
+        for ext in ('.shp', '.shx', '.dbf'):
+            path = stem + ext
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+        return digest.hexdigest()
+
+    def _reproject(self):
+        """Reprojects every vertex of every shape in a single vectorized pyproj call"""
+        import pyproj
+        transformer = pyproj.Transformer.from_crs(self.SOURCE_CRS, self.TARGET_CRS, always_xy=True)
+
+        sf = shapefile.Reader(self.file_path)
+        fields = [f[0] for f in sf.fields][1:] # Skip DeletionFlag
+        shape_records = sf.shapeRecords()
+
+        polygon_types = (shapefile.POLYGON, shapefile.POLYGONZ, shapefile.POLYGONM)
+        point_arrays = [
+            np.asarray(sr.shape.points, dtype=np.float64).reshape(-1, 2)
+            if sr.shape.shapeType in polygon_types else np.empty((0, 2))
+            for sr in shape_records
+        ]
+        all_points = np.concatenate(point_arrays) if point_arrays else np.empty((0, 2))
+        lon, lat = transformer.transform(all_points[:, 0], all_points[:, 1])
+        projected = np.column_stack([lon, lat])
+
+        attributes, geometries = [], []
+        offset = 0
+        for sr, points in zip(shape_records, point_arrays):
+            attributes.append(dict(zip(fields, sr.record)))
+            if not len(points):
+                geometries.append(None)
+                continue
+            shape_points = projected[offset:offset + len(points)]
+            offset += len(points)
+            # Let pyshp group rings into polygons/holes exactly as it did for the source coordinates
+            shape = shapefile.Shape(shapeType=shapefile.POLYGON, points=shape_points.tolist(), parts=list(sr.shape.parts))
+            geometries.append(shape.__geo_interface__)
+        return ZoneGeometryArrays.from_geometries(attributes, geometries)
+
 if __name__ == "__main__":
     # Test snippet
     # loader.py is in backend/etl/ingestion/loaders.py
@@ -85,6 +381,10 @@ if __name__ == "__main__":
     if os.path.exists(shp_path):
         loader = ShapefileLoader(shp_path)
         zones = loader.load()
-        print(f"Loaded {len(zones)} zones from shapefile.")
+        print(f"Loaded {len(zones)} zones from shapefile: {loader.load_stats}")
+        # Second load is served from the on-disk geometry cache
+        loader = ShapefileLoader(shp_path)
+        loader.load()
+        print(f"Reloaded zones: {loader.load_stats}")
     else:
         print("Shapefile not found.")
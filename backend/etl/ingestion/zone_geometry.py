@@ -0,0 +1,110 @@
+# backend\etl\ingestion\zone_geometry.py
+# Zone Geometry Arrays: Compact, array-backed storage for reprojected zone polygons (flat coordinate
+# buffer + offset arrays) with .npz persistence, used as the on-disk geometry cache.
+
+import json
+import numpy as np
+
+# GeoJSON geometry type codes stored per shape
+GEOM_NONE, GEOM_POLYGON, GEOM_MULTIPOLYGON = 0, 1, 2
+_TYPE_NAMES = {GEOM_POLYGON: 'Polygon', GEOM_MULTIPOLYGON: 'MultiPolygon'}
+
+
+class ZoneGeometryArrays:
+    """
+    All zone polygons in one float64 (N, 2) coordinate buffer plus three offset arrays:
+    - ring_offsets[r]:r+1]              -> vertices of ring r
+    - polygon_ring_offsets[p]:p+1]      -> rings of polygon p (outer ring first, then holes)
+    - shape_polygon_offsets[s]:s+1]     -> polygons of shape s
+    geom_types[s] keeps the GeoJSON type so Polygon/MultiPolygon round-trips exactly.
+    """
+
+    def __init__(self, attributes, coords, ring_offsets, polygon_ring_offsets, shape_polygon_offsets, geom_types):
+        self.attributes = attributes
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.polygon_ring_offsets = polygon_ring_offsets
+        self.shape_polygon_offsets = shape_polygon_offsets
+        self.geom_types = geom_types
+
+    def __len__(self):
+        return len(self.attributes)
+
+    @classmethod
+    def from_geometries(cls, attributes, geometries):
+        """Flattens GeoJSON Polygon/MultiPolygon dicts (anything else is stored as an empty shape)"""
+        coords, ring_offsets, polygon_ring_offsets, shape_polygon_offsets, geom_types = [], [0], [0], [0], []
+        vertex_count = 0
+        for geom in geometries:
+            if geom and geom.get('type') == 'Polygon':
+                polygons = [geom['coordinates']]
+                geom_types.append(GEOM_POLYGON)
+            elif geom and geom.get('type') == 'MultiPolygon':
+                polygons = geom['coordinates']
+                geom_types.append(GEOM_MULTIPOLYGON)
+            else:
+                polygons = []
+                geom_types.append(GEOM_NONE)
+            for polygon in polygons:
+                for ring in polygon:
+                    coords.append(np.asarray(ring, dtype=np.float64).reshape(-1, 2))
+                    vertex_count += len(ring)
+                    ring_offsets.append(vertex_count)
+                polygon_ring_offsets.append(len(ring_offsets) - 1)
+            shape_polygon_offsets.append(len(polygon_ring_offsets) - 1)
+
+        return cls(
+            attributes,
+            np.concatenate(coords) if coords else np.empty((0, 2)),
+            np.asarray(ring_offsets, dtype=np.int64),
+            np.asarray(polygon_ring_offsets, dtype=np.int64),
+            np.asarray(shape_polygon_offsets, dtype=np.int64),
+            np.asarray(geom_types, dtype=np.int8)
+        )
+
+    def rings(self, shape_index):
+        """Yields (polygon_index, ring coordinate view) for every ring of a shape"""
+        p_start, p_end = self.shape_polygon_offsets[shape_index], self.shape_polygon_offsets[shape_index + 1]
+        for p in range(p_start, p_end):
+            for r in range(self.polygon_ring_offsets[p], self.polygon_ring_offsets[p + 1]):
+                yield p - p_start, self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+
+    def geometry(self, shape_index):
+        """Rebuilds the GeoJSON geometry dict for one shape"""
+        geom_type = int(self.geom_types[shape_index])
+        if geom_type == GEOM_NONE:
+            return None
+        polygons = []
+        for polygon_index, ring in self.rings(shape_index):
+            if polygon_index == len(polygons):
+                polygons.append([])
+            polygons[polygon_index].append(ring.tolist())
+        coordinates = polygons[0] if geom_type == GEOM_POLYGON else polygons
+        return {"type": _TYPE_NAMES[geom_type], "coordinates": coordinates}
+
+    def to_records(self):
+        """Same record layout ShapefileLoader.load() has always returned"""
+        return [{"attributes": attr, "geometry": self.geometry(i)} for i, attr in enumerate(self.attributes)]
+
+    def save(self, path):
+        np.savez(
+            path,
+            attributes=np.frombuffer(json.dumps(self.attributes, default=str).encode('utf-8'), dtype=np.uint8),
+            coords=self.coords,
+            ring_offsets=self.ring_offsets,
+            polygon_ring_offsets=self.polygon_ring_offsets,
+            shape_polygon_offsets=self.shape_polygon_offsets,
+            geom_types=self.geom_types
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                json.loads(data['attributes'].tobytes().decode('utf-8')),
+                data['coords'],
+                data['ring_offsets'],
+                data['polygon_ring_offsets'],
+                data['shape_polygon_offsets'],
+                data['geom_types']
+            )
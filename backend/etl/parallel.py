@@ -0,0 +1,117 @@
+# backend\etl\parallel.py
+# Parallel Chunk Processor: Runs the cleaning/feature stages of the ETL in a process pool while a
+# reader thread prefetches raw chunks and a single writer thread commits results in source order.
+
+import logging
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("ETL-Parallel")
+
+# Sentinel marking the end of a queue stream
+_DONE = object()
+
+# Workers start while the reader and writer threads run, so they must not be forked from this process: a fork
+# copies whichever locks those threads hold at that moment (CSV reader, queues, SQLite), and the child can block
+# on one forever. forkserver forks from a clean single-threaded server; spawn starts a fresh interpreter.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class ParallelChunkProcessor:
+    """
+    Three-stage pipeline: reader thread -> process pool -> single ordered writer.
+
+    Memory stays bounded because both hand-off queues are bounded:
+    - at most `prefetch` raw chunks wait in the read-ahead queue
+    - at most `max_pending` chunks are being transformed or waiting to be written
+    When the writer falls behind, submission blocks, which in turn stops the reader.
+    """
+
+    def __init__(self, transform, workers, prefetch=2, max_pending=None):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.transform = transform  # Must be a picklable, module-level function
+        self.workers = workers
+        self.prefetch = max(1, prefetch)
+        self.max_pending = max_pending or workers * 2
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _read_ahead(self, chunks, read_queue):
+        """Reader thread: pulls chunks from the loader so parsing overlaps with transformation"""
+        try:
+            for chunk in chunks:
+                while not self._stop.is_set():
+                    try:
+                        read_queue.put(chunk, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            read_queue.put(_DONE)
+
+    def _write_in_order(self, write_queue, write):
+        """Writer thread: the only stage that touches the database, committing in submission order"""
+        try:
+            while True:
+                future = write_queue.get()
+                if future is _DONE:
+                    break
+                if self._stop.is_set():
+                    future.cancel()
+                    continue
+                write(future.result())
+        except Exception as e:
+            self._fail(e)
+            # Drain remaining futures so the producer never blocks on a full queue
+            while True:
+                future = write_queue.get()
+                if future is _DONE:
+                    break
+                future.cancel()
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+    def run(self, chunks, write):
+        """Transforms every chunk in parallel and calls write(result) for each one, in order"""
+        read_queue = queue.Queue(maxsize=self.prefetch)
+        write_queue = queue.Queue(maxsize=self.max_pending)
+
+        reader = threading.Thread(target=self._read_ahead, args=(chunks, read_queue), name="etl-reader", daemon=True)
+        writer = threading.Thread(target=self._write_in_order, args=(write_queue, write), name="etl-writer", daemon=True)
+
+        logger.info(f"Starting parallel ETL with {self.workers} workers (prefetch={self.prefetch}, max_pending={self.max_pending})")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+            reader.start()
+            writer.start()
+            chunk = None
+            try:
+                while True:
+                    chunk = read_queue.get()
+                    if chunk is _DONE or self._stop.is_set():
+                        break
+                    # Blocks when max_pending results are outstanding (backpressure)
+                    write_queue.put(pool.submit(self.transform, chunk))
+            finally:
+                if chunk is not _DONE:
+                    self._stop.set()
+                    # Unblock the reader if it is waiting on a full queue
+                    while reader.is_alive():
+                        try:
+                            read_queue.get(timeout=0.5)
+                        except queue.Empty:
+                            pass
+                write_queue.put(_DONE)
+                writer.join()
+                reader.join()
+
+        if self._errors:
+            raise self._errors[0]
@@ -4,6 +4,9 @@
 import os
 import sys
 import logging
+import argparse
+import glob
+import hashlib
 
 # Configure Logging for ETL
 log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'logs')
@@ -23,19 +26,165 @@ logger = logging.getLogger("ETL-Pipeline")
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from etl.ingestion.loaders import CSVLoader, ShapefileLoader
+from etl.ingestion.loaders import CSVLoader, ParquetLoader, ShapefileLoader, require_pyarrow
 from etl.processing.cleaner import DataCleaner
+from etl.processing.zone_simplifier import ZoneSimplifier
 from etl.features.feature_engineer import FeatureEngineer
-from dal.trip_dal import TripDAL
+from etl.parallel import ParallelChunkProcessor
+from dal.trip_dal import TripDAL, BulkTripWriter
+from dal.init_db import init_db
+from logic.snapshot import TripSnapshot
+
+TRIP_FILE_EXTENSIONS = ('.csv', '.parquet')
+
+def transform_chunk(chunk):
+    """Cleaning + feature engineering for a single chunk -> (engineered chunk, data-quality report)"""
+    # Cleaning (one compiled mask, per-rule rejection counts)
+    clean_chunk, quality = DataCleaner.clean_trip_data(chunk, with_report=True)
+
+    # Feature Engineering (fused: only the columns the trips table stores)
+    return FeatureEngineer.add_persisted_features(clean_chunk), quality
+
+def transform_task(task):
+    """
+    Worker entry point: (source_path, chunk_index, rows_read, raw_chunk) ->
+    (source_path, chunk_index, rows_read, engineered_chunk, quality_report).
+    Start (dict) and end-of-file (None) markers pass straight through.
+    """
+    source_path, chunk_index, rows_read, chunk = task
+    if chunk is None or isinstance(chunk, dict):
+        return source_path, chunk_index, rows_read, chunk, None
+    return (source_path, chunk_index, rows_read) + transform_chunk(chunk)
+
+def load_trip_chunks(path, chunk_size, typed=False, csv_engine='c', skip_rows=0):
+    """Picks the loader from the file extension; both yield DataFrames of raw TLC columns"""
+    if path.lower().endswith('.parquet'):
+        return ParquetLoader(path).load(chunksize=chunk_size, skip_rows=skip_rows)
+    return CSVLoader(path).load(chunksize=chunk_size, typed=typed, engine=csv_engine, skip_rows=skip_rows)
+
+def file_fingerprint(path, block_size=1 << 20):
+    """sha256 of the file contents - identifies a source file independently of its path/mtime"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def expand_sources(paths):
+    """Expands directories and glob patterns into a sorted list of trip files"""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            matches = [os.path.join(p, f) for f in os.listdir(p) if f.lower().endswith(TRIP_FILE_EXTENSIONS)]
+        else:
+            matches = glob.glob(p) or [p]
+        files.extend(sorted(matches))
+    return [os.path.abspath(f) for f in files]
+
+def prepare_source(dal, path):
+    """
+    Consults the ingestion manifest for a source file. Only reads: the registration (and the purge of a
+    file that changed) travels to the writer as a start marker, so it never contends with an open bulk
+    transaction and is applied in order with the chunk commits.
+    Returns None when the file is already fully loaded, otherwise (manifest row to resume from, or None to
+    start from the top; start marker for the writer).
+    """
+    stat = os.stat(path)
+    manifest = dal.get_manifest(path)
+    if manifest and manifest['file_size'] == stat.st_size and manifest['file_mtime'] == stat.st_mtime:
+        fingerprint = manifest['fingerprint'] # Unchanged on disk - skip re-hashing
+    else:
+        fingerprint = file_fingerprint(path)
+
+    reset = bool(manifest) and manifest['fingerprint'] != fingerprint
+    if reset:
+        logger.warning(f"{path} changed since it was last loaded - reloading it from scratch")
+        manifest = None
+
+    if manifest and manifest['status'] == 'complete':
+        logger.info(f"Skipping {os.path.basename(path)}: already loaded ({manifest['rows_loaded']} rows)")
+        return None
+
+    return manifest, {"fingerprint": fingerprint, "file_size": stat.st_size, "file_mtime": stat.st_mtime, "reset": reset}
+
+def iter_source_tasks(dal, sources, chunk_size, max_rows=None, typed=False, csv_engine='c'):
+    """
+    Yields (source_path, chunk_index, rows_read, chunk) for every chunk still to be loaded,
+    resuming each file after its last committed chunk. Each file opens with a
+    (source_path, None, None, start marker dict) task, and a (source_path, None, rows_read, None)
+    marker follows a file that was read to the end.
+    max_rows caps the number of source rows read in this run (None = no limit).
+    """
+    budget = max_rows
+    for path in sources:
+        if budget is not None and budget <= 0:
+            break
+        prepared = prepare_source(dal, path)
+        if prepared is None:
+            continue
+        manifest, start = prepared
+        yield path, None, None, start
+
+        chunk_index, rows_read = (manifest['last_chunk'], manifest['rows_read']) if manifest else (-1, 0)
+        if rows_read:
+            logger.info(f"Resuming {os.path.basename(path)} after chunk {chunk_index + 1} ({rows_read} rows already read)")
+
+        exhausted = True
+        for chunk in load_trip_chunks(path, chunk_size, typed, csv_engine, skip_rows=rows_read):
+            if budget is not None:
+                if budget <= 0:
+                    exhausted = False
+                    break
+                if len(chunk) > budget:
+                    chunk = chunk.iloc[:budget]
+                    exhausted = False
+                budget -= len(chunk)
+
+            chunk_index += 1
+            rows_read += len(chunk)
+            yield path, chunk_index, rows_read, chunk
+            if not exhausted:
+                break
+
+        if exhausted:
+            yield path, None, rows_read, None
+
+def run_pipeline(sources=None, workers=1, typed=False, csv_engine='c', chunk_size=100000, max_rows=None,
+                 bulk=False, commit_every=10, drop_indexes=False, snapshot=False):
+    """
+    Runs the full ETL.
+    sources: trip files, directories or glob patterns (defaults to the January 2019 CSV).
+    Files are resumable: the ingestion manifest records each file's fingerprint and last committed
+    chunk, so reruns skip finished files and pick up mid-file after a failure.
+    workers=1 keeps the original serial path; workers>1 transforms chunks in a process pool
+    with read-ahead and a single ordered writer (see etl/parallel.py).
+    typed=True reads the CSV with the declared yellow-taxi schema (compact dtypes, parsed datetimes);
+    csv_engine='pyarrow' additionally switches the typed reader to the Arrow CSV engine.
+    max_rows caps the number of source rows read in this run (None = everything).
+    bulk=True writes through BulkTripWriter: one tuned connection, one transaction per
+    `commit_every` chunks and, with drop_indexes=True, trips indexes rebuilt once at the end.
+    snapshot=True finally exports the trips columns for memory-mapped API workers (logic/snapshot.py).
+    """
+    if csv_engine == 'pyarrow':
+        require_pyarrow("--csv-engine pyarrow") # Fail before any work, not at the first CSV chunk
 
-def run_pipeline():
     # 1. Setup paths
     base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    raw_data_path = os.path.join(base_dir, 'data', 'yellow_tripdata_2019-01.csv')
+    sources = expand_sources(sources or [os.path.join(base_dir, 'data', 'yellow_tripdata_2019-01.csv')])
     shp_path = os.path.join(base_dir, 'data', 'taxi_zones', 'taxi_zones.shp')
     db_path = os.path.join(base_dir, 'database', 'taxi_data.db')
     
+    # Make sure newer bookkeeping tables exist on databases created by an older schema
+    init_db(db_path)
     dal = TripDAL(db_path)
+    # Trips loaded before time_dim was populated get their pickup time key from pickup_date/hour
+    dal.backfill_time_keys()
+    # Rollups are maintained per chunk from here on; build them once for data loaded without them
+    dal.ensure_rollups()
+    # Same for the stratified sample behind the API's approx=true mode
+    dal.ensure_sample()
+    # ... and the quantile sketches behind /api/trips/quantiles
+    dal.ensure_sketches()
     
     # 2. Process Zones (Dimension Table)
     logger.info("--- Processing Taxi Zones ---")
@@ -44,39 +193,98 @@ def run_pipeline():
     if zones:
         clean_zones = DataCleaner.clean_zone_data(zones)
         dal.insert_zones(clean_zones)
+        # Precompute simplified, compressed map payloads for /api/zones
+        try:
+            dal.insert_zone_payloads(ZoneSimplifier.build_payloads(zone_loader.arrays))
+        except Exception as e:
+            logger.error(f"Zone payload build failed, /api/zones will serve raw geometry: {e}")
     
     # 3. Process Trip Data (Fact Table) in chunks to avoid memory issues
-    logger.info("--- Processing Trip Data ---")
-    trip_loader = CSVLoader(raw_data_path)
-    # We'll process a small sample for verification first, or just use chunks
-    chunk_size = 100000 
+    logger.info(f"--- Processing Trip Data ({len(sources)} source files) ---")
+
+    writer = BulkTripWriter(db_path, commit_every=commit_every, drop_indexes=drop_indexes) if bulk else dal
+
+    def commit(result):
+        source_path, chunk_index, rows_read, engineered_chunk, quality = result
+        if isinstance(engineered_chunk, dict):
+            # Start marker: purge a changed file, then register it, on the writer's connection
+            if engineered_chunk['reset']:
+                writer.reset_source(source_path)
+            writer.start_source(
+                source_path, engineered_chunk['fingerprint'], engineered_chunk['file_size'], engineered_chunk['file_mtime']
+            )
+            return
+        if engineered_chunk is None:
+            writer.complete_source(source_path)
+            logger.info(f"Finished {os.path.basename(source_path)} ({rows_read} rows read)")
+            return
+        # Storage: chunk rows, data-quality counts and manifest progress are committed together
+        writer.commit_chunk(source_path, chunk_index, rows_read, engineered_chunk, quality)
     
     try:
-        chunks = trip_loader.load(chunksize=chunk_size)
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Processing chunk {i+1}...")
-            
-            # Cleaning
-            clean_chunk = DataCleaner.clean_trip_data(chunk)
-            
-            # Feature Engineering
-            engineered_chunk = FeatureEngineer.add_time_features(clean_chunk)
-            engineered_chunk = FeatureEngineer.add_calculated_metrics(engineered_chunk)
-            
-            # Storage
-            # Note: We need pickup_time_id and dropoff_time_id for the star schema
-            # For now, we'll store the raw datetimes or handle dimensional IDs later
-            # In a full star schema, we'd lookup/insert into time_dim first.
-            
-            dal.insert_trips(engineered_chunk)
-            
-            # Process up to 10 chunks (1 million rows) for a solid demo
-            if i >= 9: 
-                break
+        tasks = iter_source_tasks(dal, sources, chunk_size, max_rows, typed, csv_engine)
+
+        if workers > 1:
+            processor = ParallelChunkProcessor(transform_task, workers=workers)
+            processor.run(tasks, commit)
+        else:
+            for task in tasks:
+                if task[1] is not None:
+                    logger.info(f"Processing chunk {task[1] + 1} of {os.path.basename(task[0])}...")
+                commit(transform_task(task))
                 
         logger.info("ETL Pipeline execution complete.")
     except Exception as e:
         logger.error(f"Pipeline error: {e}")
+    finally:
+        writer.close()
+
+    # 4. Columnar snapshot for the API's memory-mapped backend
+    if snapshot:
+        try:
+            manifest = TripSnapshot.write(db_path)
+            logger.info(f"Wrote trips snapshot: {manifest['rows']} rows, "
+                        f"{len(manifest['days']['row_offsets']) - 1} days in {manifest['seconds']}s")
+        except Exception as e:
+            logger.error(f"Trips snapshot export failed: {e}")
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="NYC Taxi ETL Pipeline")
+    parser.add_argument('sources', nargs='*',
+                        help="Trip files, directories or glob patterns (default: data/yellow_tripdata_2019-01.csv)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes for cleaning/feature stages (1 = serial)")
+    parser.add_argument('--typed', action='store_true',
+                        help="Use schema-aware CSV ingestion (compact dtypes, parsed datetimes)")
+    parser.add_argument('--csv-engine', choices=['c', 'pyarrow'], default='c',
+                        help="CSV parser used by typed ingestion")
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help="Rows per chunk")
+    parser.add_argument('--max-rows', type=int, default=None,
+                        help="Stop after reading this many source rows (the rest is picked up by the next run)")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Bulk-load mode: one tuned connection, batched transactions")
+    parser.add_argument('--commit-every', type=int, default=10,
+                        help="Chunks per transaction in bulk mode")
+    parser.add_argument('--drop-indexes', action='store_true',
+                        help="Bulk mode: drop trips indexes during the load and rebuild them afterwards")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="Export a memory-mappable columnar snapshot of trips after the load")
+    args = parser.parse_args()
+    if args.csv_engine == 'pyarrow':
+        try:
+            require_pyarrow("--csv-engine pyarrow")
+        except ImportError as e:
+            parser.error(str(e))
+    run_pipeline(
+        sources=args.sources,
+        workers=args.workers,
+        typed=args.typed,
+        csv_engine=args.csv_engine,
+        chunk_size=args.chunk_size,
+        max_rows=args.max_rows,
+        bulk=args.bulk,
+        commit_every=args.commit_every,
+        drop_indexes=args.drop_indexes,
+        snapshot=args.snapshot
+    )
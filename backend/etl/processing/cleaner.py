@@ -11,36 +11,106 @@ class DataCleaner:
     """Handles data quality and cleaning steps"""
     
     @staticmethod
-    def clean_trip_data(df):
+    def clean_trip_data(df, with_report=False):
         """
-        Applies cleaning rules:
-        1. Remove trips with negative fare, extra, or mta_tax
-        2. Remove trips with zero or negative distance
-        3. Remove trips with zero passenger count (optional but recommended)
-        4. Handle missing values (fill or drop)
+        Applies TRIP_CLEANING_RULES in one pass: every rule is evaluated into a single keep-mask
+        and the chunk is filtered once at the end (no intermediate copies per rule).
+        with_report=True also returns the data-quality report (see evaluate_rules).
         """
-        initial_count = len(df)
-        
-        # 1. Financial sanity
-        df = df[df['fare_amount'] >= 0]
-        df = df[df['total_amount'] >= 0]
-        
-        # 2. Distance sanity
-        df = df[df['trip_distance'] > 0]
-        
-        # 3. Passenger count (if column exists)
-        if 'passenger_count' in df.columns:
-            df = df[df['passenger_count'] > 0]
-            
-        # 4. Handle NaNs
-        # For this project, we'll drop rows with missing critical IDs
-        df = df.dropna(subset=['PULocationID', 'DOLocationID', 'tpep_pickup_datetime'])
-        
-        logger.info(f"Cleaning complete. Reduced rows from {initial_count} to {len(df)}.")
-        return df
+        mask, report = DataCleaner.evaluate_rules(df, TRIP_CLEANING_RULES)
+        if not mask.all():
+            df = df.take(np.flatnonzero(mask))
+
+        logger.info(f"Cleaning complete. Reduced rows from {report['rows_in']} to {report['rows_out']}.")
+        return (df, report) if with_report else df
+
+    @staticmethod
+    def evaluate_rules(df, rules):
+        """
+        Compiles the rules into one boolean keep-mask.
+        Returns (mask, report) where report = {"rows_in", "rows_out", "rejected": {rule: count}}.
+        Each rule's count is the number of rows it rejects on its own, so a row failing two
+        rules is counted by both (rows_in - rows_out is the number of distinct rows dropped).
+        Rules on a column the chunk doesn't have are skipped, as passenger_count always was.
+        """
+        mask = np.ones(len(df), dtype=bool)
+        rejected = {}
+        for rule in rules:
+            passed = DataCleaner._evaluate_rule(df, rule)
+            if passed is None:
+                continue
+            rejected[rule['name']] = int(len(passed) - np.count_nonzero(passed))
+            mask &= passed
+        report = {"rows_in": len(df), "rows_out": int(np.count_nonzero(mask)), "rejected": rejected}
+        return mask, report
+
+    @staticmethod
+    def _evaluate_rule(df, rule):
+        """Rows passing a single rule as a numpy bool array (missing values fail), or None to skip it"""
+        column = rule['column']
+        if column in DERIVED_COLUMNS:
+            if not all(c in df.columns for c in DERIVED_COLUMNS[column][0]):
+                return None
+            values = DERIVED_COLUMNS[column][1](df)
+        elif column in df.columns:
+            values = df[column]
+        else:
+            return None
+
+        op = rule['op']
+        if op == 'notna':
+            return values.notna().to_numpy()
+
+        bound = rule['value']
+        if pd.api.types.is_datetime64_any_dtype(values):
+            bound = [pd.Timestamp(b) for b in bound] if op == 'between' else pd.Timestamp(bound)
+        if op == 'between':
+            result = (values >= bound[0]) & (values <= bound[1])
+        else:
+            result = getattr(values, op)(bound)
+        # Nullable dtypes give <NA> instead of False for missing values
+        return result.to_numpy(dtype=bool, na_value=False)
 
     @staticmethod
     def clean_zone_data(zones_list):
         """Cleans spatial data if necessary"""
         # Ensure all zones have valid geometry
         return [z for z in zones_list if z.get('geometry')]
+
+
+def _as_datetime(df, column):
+    """Parses a raw datetime column in place (once) so later stages reuse the parsed values"""
+    if not pd.api.types.is_datetime64_any_dtype(df[column]):
+        df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df[column]
+
+
+# Columns computed on demand for rules: name -> (required source columns, function(df) -> Series)
+DERIVED_COLUMNS = {
+    'trip_duration_seconds': (
+        ('tpep_pickup_datetime', 'tpep_dropoff_datetime'),
+        lambda df: (_as_datetime(df, 'tpep_dropoff_datetime') - _as_datetime(df, 'tpep_pickup_datetime')).dt.total_seconds()
+    ),
+}
+
+# Declarative trip cleaning rules, evaluated in order into a single mask.
+# op is a Series comparison ('ge', 'gt', 'le', 'lt'), 'between' (inclusive) or 'notna'.
+# Each name is the key its rejection count is recorded under in the data_quality table.
+TRIP_CLEANING_RULES = [
+    # 1. Financial sanity
+    {"name": "negative_fare", "column": "fare_amount", "op": "ge", "value": 0},
+    {"name": "negative_total", "column": "total_amount", "op": "ge", "value": 0},
+    # 2. Distance sanity
+    {"name": "non_positive_distance", "column": "trip_distance", "op": "gt", "value": 0},
+    # 3. Passenger count (only if the column exists)
+    {"name": "no_passengers", "column": "passenger_count", "op": "gt", "value": 0},
+    # 4. Missing critical IDs
+    {"name": "missing_pickup_location", "column": "PULocationID", "op": "notna"},
+    {"name": "missing_dropoff_location", "column": "DOLocationID", "op": "notna"},
+    {"name": "missing_pickup_time", "column": "tpep_pickup_datetime", "op": "notna"},
+    # 5. Timestamp sanity: TLC yellow taxi records start in 2009
+    {"name": "pickup_time_out_of_range", "column": "tpep_pickup_datetime", "op": "between",
+     "value": ("2009-01-01", "2099-12-31 23:59:59")},
+    # 6. Duration bounds: dropoff not before pickup, and no trip longer than a day
+    {"name": "duration_out_of_range", "column": "trip_duration_seconds", "op": "between", "value": (0, 86400)},
+]
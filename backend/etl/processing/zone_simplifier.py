@@ -0,0 +1,257 @@
+# backend\etl\processing\zone_simplifier.py
+# Zone Geometry Simplifier: Precomputes multi-resolution zone map payloads (Douglas-Peucker per zoom
+# band, quantized coordinates, optional TopoJSON shared-arc encoding) so the API can serve a stored,
+# pre-compressed blob instead of rebuilding GeoJSON on every request.
+
+import gzip
+import hashlib
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("ZoneSimplifier")
+
+# Detail levels served by /api/zones?level=N. Tolerances are in degrees (1e-4 deg ~ 11 m in NYC).
+# Level 0 keeps every vertex; the others target progressively lower Leaflet zoom bands.
+ZONE_DETAIL_LEVELS = [
+    {"level": 0, "tolerance": 0.0, "quantization": 1000000, "zooms": "15+"},
+    {"level": 1, "tolerance": 0.00005, "quantization": 100000, "zooms": "13-14"},
+    {"level": 2, "tolerance": 0.0002, "quantization": 100000, "zooms": "11-12"},
+    {"level": 3, "tolerance": 0.0008, "quantization": 100000, "zooms": "<=10"},
+]
+
+
+def douglas_peucker(points, tolerance):
+    """
+    Boolean keep-mask for an open polyline (N, 2) using iterative Douglas-Peucker.
+    Endpoints are always kept; distances are computed vectorized per segment.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    if n < 3 or tolerance <= 0:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+class ZoneSimplifier:
+    """Builds the stored zone payloads from ZoneGeometryArrays"""
+
+    @staticmethod
+    def _zone_rings(arrays):
+        """
+        One entry per LocationID (first shape wins, matching INSERT OR IGNORE into taxi_zones):
+        (properties, geom_type, [[ring, ...] per polygon]) with rings as float arrays.
+        """
+        zones, seen = [], set()
+        for i, attr in enumerate(arrays.attributes):
+            location_id = attr.get('LocationID')
+            if location_id in seen or arrays.geom_types[i] == 0:
+                continue
+            seen.add(location_id)
+            polygons = []
+            for polygon_index, ring in arrays.rings(i):
+                if polygon_index == len(polygons):
+                    polygons.append([])
+                polygons[polygon_index].append(ring)
+            props = {"id": location_id, "borough": attr.get('borough'), "zone": attr.get('zone')}
+            zones.append((props, int(arrays.geom_types[i]), polygons))
+        return zones
+
+    @staticmethod
+    def _build_topology(zones, quantization):
+        """
+        Quantizes every ring onto an integer grid and cuts rings into arcs at junctions (points
+        where the neighbouring boundary changes). Shared borders become one arc referenced by
+        both zones (reversed as ~index), TopoJSON style.
+        Returns (arcs as int arrays, per-zone ring arc references, bbox, scale).
+        """
+        all_coords = np.concatenate([ring for _, _, polygons in zones for polygon in polygons for ring in polygon])
+        x0, y0 = all_coords.min(axis=0)
+        x1, y1 = all_coords.max(axis=0)
+        scale = np.array([(x1 - x0) / (quantization - 1) or 1.0, (y1 - y0) / (quantization - 1) or 1.0])
+        origin = np.array([x0, y0])
+
+        # 1. Quantize rings, dropping consecutive duplicates created by snapping
+        quantized = []
+        for _, _, polygons in zones:
+            zone_rings = []
+            for polygon in polygons:
+                rings = []
+                for ring in polygon:
+                    q = np.round((ring - origin) / scale).astype(np.int64)
+                    q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+                    if len(q) and not np.array_equal(q[0], q[-1]):
+                        q = np.vstack([q, q[:1]])
+                    rings.append([tuple(p) for p in q.tolist()])
+                zone_rings.append(rings)
+            quantized.append(zone_rings)
+
+        # 2. Junctions: points whose set of (unordered) neighbour pairs differs between visits
+        neighbours = {}
+        for zone_rings in quantized:
+            for rings in zone_rings:
+                for ring in rings:
+                    body = ring[:-1]
+                    m = len(body)
+                    for k, p in enumerate(body):
+                        pair = frozenset((body[k - 1], body[(k + 1) % m]))
+                        neighbours.setdefault(p, set()).add(pair)
+        junctions = {p for p, pairs in neighbours.items() if len(pairs) > 1}
+
+        # 3. Cut rings into arcs and deduplicate (an arc may appear reversed in the neighbour zone)
+        arcs, arc_index = [], {}
+
+        def arc_ref(arc):
+            key = tuple(arc)
+            if key in arc_index:
+                return arc_index[key]
+            reverse_key = key[::-1]
+            if reverse_key in arc_index:
+                return ~arc_index[reverse_key]
+            arc_index[key] = len(arcs)
+            arcs.append(np.asarray(arc, dtype=np.int64))
+            return arc_index[key]
+
+        references = []
+        for zone_rings in quantized:
+            zone_refs = []
+            for rings in zone_rings:
+                polygon_refs = []
+                for ring in rings:
+                    body = ring[:-1]
+                    if len(body) < 3:
+                        continue
+                    cuts = [k for k, p in enumerate(body) if p in junctions]
+                    if not cuts:
+                        # Junction-free ring: rotate to a canonical start so identical rings match
+                        start = min(range(len(body)), key=lambda k: body[k])
+                        rotated = body[start:] + body[:start]
+                        polygon_refs.append([arc_ref(rotated + rotated[:1])])
+                        continue
+                    rotated = body[cuts[0]:] + body[:cuts[0]]
+                    offsets = [k - cuts[0] for k in cuts] + [len(body)]
+                    closed = rotated + rotated[:1]
+                    polygon_refs.append([arc_ref(closed[offsets[j]:offsets[j + 1] + 1]) for j in range(len(cuts))])
+                zone_refs.append(polygon_refs)
+            references.append(zone_refs)
+        return arcs, references, origin, scale
+
+    @staticmethod
+    def _simplify_arcs(arcs, tolerance_units):
+        """Simplifies each shared arc once, so neighbouring zones stay gap-free"""
+        simplified = []
+        for arc in arcs:
+            if tolerance_units > 0 and len(arc) > 2:
+                if np.array_equal(arc[0], arc[-1]):
+                    # Closed (junction-free) ring: split at the vertex farthest from the start
+                    far = int(np.argmax(np.hypot(*(arc - arc[0]).T)))
+                    keep = np.concatenate([
+                        douglas_peucker(arc[:far + 1].astype(float), tolerance_units)[:-1],
+                        douglas_peucker(arc[far:].astype(float), tolerance_units)
+                    ])
+                else:
+                    keep = douglas_peucker(arc.astype(float), tolerance_units)
+                arc = arc[keep]
+            simplified.append(arc)
+        return simplified
+
+    @staticmethod
+    def _ring_from_arcs(refs, arcs):
+        """Stitches arc references back into one closed ring of quantized points"""
+        parts = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            parts.append(arc if not parts else arc[1:])
+        return np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int64)
+
+    @classmethod
+    def build_level(cls, arrays, level):
+        """Returns {"geojson": bytes, "topojson": bytes} (uncompressed JSON) for one detail level"""
+        zones = cls._zone_rings(arrays)
+        arcs, references, origin, scale = cls._build_topology(zones, level['quantization'])
+        # Tolerance in grid units (average of the two axis scales)
+        arcs = cls._simplify_arcs(arcs, level['tolerance'] / float(scale.mean()))
+        decimals = 6 if level['quantization'] >= 1000000 else 5
+
+        features, geometries = [], []
+        for (props, geom_type, _), zone_refs in zip(zones, references):
+            polygons = []
+            for polygon_refs in zone_refs:
+                rings = []
+                for ring_refs in polygon_refs:
+                    ring = cls._ring_from_arcs(ring_refs, arcs)
+                    if len(ring) < 4 and rings:
+                        continue # Hole collapsed below the tolerance
+                    rings.append(np.round(ring * scale + origin, decimals).tolist())
+                if rings and (len(rings[0]) >= 4 or not polygons):
+                    polygons.append(rings)
+            if geom_type == 1 and len(polygons) == 1:
+                geometry = {"type": "Polygon", "coordinates": polygons[0]}
+                topo_arcs = zone_refs[0]
+            else:
+                geometry = {"type": "MultiPolygon", "coordinates": polygons}
+                topo_arcs = zone_refs
+            features.append({**props, "geometry": geometry})
+            geometries.append({
+                "type": geometry["type"], "id": props["id"], "arcs": topo_arcs,
+                "properties": {"borough": props["borough"], "zone": props["zone"]}
+            })
+
+        # TopoJSON arcs are delta-encoded integers
+        encoded_arcs = [np.vstack([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in arcs]
+        topology = {
+            "type": "Topology",
+            "transform": {"scale": scale.tolist(), "translate": origin.tolist()},
+            "objects": {"zones": {"type": "GeometryCollection", "geometries": geometries}},
+            "arcs": encoded_arcs
+        }
+        return {
+            "geojson": json.dumps(features, separators=(',', ':')).encode('utf-8'),
+            "topojson": json.dumps(topology, separators=(',', ':')).encode('utf-8')
+        }
+
+    @classmethod
+    def build_payloads(cls, arrays, levels=ZONE_DETAIL_LEVELS):
+        """
+        Precomputes every (level, format) payload, gzip-compressed, ready to be stored by
+        TripDAL.insert_zone_payloads and served byte-for-byte by the API.
+        """
+        payloads = []
+        for level in levels:
+            for fmt, raw in cls.build_level(arrays, level).items():
+                payloads.append({
+                    "level": level['level'],
+                    "format": fmt,
+                    "tolerance": level['tolerance'],
+                    "raw_bytes": len(raw),
+                    "payload": gzip.compress(raw, compresslevel=9, mtime=0),
+                    "etag": hashlib.sha256(raw).hexdigest()[:32]
+                })
+            sizes = {p['format']: f"{p['raw_bytes'] / 1024:.0f} KB raw / {len(p['payload']) / 1024:.0f} KB gzip"
+                     for p in payloads if p['level'] == level['level']}
+            logger.info(f"Zone payload level {level['level']} (tolerance {level['tolerance']}): {sizes}")
+        return payloads
@@ -3,41 +3,200 @@
 
 import sqlite3
 import os
+import sys
 import time
+import datetime
+import numpy as np
+
+try:
+    from backend.dal.connection import DB_PATH, get_connection_pool
+    from backend.dal.executor import get_query_executor
+    from backend.logic.sketches import QuantileSketch, SKETCH_MEASURES, QUANTILES, RELATIVE_ACCURACY
+    from backend.logic.dimensions import DimensionCache
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from dal.connection import DB_PATH, get_connection_pool
+    from dal.executor import get_query_executor
+    from logic.sketches import QuantileSketch, SKETCH_MEASURES, QUANTILES, RELATIVE_ACCURACY
+    from logic.dimensions import DimensionCache
+
+# time_dim keys are hours since the Unix epoch (see database/schema.sql)
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# The same measures over the raw fact table and over trip_rollups, so every query is written once
+TRIP_EXPRESSIONS = {
+    "trips": "COUNT(*)",
+    "fare": "SUM(fare_amount)",
+    "revenue": "SUM(total_amount)",
+    "distance": "SUM(trip_distance)",
+    "speed": "SUM(speed_mph)",
+    "passengers": "SUM(passenger_count)",
+    "speed_anomalies": "SUM(CASE WHEN speed_mph > 80 THEN 1 ELSE 0 END)",
+    "fare_anomalies": "SUM(CASE WHEN trip_distance < 1 AND fare_amount > 100 THEN 1 ELSE 0 END)",
+    "f_speed_sum": "SUM(CASE WHEN speed_mph <= 80 THEN speed_mph ELSE 0 END)",
+    "f_speed_count": "SUM(CASE WHEN speed_mph <= 80 THEN 1 ELSE 0 END)",
+    "speed_count": "COUNT(speed_mph)",
+    "distance_count": "COUNT(trip_distance)",
+    "avg_speed": "AVG(speed_mph)",
+    "avg_distance": "AVG(trip_distance)",
+    "hour": "pickup_hour",
+}
+ROLLUP_EXPRESSIONS = {
+    "trips": "SUM(trip_count)",
+    "fare": "SUM(fare_sum)",
+    "revenue": "SUM(revenue_sum)",
+    "distance": "SUM(distance_sum)",
+    "speed": "SUM(speed_sum)",
+    "passengers": "SUM(passenger_sum)",
+    "speed_anomalies": "SUM(speed_anomalies)",
+    "fare_anomalies": "SUM(fare_anomalies)",
+    "f_speed_sum": "SUM(f_speed_sum)",
+    "f_speed_count": "SUM(f_speed_count)",
+    "speed_count": "SUM(speed_count)",
+    "distance_count": "SUM(trip_count)",
+    "avg_speed": "(SUM(speed_sum) / NULLIF(SUM(speed_count), 0))",
+    "avg_distance": "(SUM(distance_sum) / NULLIF(SUM(trip_count), 0))",
+    "hour": "(pickup_time_id % 24)",
+}
+# Rows of trip_rollups holding pickup-side / dropoff-side totals (the other zone is 0 = any)
+ROLLUP_SIDE_CLAUSES = {
+    "pickup": ["dropoff_location_id = 0", "pickup_location_id <> 0"],
+    "dropoff": ["pickup_location_id = 0", "dropoff_location_id <> 0"],
+}
 
 class TripAggregator:
     """Business Logic Layer: Handles complex data aggregations"""
+
+    # Execution backend: 'sql' (SQLite, the default) or 'columnar' (logic/columnar.py, in-memory NumPy)
+    backend = os.environ.get('TRIP_AGGREGATOR_BACKEND', 'sql')
+
+    @staticmethod
+    def time_key_range(start_date=None, end_date=None):
+        """Inclusive YYYY-MM-DD dates -> (first, last) pickup_time_id bounds; None for an open end"""
+        first = (datetime.date.fromisoformat(start_date[:10]).toordinal() - EPOCH_ORDINAL) * 24 if start_date else None
+        last = (datetime.date.fromisoformat(end_date[:10]).toordinal() - EPOCH_ORDINAL) * 24 + 23 if end_date else None
+        return first, last
+
+    @staticmethod
+    def time_clauses(filters, column="pickup_time_id"):
+        """start_date/end_date filters as integer time-key range predicates: (clauses, params)"""
+        clauses, params = [], []
+        if filters:
+            first, last = TripAggregator.time_key_range(filters.get('start_date'), filters.get('end_date'))
+            if first is not None:
+                clauses.append(f"{column} >= ?")
+                params.append(first)
+            if last is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(last)
+        return clauses, params
+
+    @staticmethod
+    def rollups_ready(cur):
+        """True once the ETL has built trip_rollups and keeps them current"""
+        try:
+            row = cur.execute("SELECT value FROM etl_state WHERE key = 'rollups_ready'").fetchone()
+        except sqlite3.OperationalError:
+            return False # Database created before rollups existed
+        return bool(row) and row[0] == '1'
+
+    @staticmethod
+    def fact_source(cur, side="pickup"):
+        """
+        Where to aggregate from: (table, expressions, base clauses).
+        Every filter the dashboard sends (date range, pickup/dropoff zone, borough) is expressible on the
+        rollups, so they are used whenever they are ready; otherwise the trips table is scanned.
+        Location and pickup_time_id columns have the same names in both tables.
+        """
+        if TripAggregator.rollups_ready(cur):
+            return "trip_rollups", ROLLUP_EXPRESSIONS, list(ROLLUP_SIDE_CLAUSES[side])
+        return "trips", TRIP_EXPRESSIONS, []
+
+    @staticmethod
+    def data_version(cur=None):
+        """The data_version stamp the ETL bumps with every commit that changes trips or zones"""
+        conn = None if cur else TripAggregator.connect()
+        try:
+            row = (cur or conn).execute("SELECT value FROM etl_state WHERE key = 'data_version'").fetchone()
+        except sqlite3.OperationalError:
+            return None # Database created before etl_state existed
+        finally:
+            if conn:
+                conn.close()
+        return row[0] if row else '0'
+
+    @staticmethod
+    def columnar_engine():
+        """The in-memory NumPy backend when TripAggregator.backend == 'columnar', else None (SQL)"""
+        if TripAggregator.backend != 'columnar':
+            return None
+        try:
+            from backend.logic.columnar import ColumnarTripStore
+        except ImportError:
+            from columnar import ColumnarTripStore
+        return ColumnarTripStore.shared(TripAggregator.db_path())
+
+    @staticmethod
+    def db_path():
+        return DB_PATH
+
+    @staticmethod
+    def dimensions(cur=None):
+        """The process-wide taxi_zones snapshot (logic/dimensions.py), reloaded when the ETL changes the zones"""
+        return DimensionCache.get(cur, TripAggregator.db_path())
+
+    @staticmethod
+    def connect():
+        """Pooled read-only connection (tuned once, reused); conn.close() returns it to the pool"""
+        return get_connection_pool().connect()
+
+    @staticmethod
+    def approximate(name, *args):
+        """
+        The approx=True answer of aggregator `name` from the stratified trip sample (logic/approx.py),
+        or None while the ETL has not drawn the sample (the caller then answers exactly)
+        """
+        try:
+            from backend.logic.approx import SampleEstimator
+        except ImportError:
+            from logic.approx import SampleEstimator
+        conn = TripAggregator.connect()
+        try:
+            ready = SampleEstimator.ready(conn)
+        finally:
+            conn.close()
+        return getattr(SampleEstimator, name)(*args) if ready else None
+
+    @staticmethod
+    def run_queries(queries):
+        """Runs independent {name: (sql, params) or callable(conn)} reads concurrently (see dal/executor.py)"""
+        return get_query_executor().run(queries)
     
     @staticmethod
-    def get_global_summary(filters):
+    def get_global_summary(filters, approx=False):
         """Ultra-High-Performance Aggregator: Bypasses heavy joins using deferral"""
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path)
-        # Performance Tuning
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA synchronous=NORMAL")
+        if approx:
+            result = TripAggregator.approximate("get_global_summary", filters)
+            if result is not None:
+                return result
+        engine = TripAggregator.columnar_engine()
+        if engine:
+            return engine.get_global_summary(filters)
+
+        conn = TripAggregator.connect()
         cur = conn.cursor()
         
         try:
-            # 1. Map locations to boroughs (Fast, 263 rows)
-            cur.execute("SELECT location_id, borough FROM taxi_zones")
-            loc_to_borough = {r[0]: r[1] for r in cur.fetchall()}
+            # 1. Map locations to boroughs (cached dimension snapshot, 263 rows)
+            loc_to_borough = TripAggregator.dimensions(cur).loc_to_borough
             
             selected_borough = filters.get('borough') if filters.get('borough') != 'all' else None
-            start_date = filters.get('start_date')
-            end_date = filters.get('end_date')
             
             # 2. Base Query: Group by location_id FIRST (This avoids 1M join operations!)
             # We calculate all raw sums and counts by zone
-            where_clauses = []
-            params = []
-            
-            if start_date:
-                where_clauses.append("pickup_date >= ?")
-                params.append(start_date)
-            if end_date:
-                where_clauses.append("pickup_date <= ?")
-                params.append(end_date)
+            table, e, where_clauses = TripAggregator.fact_source(cur)
+            time_where, params = TripAggregator.time_clauses(filters)
+            where_clauses += time_where
             if filters.get('zone_id'):
                 where_clauses.append("pickup_location_id = ?")
                 params.append(filters['zone_id'])
@@ -47,17 +206,17 @@ class TripAggregator:
             query = f"""
                 SELECT 
                     pickup_location_id,
-                    COUNT(*) as trip_count,
-                    COALESCE(SUM(fare_amount), 0) as total_fare,
-                    COALESCE(SUM(total_amount), 0) as total_rev,
-                    COALESCE(SUM(trip_distance), 0) as total_dist,
-                COALESCE(SUM(speed_mph), 0) as total_speed,
-                COALESCE(SUM(passenger_count), 0) as total_pass,
-                COALESCE(SUM(CASE WHEN speed_mph > 80 THEN 1 ELSE 0 END), 0) as speed_anomalies,
-                    COALESCE(SUM(CASE WHEN trip_distance < 1 AND fare_amount > 100 THEN 1 ELSE 0 END), 0) as fare_anomalies,
-                    COALESCE(SUM(CASE WHEN speed_mph <= 80 THEN speed_mph ELSE 0 END), 0) as f_speed_sum,
-                    COALESCE(SUM(CASE WHEN speed_mph <= 80 THEN 1 ELSE 0 END), 0) as f_speed_count
-                FROM trips
+                    {e['trips']} as trip_count,
+                    COALESCE({e['fare']}, 0) as total_fare,
+                    COALESCE({e['revenue']}, 0) as total_rev,
+                    COALESCE({e['distance']}, 0) as total_dist,
+                COALESCE({e['speed']}, 0) as total_speed,
+                COALESCE({e['passengers']}, 0) as total_pass,
+                COALESCE({e['speed_anomalies']}, 0) as speed_anomalies,
+                    COALESCE({e['fare_anomalies']}, 0) as fare_anomalies,
+                    COALESCE({e['f_speed_sum']}, 0) as f_speed_sum,
+                    COALESCE({e['f_speed_count']}, 0) as f_speed_count
+                FROM {table}
                 {where_str}
                 GROUP BY 1
             """
@@ -65,149 +224,54 @@ class TripAggregator:
             cur.execute(query, params)
             rows = cur.fetchall()
             
-            # 3. Post-Aggregation in Python (Extremely fast for 263 rows)
-            borough_data = {}
-            for r in rows:
-                loc_id, count, fare, rev, dist, speed, pass_count, speed_anom, fare_anom, f_sum, f_count = r
-                b_name = loc_to_borough.get(loc_id, 'Other')
-                
-                if b_name not in borough_data:
-                    borough_data[b_name] = {
-                        "trips": 0, "fare": 0, "rev": 0, "dist": 0, 
-                        "speed": 0, "pass": 0, "speed_anom": 0, "fare_anom": 0, "f_sum": 0, "f_count": 0
-                    }
-                
-                s = borough_data[b_name]
-                s['trips'] += count
-                s['fare'] += fare
-                s['rev'] += rev
-                s['dist'] += dist
-                s['speed'] += speed
-                s['pass'] += pass_count
-                s['speed_anom'] += speed_anom
-                s['fare_anom'] += fare_anom
-                s['f_sum'] += f_sum
-                s['f_count'] += f_count
-
-            # Final Calculations
-            global_trips = 0
-            global_fare = 0
-            global_rev = 0
-            global_dist = 0
-            global_speed_sum = 0
-            global_passengers = 0
-            global_speed_anom = 0
-            global_fare_anom = 0
-            global_f_sum = 0
-            global_f_count = 0
-            choke_points = 0
-        
-            congestion_index = {}
-
-            for b_name, s in borough_data.items():
-                avg_b_speed = s['f_sum'] / max(s['f_count'], 1)
-                congestion_index[b_name] = round(20 / avg_b_speed, 2) if avg_b_speed > 0 else 0
-                
-                if not selected_borough or b_name == selected_borough:
-                    global_trips += s['trips']
-                    global_fare += s['fare']
-                    global_rev += s['rev']
-                    global_dist += s['dist']
-                    global_speed_sum += s['speed']
-                    global_passengers += s['pass']
-                    global_speed_anom += s['speed_anom']
-                    global_fare_anom += s['fare_anom']
-                    global_f_sum += s['f_sum']
-                    global_f_count += s['f_count']
-            
-            # Choke points calculated from the already grouped data
-            for loc_id, r in zip(loc_to_borough.keys(), rows):
-                # r[5] is total_speed, r[1] is trip_count
-                avg_loc_speed = r[5] / max(r[1], 1)
-                if 0 < avg_loc_speed < 4.5:
-                    choke_points += 1
-
-            reliability_score = round(((global_trips - (global_speed_anom + global_fare_anom)) / max(global_trips, 1)) * 100, 4)
-            
-            return {
-                "summary": {
-                    "totalTrips": global_trips,
-                    "totalPassengers": global_passengers,
-                    "avgFare": round(global_fare / max(global_trips, 1), 2) if global_trips > 0 else 0,
-                    "totalRevenue": round(global_rev, 2),
-                    "avgDistance": round(global_dist / max(global_trips, 1), 2) if global_trips > 0 else 0,
-                    "avgSpeed": round(global_speed_sum / max(global_trips, 1), 2) if global_trips > 0 else 0,
-                    "systemHealth": reliability_score,
-                    "avgMobilitySpeed": round(global_f_sum / max(global_f_count, 1), 1) if global_f_count > 0 else 0,
-                    "totalAnomalies": global_speed_anom + global_fare_anom,
-                    "activeChokePoints": choke_points,
-                    "anomalyDetails": {
-                        "speed": global_speed_anom,
-                        "fare": global_fare_anom
-                    }
-                },
-                "congestion": congestion_index
-            }
+            return TripAggregator._summary_result(rows, loc_to_borough, selected_borough)
         finally:
             conn.close()
 
 
 
     @staticmethod
-    def get_hourly_stats(filters):
+    def get_hourly_stats(filters, approx=False):
         """Calculates volume and speed per hour for Rush Hour identification"""
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path)
+        if approx:
+            result = TripAggregator.approximate("get_hourly_stats", filters)
+            if result is not None:
+                return result
+        engine = TripAggregator.columnar_engine()
+        if engine:
+            return engine.get_hourly_stats(filters)
+
+        conn = TripAggregator.connect()
         cur = conn.cursor()
         try:
-            start_date = filters.get('start_date')
-            end_date = filters.get('end_date')
             borough = filters.get('borough')
             zone_id = filters.get('zone_id')
             
-            where_clauses = []
-            params = []
-            join_str = ""
-            
-            if start_date:
-                where_clauses.append("pickup_date >= ?")
-                params.append(start_date)
-            if end_date:
-                where_clauses.append("pickup_date <= ?")
-                params.append(end_date)
+            table, e, where_clauses = TripAggregator.fact_source(cur)
+            time_where, params = TripAggregator.time_clauses(filters)
+            where_clauses += time_where
             
             # Spatial Filtering
             if zone_id:
                 where_clauses.append("pickup_location_id = ?")
                 params.append(zone_id)
             elif borough and borough != 'all':
-                join_str = "JOIN taxi_zones z ON trips.pickup_location_id = z.location_id"
-                where_clauses.append("z.borough = ?")
-                params.append(borough)
+                where_clauses.append(f"pickup_location_id IN {TripAggregator.dimensions(cur).in_list(borough)}")
 
             where_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else "" if where_clauses else ""
             
             query = f"""
                 SELECT 
-                    pickup_hour,
-                    COUNT(*) as trip_count,
-                    AVG(speed_mph) as avg_speed
-                FROM trips
-                {join_str}
+                    {e['hour']} as hour,
+                    {e['trips']} as trip_count,
+                    {e['avg_speed']} as avg_speed
+                FROM {table}
                 {where_str}
-                GROUP BY pickup_hour
-                ORDER BY pickup_hour ASC
+                GROUP BY 1
+                ORDER BY 1 ASC
             """
             cur.execute(query, params)
-            rows = cur.fetchall()
-            
-            # Ensure all 24 hours are present
-            hourly_data = {h: {"trips": 0, "speed": 0} for h in range(24)}
-            for r in rows:
-                hour, count, speed = r
-                hourly_data[hour] = {"trips": count, "speed": round(speed or 0, 2)}
-            
-            return hourly_data
+            return TripAggregator._hourly_result(cur.fetchall())
         finally:
             conn.close()
 
@@ -219,71 +283,89 @@ class TripAggregator:
 
 
     @staticmethod
-    def get_coverage_gaps(filters=None):
+    def get_coverage_gaps(filters=None, approx=False):
         """Identifies underserviced neighborhoods (Optimized with filter support)"""
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path)
+        if approx:
+            result = TripAggregator.approximate("get_coverage_gaps", filters)
+            if result is not None:
+                return result
+        engine = TripAggregator.columnar_engine()
+        if engine:
+            return engine.get_coverage_gaps(filters)
+
+        conn = TripAggregator.connect()
         cur = conn.cursor()
         try:
-            date_clauses = []
-            date_params = []
+            date_clauses, date_params = TripAggregator.time_clauses(filters)
             borough_val = None
             
             if filters:
-                if filters.get('start_date'):
-                    date_clauses.append("pickup_date >= ?")
-                    date_params.append(filters['start_date'])
-                if filters.get('end_date'):
-                    date_clauses.append("pickup_date <= ?")
-                    date_params.append(filters['end_date'])
                 if filters.get('borough') and filters.get('borough') != 'all':
                     borough_val = filters['borough']
             
-            date_where = f"WHERE {' AND '.join(date_clauses)}" if date_clauses else ""
+            table, e, pu_clauses = TripAggregator.fact_source(cur, "pickup")
+            do_clauses = TripAggregator.fact_source(cur, "dropoff")[2]
+            pu_where = f"WHERE {' AND '.join(pu_clauses + date_clauses)}" if pu_clauses + date_clauses else ""
+            do_where = f"WHERE {' AND '.join(do_clauses + date_clauses)}" if do_clauses + date_clauses else ""
             
-            # Reconstruct query to be robust: Dates in CTEs, Borough in main Join
+            # Dates in the CTEs, the zone scope (known zones of the borough, or all of them) as an id list
+            dims = TripAggregator.dimensions(cur)
             query = f"""
-                WITH PU AS (SELECT pickup_location_id as loc, COUNT(*) as cnt FROM trips {date_where} GROUP BY 1),
-                     DO AS (SELECT dropoff_location_id as loc, COUNT(*) as cnt FROM trips {date_where} GROUP BY 1)
-                SELECT z.zone, z.borough, DO.cnt, PU.cnt, z.location_id
+                WITH PU AS (SELECT pickup_location_id as loc, {e['trips']} as cnt FROM {table} {pu_where} GROUP BY 1),
+                     DO AS (SELECT dropoff_location_id as loc, {e['trips']} as cnt FROM {table} {do_where} GROUP BY 1)
+                SELECT DO.loc, DO.cnt, PU.cnt
                 FROM DO
                 LEFT JOIN PU ON DO.loc = PU.loc
-                JOIN taxi_zones z ON DO.loc = z.location_id
                 WHERE (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) > 2.0
-                { "AND z.borough = ?" if borough_val else "" }
-                ORDER BY (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) DESC
+                AND DO.loc IN {dims.in_list(borough_val or 'all')}
+                ORDER BY (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) DESC, DO.loc
                 LIMIT 5
             """
             
             final_params = date_params + date_params # For PU and DO CTEs
-            if borough_val:
-                final_params.append(borough_val)
 
             cur.execute(query, final_params)
-            rows = cur.fetchall()
-            return [{"zone": r[0], "borough": r[1], "ratio": round(r[2]/r[3], 2), "id": r[4]} for r in rows if r[3]]
+            return TripAggregator._gaps_result(
+                [dims.zone_info[loc] + (dropoffs, pickups, loc) for loc, dropoffs, pickups in cur.fetchall()]
+            )
         finally:
             conn.close()
     @staticmethod
     def get_detailed_report(filters):
         """Compiles a comprehensive diagnostic report dataset"""
+        if TripAggregator.columnar_engine():
+            return TripAggregator._detailed_report_from_parts(filters)
+        try:
+            from backend.logic.report import ReportEngine
+        except ImportError:
+            from logic.report import ReportEngine
+        return ReportEngine.build(filters)
+
+    @staticmethod
+    def get_dashboard(filters, panels):
+        """Several dashboard panels for one filter set, derived from shared passes (logic/dashboard.py)"""
+        try:
+            from backend.logic.dashboard import DashboardEngine
+        except ImportError:
+            from logic.dashboard import DashboardEngine
+        return DashboardEngine.build(filters, panels)
+
+    @staticmethod
+    def _detailed_report_from_parts(filters):
+        """
+        The report assembled from the other aggregators, section by section (8-12 statements).
+        Used with the columnar backend, where each part is an in-memory kernel, and as the parity
+        reference for logic/report.py.
+        """
         # 1. Get baseline summary metrics
         summary_data = TripAggregator.get_global_summary(filters)
         
         # 2. Get Top 5 Zones by Volume in this scope
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path)
+        conn = TripAggregator.connect()
         cur = conn.cursor()
         
         try:
-            where_clauses = []
-            params = []
-            if filters.get('start_date'):
-                where_clauses.append("pickup_date >= ?")
-                params.append(filters['start_date'])
-            if filters.get('end_date'):
-                where_clauses.append("pickup_date <= ?")
-                params.append(filters['end_date'])
+            where_clauses, params = TripAggregator.time_clauses(filters)
             
             borough = filters.get('borough')
             zone_id = filters.get('zone_id')
@@ -292,16 +374,14 @@ class TripAggregator:
                 where_clauses.append("pickup_location_id = ?")
                 params.append(zone_id)
             elif borough and borough != 'all':
-                where_clauses.append("pickup_location_id IN (SELECT location_id FROM taxi_zones WHERE borough = ?)")
-                params.append(borough)
+                where_clauses.append(f"pickup_location_id IN {TripAggregator.dimensions(cur).in_list(borough)}")
 
             where_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else "" if where_clauses else ""
 
             # --- ZONE SPECIFIC SCOPE ---
             if zone_id:
                 # 1. Get Zone Metadata
-                cur.execute("SELECT zone, borough FROM taxi_zones WHERE location_id = ?", (zone_id,))
-                zone_info = cur.fetchone()
+                zone_info = TripAggregator.dimensions(cur).zone(zone_id)
                 zone_name, b_name = zone_info if zone_info else ("Unknown Zone", borough)
                 
                 # 2. Top Destinations (rather than general top zones)
@@ -312,7 +392,7 @@ class TripAggregator:
                     JOIN taxi_zones z_dest ON t.dropoff_location_id = z_dest.location_id
                     {where_str}
                     GROUP BY 1, 2
-                    ORDER BY trip_count DESC
+                    ORDER BY trip_count DESC, 1, 2
                     LIMIT 5
                 """
                 cur.execute(query, params)
@@ -320,66 +400,44 @@ class TripAggregator:
                 
                 # 3. Localized comparison data
                 # We reuse get_zone_stats logic but wrapped for the report
-                cur.execute(f"SELECT AVG(speed_mph) FROM trips {where_str}", params)
+                table, e, source_where = TripAggregator.fact_source(cur)
+                cur.execute(f"SELECT {e['avg_speed']} FROM {table} WHERE {' AND '.join(source_where + where_clauses) or '1=1'}", params)
                 zone_avg_speed = cur.fetchone()[0] or 0
                 
                 # Comparison against borough baseline (for the same period)
-                b_where = ["z.borough = ?"]
-                b_params = [b_name]
-                if filters.get('start_date'): b_where.append("pickup_date >= ?"); b_params.append(filters['start_date'])
-                if filters.get('end_date'): b_where.append("pickup_date <= ?"); b_params.append(filters['end_date'])
+                b_time, b_time_params = TripAggregator.time_clauses(filters)
+                # An unknown zone falls back to the filter's borough; 'all' is then no borough, not every zone
+                b_ids = TripAggregator.dimensions(cur).in_list(b_name) if b_name != 'all' else "()"
+                b_where = [f"pickup_location_id IN {b_ids}"] + source_where + b_time
                 
                 cur.execute(f"""
-                    SELECT AVG(speed_mph) FROM trips t 
-                    JOIN taxi_zones z ON t.pickup_location_id = z.location_id 
+                    SELECT {e['avg_speed']} FROM {table} t 
                     WHERE {" AND ".join(b_where)}
-                """, b_params)
+                """, b_time_params)
                 borough_baseline = cur.fetchone()[0] or 0
                 
                 # Check if zone is a gap
                 gaps = TripAggregator.get_coverage_gaps(filters)
-                is_gap = any(g['zone'] == zone_name for g in gaps)
 
                 # Rush Hour Analysis (Zone specific)
                 hourly_stats = TripAggregator.get_hourly_stats(filters)
-                peak_hour = max(hourly_stats.items(), key=lambda x: x[1]['trips']) if hourly_stats else (0, {"trips": 0, "speed": 0})
-
-                return {
-                    "metadata": {
-                        "generatedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "scope": f"{b_name} / {zone_name}",
-                        "parentBorough": b_name,
-                        "period": f"{filters.get('start_date', 'All')} to {filters.get('end_date', 'All')}",
-                        "isZoneReport": True,
-                        "isGap": is_gap,
-                        "comparison": {
-                            "zoneSpeed": round(zone_avg_speed, 1),
-                            "boroughSpeed": round(borough_baseline, 1),
-                            "diff": round(((zone_avg_speed / borough_baseline * 100) - 100) if borough_baseline else 0, 1)
-                        }
-                    },
-                    "summary": summary_data['summary'],
-                    "topZones": top_zones, # These are DESTINATIONS
-                    "coverageGaps": gaps if is_gap else [], # Only show if this zone is a gap
-                    "rushHour": {
-                        "hour": peak_hour[0],
-                        "trips": peak_hour[1]['trips'],
-                        "avgSpeed": peak_hour[1]['speed'],
-                        "congestionImpact": None, # Disabled for Zone
-                        "trend": hourly_stats
-                    }
-                }
 
+                return TripAggregator._zone_report_result(
+                    filters, zone_name, b_name, zone_avg_speed, borough_baseline,
+                    summary_data['summary'], top_zones, gaps, hourly_stats
+                )
 
             # --- BOROUGH/CITYWIDE SCOPE ---
             
+            table, e, source_where = TripAggregator.fact_source(cur)
+            scope_where = source_where + where_clauses
             query = f"""
-                SELECT z.zone, z.borough, COUNT(*) as trip_count, AVG(speed_mph) as speed
-                FROM trips t
+                SELECT z.zone, z.borough, {e['trips']} as trip_count, {e['avg_speed']} as speed
+                FROM {table} t
                 JOIN taxi_zones z ON t.pickup_location_id = z.location_id
-                {where_str}
+                {f"WHERE {' AND '.join(scope_where)}" if scope_where else ""}
                 GROUP BY 1, 2
-                ORDER BY trip_count DESC
+                ORDER BY trip_count DESC, 1, 2
                 LIMIT 5
             """
             cur.execute(query, params)
@@ -390,163 +448,489 @@ class TripAggregator:
             
             # 4. Rush Hour Analysis
             hourly_stats = TripAggregator.get_hourly_stats(filters)
-            peak_hour = max(hourly_stats.items(), key=lambda x: x[1]['trips']) if hourly_stats else (0, {"trips": 0, "speed": 0})
-            
-            # Congestion Calculation (Only for Citywide/Borough scope per user preference)
-            congestion_impact = None
-            if summary_data['summary']['avgSpeed'] > 0:
-                congestion_impact = round(((peak_hour[1]['speed'] / summary_data['summary']['avgSpeed'] * 100) - 100), 1)
 
             # 5. Integrate extra Borough metadata if applicable
-            borough_data = {}
+            b_stats = None
             if borough and borough != 'all':
                 b_stats = TripAggregator.get_borough_stats(borough, filters)
-                borough_data = {
-                    "totalTrips": b_stats['totalTrips'],
-                    "avgSpeed": b_stats['avgSpeed'],
-                    "avgDistance": b_stats['avgDistance'],
-                    "zoneCount": b_stats['zoneCount'],
-                    "dropoffPassengers": b_stats['dropoffPassengers'],
-                    "pickupPassengers": b_stats['pickupPassengers'],
-                    "totalPassengers": b_stats['totalPassengers'],
-                    "underservedCount": b_stats['underservedCount'],
-                    "underservedZones": b_stats['underservedZones']
-                }
 
-            return {
-                "metadata": {
-                    "generatedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "scope": borough if borough != 'all' else "Citywide",
-                    "period": f"{filters.get('start_date', 'All')} to {filters.get('end_date', 'All')}",
-                    "boroughMetadata": borough_data,
-                    "isCitywide": borough == 'all'
-                },
-                "summary": summary_data['summary'],
-                "topZones": top_zones,
-                "coverageGaps": gaps,
-                "rushHour": {
-                    "hour": peak_hour[0],
-                    "trips": peak_hour[1]['trips'],
-                    "avgSpeed": peak_hour[1]['speed'],
-                    "congestionImpact": congestion_impact if borough == 'all' else None,
-                    "trend": hourly_stats
-                }
-            }
+            return TripAggregator._report_result(
+                filters, summary_data['summary'], top_zones, gaps, hourly_stats, b_stats
+            )
         finally:
             conn.close()
 
     @staticmethod
-    def get_borough_stats(borough, filters=None):
+    def get_borough_stats(borough, filters=None, approx=False):
         """Calculates comprehensive stats for a specific borough (supports filters)"""
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        
+        if approx:
+            result = TripAggregator.approximate("get_borough_stats", borough, filters)
+            if result is not None:
+                return result
+        engine = TripAggregator.columnar_engine()
+        if engine:
+            return engine.get_borough_stats(borough, filters)
+
         is_citywide = borough == "all"
+        conn = TripAggregator.connect()
+        try:
+            table, e, pu_clauses = TripAggregator.fact_source(conn, "pickup")
+            do_clauses = TripAggregator.fact_source(conn, "dropoff")[2]
+            dims = TripAggregator.dimensions(conn)
+        finally:
+            conn.close()
+        zone_ids = dims.in_list(borough)
+
         where_clauses = []
         if not is_citywide:
-            where_clauses.append("pickup_location_id IN (SELECT location_id FROM taxi_zones WHERE borough = ?)")
-        params = [borough] if not is_citywide else []
-        
-        if filters:
-            if filters.get('start_date'):
-                where_clauses.append("pickup_date >= ?")
-                params.append(filters['start_date'])
-            if filters.get('end_date'):
-                where_clauses.append("pickup_date <= ?")
-                params.append(filters['end_date'])
+            where_clauses.append(f"pickup_location_id IN {zone_ids}")
         
+        time_where, time_params = TripAggregator.time_clauses(filters)
+        where_clauses += time_where
+        params = list(time_params)
+        where_clauses = pu_clauses + where_clauses
         where_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+
+        # 1. Main Stats
+        query_1 = f"""
+            SELECT 
+                {e['trips']} as total_trips,
+                {e['avg_speed']} as avg_speed,
+                {e['avg_distance']} as avg_distance,
+                {e['passengers']} as pickup_passengers
+            FROM {table} t
+            {where_str}
+        """
+
+        # 2. Inbound Passengers (Drop-offs)
+        where_do = []
+        if not is_citywide:
+            where_do.append(f"dropoff_location_id IN {zone_ids}")
+        where_do += do_clauses + time_where
+        params_do = list(time_params)
         
-        try:
-            # 1. Main Stats
-            query_1 = f"""
+        where_do_str = f"WHERE {' AND '.join(where_do)}" if where_do else ""
+        query_2 = f"SELECT {e['passengers']} FROM {table} {where_do_str}"
+
+        # 3. Top 3 Zones in this Borough (trips per location here, per zone name below)
+        query_3 = f"""
+            SELECT pickup_location_id, {e['trips']} as trip_count
+            FROM {table} t
+            {where_str}
+            GROUP BY 1
+        """
+
+        # 4. List of Underserved Zones (also filtered by date)
+        pu_where = "".join(f" AND {c}" for c in pu_clauses + time_where)
+        do_where = "".join(f" AND {c}" for c in do_clauses + time_where)
+        date_params = list(time_params)
+
+        query_4 = f"""
+            WITH PU AS (SELECT pickup_location_id as loc, {e['trips']} as cnt FROM {table} WHERE 1=1 {pu_where} GROUP BY 1),
+                 DO AS (SELECT dropoff_location_id as loc, {e['trips']} as cnt FROM {table} WHERE 1=1 {do_where} GROUP BY 1)
+            SELECT DO.loc
+            FROM DO
+            LEFT JOIN PU ON DO.loc = PU.loc
+            WHERE DO.loc IN {zone_ids} AND (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) > 2.0
+            ORDER BY (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) DESC, DO.loc
+        """
+        final_params_4 = date_params + date_params
+
+        # Independent reads: run side by side on separate pooled connections
+        results = TripAggregator.run_queries({
+            "main": (query_1, params),
+            "dropoff": (query_2, params_do),
+            "top_zones": (query_3, params),
+            "underserved": (query_4, final_params_4),
+        })
+        res = results["main"][0] if results["main"] else (0, 0, 0, 0)
+        dropoff_passengers = results["dropoff"][0][0] or 0
+        top_zones = TripAggregator._top_zone_names(results["top_zones"], dims, 3)
+        underserved_results = [{"zone": dims.zone_info[r[0]][0], "id": r[0]} for r in results["underserved"]]
+        # 5. Total Zones in this Borough
+        zone_count = dims.zone_count(borough)
+
+        return TripAggregator._borough_result(
+            borough, res[:4], dropoff_passengers, top_zones, underserved_results, zone_count
+        )
+
+    @staticmethod
+    def _top_zone_names(rows, dims, limit):
+        """
+        (location_id, trips) rows summed per zone name (a few names cover several ids), busiest first and
+        ties by name, as GROUP BY zone ORDER BY trips DESC, zone would; ids outside taxi_zones are dropped
+        """
+        by_name = {}
+        for loc, trips in rows:
+            if loc in dims.zone_info:
+                name = dims.zone_info[loc][0]
+                by_name[name] = by_name.get(name, 0) + trips
+        ranked = sorted(by_name.items(), key=lambda item: (-item[1], item[0] is not None, item[0] or ""))
+        return [{"zone": name, "trips": trips} for name, trips in ranked[:limit]]
+
+    @staticmethod
+    def _summary_result(rows, loc_to_borough, selected_borough):
+        """
+        Shapes per-pickup-zone measure rows (loc, trips, fare, rev, dist, speed, passengers,
+        speed_anomalies, fare_anomalies, f_speed_sum, f_speed_count), ordered by loc, into the summary JSON
+        """
+        # 3. Post-Aggregation in Python (Extremely fast for 263 rows)
+        borough_data = {}
+        for r in rows:
+            loc_id, count, fare, rev, dist, speed, pass_count, speed_anom, fare_anom, f_sum, f_count = r
+            b_name = loc_to_borough.get(loc_id, 'Other')
+
+            if b_name not in borough_data:
+                borough_data[b_name] = {
+                    "trips": 0, "fare": 0, "rev": 0, "dist": 0, 
+                    "speed": 0, "pass": 0, "speed_anom": 0, "fare_anom": 0, "f_sum": 0, "f_count": 0
+                }
+
+            s = borough_data[b_name]
+            s['trips'] += count
+            s['fare'] += fare
+            s['rev'] += rev
+            s['dist'] += dist
+            s['speed'] += speed
+            s['pass'] += pass_count
+            s['speed_anom'] += speed_anom
+            s['fare_anom'] += fare_anom
+            s['f_sum'] += f_sum
+            s['f_count'] += f_count
+
+        # Final Calculations
+        global_trips = 0
+        global_fare = 0
+        global_rev = 0
+        global_dist = 0
+        global_speed_sum = 0
+        global_passengers = 0
+        global_speed_anom = 0
+        global_fare_anom = 0
+        global_f_sum = 0
+        global_f_count = 0
+        choke_points = 0
+
+        congestion_index = {}
+
+        for b_name, s in borough_data.items():
+            avg_b_speed = s['f_sum'] / max(s['f_count'], 1)
+            congestion_index[b_name] = round(20 / avg_b_speed, 2) if avg_b_speed > 0 else 0
+
+            if not selected_borough or b_name == selected_borough:
+                global_trips += s['trips']
+                global_fare += s['fare']
+                global_rev += s['rev']
+                global_dist += s['dist']
+                global_speed_sum += s['speed']
+                global_passengers += s['pass']
+                global_speed_anom += s['speed_anom']
+                global_fare_anom += s['fare_anom']
+                global_f_sum += s['f_sum']
+                global_f_count += s['f_count']
+
+        # Choke points calculated from the already grouped data
+        for loc_id, r in zip(loc_to_borough.keys(), rows):
+            # r[5] is total_speed, r[1] is trip_count
+            avg_loc_speed = r[5] / max(r[1], 1)
+            if 0 < avg_loc_speed < 4.5:
+                choke_points += 1
+
+        reliability_score = round(((global_trips - (global_speed_anom + global_fare_anom)) / max(global_trips, 1)) * 100, 4)
+
+        return {
+            "summary": {
+                "totalTrips": global_trips,
+                "totalPassengers": global_passengers,
+                "avgFare": round(global_fare / max(global_trips, 1), 2) if global_trips > 0 else 0,
+                "totalRevenue": round(global_rev, 2),
+                "avgDistance": round(global_dist / max(global_trips, 1), 2) if global_trips > 0 else 0,
+                "avgSpeed": round(global_speed_sum / max(global_trips, 1), 2) if global_trips > 0 else 0,
+                "systemHealth": reliability_score,
+                "avgMobilitySpeed": round(global_f_sum / max(global_f_count, 1), 1) if global_f_count > 0 else 0,
+                "totalAnomalies": global_speed_anom + global_fare_anom,
+                "activeChokePoints": choke_points,
+                "anomalyDetails": {
+                    "speed": global_speed_anom,
+                    "fare": global_fare_anom
+                }
+            },
+            "congestion": congestion_index
+        }
+
+    @staticmethod
+    def _hourly_result(rows):
+        """Shapes (hour, trips, avg_speed) rows into the 24-hour dict"""
+        # Ensure all 24 hours are present
+        hourly_data = {h: {"trips": 0, "speed": 0} for h in range(24)}
+        for r in rows:
+            hour, count, speed = r
+            hourly_data[hour] = {"trips": count, "speed": round(speed or 0, 2)}
+        
+        return hourly_data
+
+    @staticmethod
+    def _gaps_result(rows):
+        """Shapes (zone, borough, dropoffs, pickups, location_id) rows, highest ratio first"""
+        return [{"zone": r[0], "borough": r[1], "ratio": round(r[2]/r[3], 2), "id": r[4]} for r in rows if r[3]]
+
+    @staticmethod
+    def _borough_result(borough, main_stats, dropoff_passengers, top_zones, underserved_results, zone_count):
+        """Shapes the borough stats dict; main_stats = (trips, avg_speed, avg_distance, pickup_passengers)"""
+        total_trips, avg_speed, avg_distance, pickup_passengers = main_stats
+        return {
+            "borough": "Citywide" if borough == "all" else borough,
+            "totalTrips": total_trips or 0,
+            "avgSpeed": round(avg_speed, 1) if avg_speed else 0,
+            "avgDistance": round(avg_distance, 2) if avg_distance else 0,
+            "pickupPassengers": pickup_passengers or 0,
+            "dropoffPassengers": dropoff_passengers,
+            "totalPassengers": (pickup_passengers or 0) + dropoff_passengers,
+            "topZones": top_zones,
+            "underservedCount": len(underserved_results),
+            "underservedZones": underserved_results,
+            "zoneCount": zone_count
+        }
+
+    @staticmethod
+    def _peak_hour(hourly_stats):
+        """(hour, {"trips", "speed"}) of the busiest hour in the 24-hour dict"""
+        return max(hourly_stats.items(), key=lambda x: x[1]['trips']) if hourly_stats else (0, {"trips": 0, "speed": 0})
+
+    @staticmethod
+    def _report_result(filters, summary, top_zones, gaps, hourly_stats, b_stats=None):
+        """Shapes the citywide/borough report; b_stats = get_borough_stats() output for a borough scope"""
+        borough = filters.get('borough')
+        peak_hour = TripAggregator._peak_hour(hourly_stats)
+
+        # Congestion Calculation (Only for Citywide/Borough scope per user preference)
+        congestion_impact = None
+        if summary['avgSpeed'] > 0:
+            congestion_impact = round(((peak_hour[1]['speed'] / summary['avgSpeed'] * 100) - 100), 1)
+
+        borough_data = {}
+        if b_stats:
+            borough_data = {
+                "totalTrips": b_stats['totalTrips'],
+                "avgSpeed": b_stats['avgSpeed'],
+                "avgDistance": b_stats['avgDistance'],
+                "zoneCount": b_stats['zoneCount'],
+                "dropoffPassengers": b_stats['dropoffPassengers'],
+                "pickupPassengers": b_stats['pickupPassengers'],
+                "totalPassengers": b_stats['totalPassengers'],
+                "underservedCount": b_stats['underservedCount'],
+                "underservedZones": b_stats['underservedZones']
+            }
+
+        return {
+            "metadata": {
+                "generatedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "scope": borough if borough != 'all' else "Citywide",
+                "period": f"{filters.get('start_date', 'All')} to {filters.get('end_date', 'All')}",
+                "boroughMetadata": borough_data,
+                "isCitywide": borough == 'all'
+            },
+            "summary": summary,
+            "topZones": top_zones,
+            "coverageGaps": gaps,
+            "rushHour": {
+                "hour": peak_hour[0],
+                "trips": peak_hour[1]['trips'],
+                "avgSpeed": peak_hour[1]['speed'],
+                "congestionImpact": congestion_impact if borough == 'all' else None,
+                "trend": hourly_stats
+            }
+        }
+
+    @staticmethod
+    def _zone_report_result(filters, zone_name, b_name, zone_avg_speed, borough_baseline,
+                            summary, top_zones, gaps, hourly_stats):
+        """Shapes the single-zone report; top_zones are the zone's destinations, gaps the scope's gaps"""
+        is_gap = any(g['zone'] == zone_name for g in gaps)
+        peak_hour = TripAggregator._peak_hour(hourly_stats)
+        return {
+            "metadata": {
+                "generatedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "scope": f"{b_name} / {zone_name}",
+                "parentBorough": b_name,
+                "period": f"{filters.get('start_date', 'All')} to {filters.get('end_date', 'All')}",
+                "isZoneReport": True,
+                "isGap": is_gap,
+                "comparison": {
+                    "zoneSpeed": round(zone_avg_speed, 1),
+                    "boroughSpeed": round(borough_baseline, 1),
+                    "diff": round(((zone_avg_speed / borough_baseline * 100) - 100) if borough_baseline else 0, 1)
+                }
+            },
+            "summary": summary,
+            "topZones": top_zones, # These are DESTINATIONS
+            "coverageGaps": gaps if is_gap else [], # Only show if this zone is a gap
+            "rushHour": {
+                "hour": peak_hour[0],
+                "trips": peak_hour[1]['trips'],
+                "avgSpeed": peak_hour[1]['speed'],
+                "congestionImpact": None, # Disabled for Zone
+                "trend": hourly_stats
+            }
+        }
+
+    @staticmethod
+    def get_zone_stats(zone_id, filters=None, approx=False):
+        """Detailed pickup/dropoff statistics for one zone; None if the zone doesn't exist"""
+        if approx:
+            result = TripAggregator.approximate("get_zone_stats", zone_id, filters)
+            if result is not None:
+                return result
+        engine = TripAggregator.columnar_engine()
+        if engine:
+            return engine.get_zone_stats(zone_id, filters)
+
+        # Get zone info
+        dims = TripAggregator.dimensions()
+        zone_info = dims.zone(zone_id)
+        if zone_info is None:
+            return None
+        zone_name, borough = zone_info
+
+        time_where, time_params = TripAggregator.time_clauses(filters)
+        where_str = f"WHERE {' AND '.join(['pickup_location_id = ?'] + time_where)}"
+        do_where_str = f"WHERE {' AND '.join(['dropoff_location_id = ?'] + time_where)}"
+        b_where_str = f"WHERE {' AND '.join([f'pickup_location_id IN {dims.in_list(borough)}'] + time_where)}"
+        results = TripAggregator.run_queries({
+            "pickup": (f"""
                 SELECT 
-                    COUNT(*) as total_trips,
-                    AVG(speed_mph) as avg_speed,
+                    COUNT(*) as trip_count,
                     AVG(trip_distance) as avg_distance,
-                    SUM(passenger_count) as pickup_passengers
-                FROM trips t
-                {where_str}
-            """
-            cur.execute(query_1, params)
-            res = cur.fetchone() or (0, 0, 0, 0)
-            total_trips, avg_speed, avg_distance, pickup_passengers = res[:4]
-
-            # 2. Inbound Passengers (Drop-offs)
-            where_do = []
-            if not is_citywide:
-                where_do.append("dropoff_location_id IN (SELECT location_id FROM taxi_zones WHERE borough = ?)")
-            params_do = [borough] if not is_citywide else []
-            if filters:
-                if filters.get('start_date'):
-                    where_do.append("pickup_date >= ?")
-                    params_do.append(filters['start_date'])
-                if filters.get('end_date'):
-                    where_do.append("pickup_date <= ?")
-                    params_do.append(filters['end_date'])
-            
-            where_do_str = f"WHERE {' AND '.join(where_do)}" if where_do else ""
-            cur.execute(f"SELECT SUM(passenger_count) FROM trips {where_do_str}", params_do)
-            dropoff_passengers = cur.fetchone()[0] or 0
-
-            # 3. Top 3 Zones in this Borough
-            query_3 = f"""
-                SELECT z.zone, COUNT(*) as trip_count
-                FROM trips t
-                JOIN taxi_zones z ON t.pickup_location_id = z.location_id
+                    AVG(speed_mph) as avg_speed,
+                    AVG(fare_amount) as avg_fare,
+                    AVG(trip_duration_seconds) as avg_duration,
+                    SUM(passenger_count) as total_passengers
+                FROM trips
                 {where_str}
-                GROUP BY z.zone
-                ORDER BY trip_count DESC
-                LIMIT 3
-            """
-            cur.execute(query_3, params)
-            top_zones = [{"zone": r[0], "trips": r[1]} for r in cur.fetchall()]
+            """, [zone_id] + time_params),
+            "dropoff": (f"""
+                SELECT 
+                    COUNT(*) as dropoff_count,
+                    SUM(passenger_count) as dropoff_passengers
+                FROM trips
+                {do_where_str}
+            """, [zone_id] + time_params),
+            "borough_avg": (f"""
+                SELECT AVG(speed_mph) as borough_avg_speed
+                FROM trips
+                {b_where_str}
+            """, time_params),
+        })
 
-            # 4. List of Underserved Zones (also filtered by date)
-            date_where = ""
-            date_params = []
-            if filters:
-                if filters.get('start_date'):
-                    date_where += " AND pickup_date >= ?"
-                    date_params.append(filters['start_date'])
-                if filters.get('end_date'):
-                    date_where += " AND pickup_date <= ?"
-                    date_params.append(filters['end_date'])
-
-            query_4 = f"""
-                WITH PU AS (SELECT pickup_location_id as loc, COUNT(*) as cnt FROM trips WHERE 1=1 {date_where} GROUP BY 1),
-                     DO AS (SELECT dropoff_location_id as loc, COUNT(*) as cnt FROM trips WHERE 1=1 {date_where} GROUP BY 1)
-                SELECT z.zone, z.location_id
-                FROM DO
-                LEFT JOIN PU ON DO.loc = PU.loc
-                JOIN taxi_zones z ON DO.loc = z.location_id
-                WHERE {"z.borough = ?" if not is_citywide else "1=1"} AND (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) > 2.0
-                ORDER BY (DO.cnt * 1.0 / NULLIF(PU.cnt, 0)) DESC
-            """
-            final_params_4 = date_params + date_params
-            if not is_citywide: final_params_4.append(borough)
-            cur.execute(query_4, final_params_4)
-            underserved_results = [{"zone": r[0], "id": r[1]} for r in cur.fetchall()]
-            underserved_count = len(underserved_results)
-
-            # 5. Total Zones in this Borough
-            if is_citywide: cur.execute("SELECT COUNT(*) FROM taxi_zones")
-            else: cur.execute("SELECT COUNT(*) FROM taxi_zones WHERE borough = ?", (borough,))
-            zone_count = cur.fetchone()[0] or 0
-
-            return {
-                "borough": "Citywide" if is_citywide else borough,
-                "totalTrips": total_trips or 0,
-                "avgSpeed": round(avg_speed, 1) if avg_speed else 0,
-                "avgDistance": round(avg_distance, 2) if avg_distance else 0,
-                "pickupPassengers": pickup_passengers or 0,
-                "dropoffPassengers": dropoff_passengers,
-                "totalPassengers": (pickup_passengers or 0) + dropoff_passengers,
-                "topZones": top_zones,
-                "underservedCount": underserved_count,
-                "underservedZones": underserved_results,
-                "zoneCount": zone_count
-            }
+        return TripAggregator._zone_stats_result(
+            zone_name, borough, results["pickup"][0], results["dropoff"][0], results["borough_avg"][0][0]
+        )
+
+    @staticmethod
+    def _zone_stats_result(zone_name, borough, pickup_stats, dropoff_res, borough_avg):
+        """
+        Shapes the zone stats dict. pickup_stats = (trips, avg_distance, avg_speed, avg_fare,
+        avg_duration, passengers); dropoff_res = (trips, passengers)
+        """
+        dropoff_count = dropoff_res[0] or 0
+        dropoff_passengers = dropoff_res[1] or 0
+        borough_avg = borough_avg or 0
+
+        # Calculate coverage ratio
+        pickup_count = pickup_stats[0] or 0
+        pickup_passengers = pickup_stats[5] or 0
+        coverage_ratio = round(dropoff_count / pickup_count, 2) if pickup_count > 0 else 0
+        
+        return {
+            "zone": zone_name,
+            "borough": borough,
+            "pickupCount": pickup_count,
+            "dropoffCount": dropoff_count,
+            "coverageRatio": coverage_ratio,
+            "pickupPassengers": pickup_passengers,
+            "dropoffPassengers": dropoff_passengers,
+            "totalPassengers": pickup_passengers + dropoff_passengers,
+            "avgDistance": round(pickup_stats[1], 2) if pickup_stats[1] else 0,
+            "avgSpeed": round(pickup_stats[2], 2) if pickup_stats[2] else 0,
+            "avgFare": round(pickup_stats[3], 2) if pickup_stats[3] else 0,
+            "avgDuration": round(pickup_stats[4] / 60, 1) if pickup_stats[4] else 0,  # Convert to minutes
+            "boroughAvgSpeed": round(borough_avg, 2),
+            "speedComparison": round(((pickup_stats[2] or 0) / borough_avg * 100) - 100, 1) if borough_avg > 0 else 0
+        }
+
+    @staticmethod
+    def sketches_ready(cur):
+        """True once the ETL has built trip_sketches and keeps them current"""
+        try:
+            row = cur.execute("SELECT value FROM etl_state WHERE key = 'sketches_ready'").fetchone()
+        except sqlite3.OperationalError:
+            return False # Database created before sketches existed
+        return bool(row) and row[0] == '1'
+
+    @staticmethod
+    def get_quantiles(filters, exact=False):
+        """
+        p50/p90/p99 of speed, fare and duration. Merges the per (pickup zone, day) sketches the filters select
+        (within 1% relative error); without sketches, or with exact=True, sorts the values from the trips index.
+        """
+        conn = TripAggregator.connect()
+        cur = conn.cursor()
+        try:
+            zone_id = filters.get('zone_id')
+            borough = filters.get('borough') if filters.get('borough') != 'all' else None
+            use_sketches = not exact and TripAggregator.sketches_ready(cur)
+
+            if use_sketches:
+                first, last = TripAggregator.time_key_range(filters.get('start_date'), filters.get('end_date'))
+                clauses, params = [], []
+                if first is not None:
+                    clauses.append("s.day >= ?")
+                    params.append(first // 24)
+                if last is not None:
+                    clauses.append("s.day <= ?")
+                    params.append(last // 24)
+                table, columns = "trip_sketches s", "s.measure, s.buckets"
+            else:
+                clauses, params = TripAggregator.time_clauses(filters, "s.pickup_time_id")
+                table, columns = "trips s", ", ".join(f"s.{c}" for c in SKETCH_MEASURES.values())
+
+            if zone_id:
+                clauses.append("s.pickup_location_id = ?")
+                params.append(zone_id)
+            elif borough:
+                clauses.append(f"s.pickup_location_id IN {TripAggregator.dimensions(cur).in_list(borough)}")
+            where_str = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+            cur.execute(f"SELECT {columns} FROM {table} {where_str}", params)
+            if use_sketches:
+                blobs = {measure: [] for measure in SKETCH_MEASURES}
+                for measure, buckets in cur:
+                    blobs[measure].append(buckets)
+                merged = {measure: QuantileSketch.merge(b) for measure, b in blobs.items()}
+                distributions = {measure: QuantileSketch.quantiles(c) for measure, c in merged.items()}
+                counts = {measure: int(c.sum()) for measure, c in merged.items()}
+            else:
+                values = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, len(SKETCH_MEASURES))
+                distributions, counts = {}, {}
+                for column, measure in enumerate(SKETCH_MEASURES):
+                    present = values[:, column][~np.isnan(values[:, column])]
+                    counts[measure] = len(present)
+                    distributions[measure] = (
+                        np.quantile(present, QUANTILES).tolist() if len(present) else [None] * len(QUANTILES)
+                    )
+            return TripAggregator._quantiles_result(distributions, counts, "sketches" if use_sketches else "trips")
         finally:
             conn.close()
+
+    @staticmethod
+    def _quantiles_result(distributions, counts, source):
+        """Shapes the quantiles dict: per measure {"p50": ..., "p90": ..., "p99": ..., "count": n}"""
+        result = {}
+        for measure, values in distributions.items():
+            result[measure] = {
+                f"p{q * 100:g}": round(v, 2) if v is not None else None for q, v in zip(QUANTILES, values)
+            }
+            result[measure]["count"] = counts[measure]
+        result["source"] = source
+        result["relativeAccuracy"] = RELATIVE_ACCURACY if source == "sketches" else 0
+        return result
@@ -0,0 +1,540 @@
+# backend\logic\approx.py
+# Approximate Aggregator: Answers the dashboard aggregations from the stratified trip sample the ETL maintains
+# (trip_sample, one stratum per pickup zone and day), scaling sums by the stored weights and attaching
+# 95% confidence intervals to every headline figure.
+
+import os
+import sys
+import math
+import time
+import sqlite3
+
+try:
+    from backend.logic.aggregators import TripAggregator
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.aggregators import TripAggregator
+
+CONFIDENCE = 0.95
+Z_SCORE = 1.959963984540054 # two-sided 95% normal quantile
+
+# Per-trip values over trip_sample rows; their weighted sums estimate the TRIP_EXPRESSIONS totals
+SAMPLE_MEASURES = {
+    "trips": "1",
+    "fare": "fare_amount",
+    "fare_count": "fare_amount IS NOT NULL",
+    "revenue": "total_amount",
+    "distance": "trip_distance",
+    "distance_count": "trip_distance IS NOT NULL",
+    "speed": "speed_mph",
+    "speed_count": "speed_mph IS NOT NULL",
+    "duration": "trip_duration_seconds",
+    "duration_count": "trip_duration_seconds IS NOT NULL",
+    "passengers": "passenger_count",
+    "speed_anomalies": "CASE WHEN speed_mph > 80 THEN 1 ELSE 0 END",
+    "fare_anomalies": "CASE WHEN trip_distance < 1 AND fare_amount > 100 THEN 1 ELSE 0 END",
+    "anomalies": "CASE WHEN speed_mph > 80 THEN 1 ELSE 0 END + CASE WHEN trip_distance < 1 AND fare_amount > 100 THEN 1 ELSE 0 END",
+    "f_speed_sum": "CASE WHEN speed_mph <= 80 THEN speed_mph ELSE 0 END",
+    "f_speed_count": "CASE WHEN speed_mph <= 80 THEN 1 ELSE 0 END",
+}
+SUMMARY_MEASURES = [
+    "trips", "fare", "revenue", "distance", "speed", "passengers", "speed_anomalies", "fare_anomalies",
+    "f_speed_sum", "f_speed_count", "anomalies"
+]
+ZONE_MEASURES = [
+    "trips", "distance", "distance_count", "speed", "speed_count", "fare", "fare_count",
+    "duration", "duration_count", "passengers"
+]
+# estimate() groups that never split a stratum
+STRATUM_GROUPS = ("NULL", "s.pickup_location_id", "s.day")
+MIN_PER_STRATUM = 2 # the least that still gives a within-stratum variance
+
+
+def _round(value, digits):
+    return int(round(value)) if digits == 0 else round(value, digits)
+
+
+def _interval(estimate, variance, digits=0, scale=1.0):
+    """[low, high] normal-approximation interval of a non-negative estimate, times scale"""
+    half = Z_SCORE * math.sqrt(max(variance, 0.0))
+    return [_round(max(estimate - half, 0.0) * scale, digits), _round((estimate + half) * scale, digits)]
+
+
+class SampleEstimator:
+    """
+    Stratified (Horvitz-Thompson) estimates from trip_sample, for TripAggregator's approx=True mode.
+    - a stratum is (pickup zone, pickup day); the ETL keeps a uniform sample of at most SAMPLE_PER_STRATUM
+      trips of each, with weight = population / sampled
+    - date, pickup zone and borough filters select whole strata, so trip counts in those scopes are exact
+    - any other total is sum(weight * value) over the sample rows, with the stratified variance
+      sum_h N_h (N_h - n_h) / n_h * s_h^2; averages are ratios of two totals (linearized variance)
+    Every result has the exact endpoint's shape plus an "approximation" entry with the sample rows read
+    and a CONFIDENCE interval per figure (hourly stats carry theirs per hour, gaps per zone).
+    Costs grow with the strata in scope, not with the trips behind them: a query reads at most row_budget
+    sample rows (but never fewer than MIN_PER_STRATUM per stratum), trading interval width for latency.
+    """
+
+    row_budget = int(os.environ.get('APPROX_ROW_BUDGET', 50000))
+
+    @staticmethod
+    def ready(cur):
+        """True once the ETL has drawn trip_sample and keeps it current"""
+        try:
+            row = cur.execute("SELECT value FROM etl_state WHERE key = 'sample_per_stratum'").fetchone()
+        except sqlite3.OperationalError:
+            return False # Database created before the sample existed
+        return bool(row) and row[0] not in (None, '', '0')
+
+    @staticmethod
+    def day_clauses(filters, alias="s"):
+        """start_date/end_date as a range on the stratum day (dates are whole days, so the range is exact)"""
+        clauses, params = [], []
+        first, last = TripAggregator.time_key_range(
+            (filters or {}).get('start_date'), (filters or {}).get('end_date')
+        )
+        if first is not None:
+            clauses.append(f"{alias}.day >= ?")
+            params.append(first // 24)
+        if last is not None:
+            clauses.append(f"{alias}.day <= ?")
+            params.append(last // 24)
+        return clauses, params
+
+    @staticmethod
+    def per_stratum(cur, clauses=(), params=()):
+        """Sample rows to read per stratum so that the strata matching clauses (alias s) fit row_budget"""
+        where_str = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        strata = cur.execute(f"SELECT COUNT(*) FROM trip_sample_strata s {where_str}", list(params)).fetchone()[0]
+        return max(MIN_PER_STRATUM, SampleEstimator.row_budget // max(strata, 1))
+
+    @staticmethod
+    def estimate(cur, measures, clauses=(), params=(), group="NULL", pairs=(), row_clauses=(), row_params=()):
+        """
+        Totals of SAMPLE_MEASURES per group: {group: {"rows": sample rows read, "total": {measure: estimate},
+        "var": {measure: variance}, "cov": {(a, b): covariance}}}.
+        clauses select whole strata (day, pickup zone; alias s); row_clauses are row-level predicates
+        (a dropoff zone), whose non-matching rows count as zeros of their stratum, as do rows of other
+        groups when the group is not constant within a stratum (an hour). Each stratum contributes its
+        first per_stratum() rows by sample_rank, a uniform sample of them.
+        pairs = (numerator, denominator) measures whose ratio will be taken (see ratio()).
+        """
+        per_stratum = SampleEstimator.per_stratum(cur, clauses, params)
+        # SUM skips NULLs, so a missing value counts as zero without a COALESCE per row
+        values = {name: f"({SAMPLE_MEASURES[name]})" for name in measures}
+        inner, outer = [], []
+        for i, name in enumerate(measures):
+            y = values[name]
+            inner.append(f"SUM({y}) AS s{i}, SUM({y} * {y}) AS q{i}")
+            outer.append(
+                f"SUM(big_n * 1.0 / small_n * s{i}), SUM(CASE WHEN small_n > 1 THEN big_n * (big_n - small_n) * 1.0 / small_n"
+                f" * (q{i} - s{i} * 1.0 * s{i} / small_n) / (small_n - 1) ELSE 0 END)"
+            )
+        for j, (a, b) in enumerate(pairs):
+            ia, ib = measures.index(a), measures.index(b)
+            inner.append(f"SUM({values[a]} * {values[b]}) AS c{j}")
+            outer.append(
+                f"SUM(CASE WHEN small_n > 1 THEN big_n * (big_n - small_n) * 1.0 / small_n"
+                f" * (c{j} - s{ia} * 1.0 * s{ib} / small_n) / (small_n - 1) ELSE 0 END)"
+            )
+        where = list(clauses) + list(row_clauses) + ["s.sample_rank <= ?"]
+        # Groups constant within a stratum don't split it: the rows then group in primary-key order
+        group_by = "s.day, s.pickup_location_id" + ("" if group in STRATUM_GROUPS else ", 1")
+        # Rows are reduced to one per (stratum, group) first; only those are matched with their strata
+        query = f"""
+            SELECT grp, SUM(sample_rows), {', '.join(outer)}
+            FROM (
+                SELECT {group} AS grp, s.day, s.pickup_location_id, COUNT(*) AS sample_rows, {', '.join(inner)}
+                FROM trip_sample s
+                WHERE {' AND '.join(where)}
+                GROUP BY {group_by}
+            ) g
+            JOIN (
+                SELECT pickup_location_id, day, population AS big_n, MIN(sampled, {int(per_stratum)}) AS small_n
+                FROM trip_sample_strata
+            ) st ON st.pickup_location_id = g.pickup_location_id AND st.day = g.day
+            GROUP BY 1
+        """
+        params = list(params) + list(row_params) + [per_stratum]
+        results = {}
+        for row in cur.execute(query, params):
+            k = len(measures)
+            results[row[0]] = {
+                "rows": row[1],
+                "total": {name: row[2 + 2 * i] or 0 for i, name in enumerate(measures)},
+                "var": {name: row[3 + 2 * i] or 0 for i, name in enumerate(measures)},
+                "cov": {pair: row[2 + 2 * k + j] or 0 for j, pair in enumerate(pairs)},
+            }
+        return results
+
+    @staticmethod
+    def merge(parts):
+        """Sums estimate() groups (strata are disjoint, so variances and covariances add)"""
+        merged = {"rows": 0, "total": {}, "var": {}, "cov": {}}
+        for part in parts:
+            merged["rows"] += part["rows"]
+            for key in ("total", "var", "cov"):
+                for name, value in part[key].items():
+                    merged[key][name] = merged[key].get(name, 0) + value
+        return merged
+
+    @staticmethod
+    def ratio(est, numerator, denominator):
+        """(ratio, variance) of two estimated totals; an undeclared pair is treated as uncorrelated"""
+        x = est["total"].get(denominator, 0)
+        if not x:
+            return 0, 0
+        r = est["total"].get(numerator, 0) / x
+        variance = (
+            est["var"].get(numerator, 0) + r * r * est["var"].get(denominator, 0)
+            - 2 * r * est["cov"].get((numerator, denominator), 0)
+        ) / (x * x)
+        return r, variance
+
+    @staticmethod
+    def total_interval(est, name, digits=0):
+        return _interval(est["total"].get(name, 0), est["var"].get(name, 0), digits)
+
+    @staticmethod
+    def ratio_interval(est, numerator, denominator, digits=2, scale=1.0):
+        return _interval(*SampleEstimator.ratio(est, numerator, denominator), digits, scale)
+
+    @staticmethod
+    def _empty():
+        return {"rows": 0, "total": {}, "var": {}, "cov": {}}
+
+    @staticmethod
+    def _approximation(sample_rows, intervals):
+        return {"confidence": CONFIDENCE, "sampleRows": sample_rows, "intervals": intervals}
+
+    @staticmethod
+    def _pickups(cur, filters):
+        """Exact pickups per zone in the date range, from the strata populations: {loc: trips}"""
+        clauses, params = SampleEstimator.day_clauses(filters, "st")
+        where_str = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return dict(cur.execute(
+            f"SELECT pickup_location_id, SUM(population) FROM trip_sample_strata st {where_str} GROUP BY 1", params
+        ).fetchall())
+
+    @staticmethod
+    def _coverage(cur, filters):
+        """
+        Zones ranked by dropoffs / pickups above 2.0, highest first:
+        [(loc, estimated dropoffs, dropoff variance, exact pickups)]
+        """
+        clauses, params = SampleEstimator.day_clauses(filters)
+        dropoffs = SampleEstimator.estimate(
+            cur, ["trips"], clauses, params, group="s.dropoff_location_id",
+            row_clauses=["s.dropoff_location_id IS NOT NULL"]
+        )
+        pickups = SampleEstimator._pickups(cur, filters)
+        ranked = []
+        for loc, est in dropoffs.items():
+            pu = pickups.get(loc)
+            if pu and est["total"]["trips"] / pu > 2.0:
+                ranked.append((loc, est["total"]["trips"], est["var"]["trips"], pu))
+        ranked.sort(key=lambda r: (-r[1] / r[3], r[0]))
+        return ranked
+
+    @staticmethod
+    def get_global_summary(filters):
+        conn = TripAggregator.connect()
+        cur = conn.cursor()
+        try:
+            loc_to_borough = TripAggregator.dimensions(cur).loc_to_borough
+            clauses, params = SampleEstimator.day_clauses(filters)
+            if filters.get('zone_id'):
+                clauses.append("s.pickup_location_id = ?")
+                params.append(filters['zone_id'])
+            by_zone = SampleEstimator.estimate(
+                cur, SUMMARY_MEASURES, clauses, params, group="s.pickup_location_id",
+                pairs=[("f_speed_sum", "f_speed_count")]
+            )
+        finally:
+            conn.close()
+
+        selected_borough = filters.get('borough') if filters.get('borough') != 'all' else None
+        rows = []
+        for loc in sorted(by_zone):
+            t = by_zone[loc]["total"]
+            rows.append((
+                loc, _round(t["trips"], 0), t["fare"], t["revenue"], t["distance"], t["speed"],
+                _round(t["passengers"], 0), _round(t["speed_anomalies"], 0), _round(t["fare_anomalies"], 0),
+                t["f_speed_sum"], _round(t["f_speed_count"], 0)
+            ))
+        result = TripAggregator._summary_result(rows, loc_to_borough, selected_borough)
+
+        est = SampleEstimator.merge(
+            part for loc, part in by_zone.items()
+            if not selected_borough or loc_to_borough.get(loc, 'Other') == selected_borough
+        )
+        trips = est["total"].get("trips", 0)
+        anomalies = SampleEstimator.total_interval(est, "anomalies")
+        interval = SampleEstimator.total_interval
+        ratio = SampleEstimator.ratio_interval
+        result["summary"]["approximation"] = SampleEstimator._approximation(est["rows"], {
+            "totalTrips": interval(est, "trips"),
+            "totalPassengers": interval(est, "passengers"),
+            "totalRevenue": interval(est, "revenue", 2),
+            "avgFare": ratio(est, "fare", "trips"),
+            "avgDistance": ratio(est, "distance", "trips"),
+            "avgSpeed": ratio(est, "speed", "trips"),
+            "avgMobilitySpeed": ratio(est, "f_speed_sum", "f_speed_count", 1),
+            "totalAnomalies": anomalies,
+            "systemHealth": [round((trips - anomalies[1]) / trips * 100, 4), round((trips - anomalies[0]) / trips * 100, 4)]
+            if trips else [0, 0],
+        })
+        return result
+
+    @staticmethod
+    def get_hourly_stats(filters):
+        clauses, params = SampleEstimator.day_clauses(filters)
+        if filters.get('zone_id'):
+            clauses.append("s.pickup_location_id = ?")
+            params.append(filters['zone_id'])
+        elif filters.get('borough') and filters['borough'] != 'all':
+            clauses.append(f"s.pickup_location_id IN {TripAggregator.dimensions().in_list(filters['borough'])}")
+
+        conn = TripAggregator.connect()
+        try:
+            by_hour = SampleEstimator.estimate(
+                conn.cursor(), ["trips", "speed", "speed_count"], clauses, params,
+                group="s.pickup_time_id % 24", pairs=[("speed", "speed_count")]
+            )
+        finally:
+            conn.close()
+
+        rows = [
+            (hour, _round(est["total"]["trips"], 0), SampleEstimator.ratio(est, "speed", "speed_count")[0])
+            for hour, est in sorted(by_hour.items())
+        ]
+        hourly = TripAggregator._hourly_result(rows)
+        for hour, data in hourly.items():
+            est = by_hour.get(hour, SampleEstimator._empty())
+            data["intervals"] = {
+                "trips": SampleEstimator.total_interval(est, "trips"),
+                "speed": SampleEstimator.ratio_interval(est, "speed", "speed_count"),
+            }
+        return hourly
+
+    @staticmethod
+    def get_coverage_gaps(filters=None):
+        filters = filters or {}
+        borough = filters.get('borough') if filters.get('borough') != 'all' else None
+        conn = TripAggregator.connect()
+        cur = conn.cursor()
+        try:
+            zones = TripAggregator.dimensions(cur).zone_info
+            ranked = SampleEstimator._coverage(cur, filters)
+        finally:
+            conn.close()
+
+        rows = [
+            zones[loc] + (dropoffs, pickups, loc, variance) for loc, dropoffs, variance, pickups in ranked
+            if loc in zones and (not borough or zones[loc][1] == borough)
+        ][:5]
+        gaps = TripAggregator._gaps_result(rows)
+        for gap, row in zip(gaps, rows):
+            gap["ratioInterval"] = _interval(row[2], row[5], 2, 1.0 / row[3])
+        return gaps
+
+    @staticmethod
+    def get_borough_stats(borough, filters=None):
+        is_citywide = borough == "all"
+        clauses, params = SampleEstimator.day_clauses(filters)
+        st_clauses, st_params = SampleEstimator.day_clauses(filters, "st")
+        pu_clauses, pu_params = list(clauses), list(params)
+        do_clauses, do_params = [], []
+        dims = TripAggregator.dimensions()
+        if not is_citywide:
+            pu_clauses.append(f"s.pickup_location_id IN {dims.in_list(borough)}")
+            do_clauses.append(f"s.dropoff_location_id IN {dims.in_list(borough)}")
+            st_clauses.append(f"st.pickup_location_id IN {dims.in_list(borough)}")
+
+        def underserved(conn):
+            zones = dims.zone_info
+            return [
+                {"zone": zones[loc][0], "id": loc} for loc, _, _, _ in SampleEstimator._coverage(conn, filters)
+                if loc in zones and (is_citywide or zones[loc][1] == borough)
+            ]
+
+        results = TripAggregator.run_queries({
+            "main": lambda conn: SampleEstimator.estimate(
+                conn, ["trips", "speed", "speed_count", "distance", "distance_count", "passengers"],
+                pu_clauses, pu_params, pairs=[("speed", "speed_count"), ("distance", "distance_count")]
+            ),
+            "dropoff": lambda conn: SampleEstimator.estimate(
+                conn, ["passengers"], clauses, params, row_clauses=do_clauses, row_params=do_params
+            ),
+            "top_zones": (f"""
+                SELECT st.pickup_location_id, SUM(st.population) as trip_count
+                FROM trip_sample_strata st
+                {f"WHERE {' AND '.join(st_clauses)}" if st_clauses else ""}
+                GROUP BY 1
+            """, st_params),
+            "underserved": underserved,
+        })
+        main = results["main"].get(None, SampleEstimator._empty())
+        dropoff = results["dropoff"].get(None, SampleEstimator._empty())
+        t = main["total"]
+        result = TripAggregator._borough_result(
+            borough,
+            (_round(t.get("trips", 0), 0), SampleEstimator.ratio(main, "speed", "speed_count")[0],
+             SampleEstimator.ratio(main, "distance", "distance_count")[0], _round(t.get("passengers", 0), 0)),
+            _round(dropoff["total"].get("passengers", 0), 0),
+            TripAggregator._top_zone_names(results["top_zones"], dims, 3),
+            results["underserved"],
+            dims.zone_count(borough)
+        )
+
+        pickup_passengers = SampleEstimator.total_interval(main, "passengers")
+        dropoff_passengers = SampleEstimator.total_interval(dropoff, "passengers")
+        result["approximation"] = SampleEstimator._approximation(main["rows"] + dropoff["rows"], {
+            "totalTrips": SampleEstimator.total_interval(main, "trips"),
+            "avgSpeed": SampleEstimator.ratio_interval(main, "speed", "speed_count", 1),
+            "avgDistance": SampleEstimator.ratio_interval(main, "distance", "distance_count"),
+            "pickupPassengers": pickup_passengers,
+            "dropoffPassengers": dropoff_passengers,
+            # Both come from the same sample: adding the bounds covers any correlation between them
+            "totalPassengers": [a + b for a, b in zip(pickup_passengers, dropoff_passengers)],
+        })
+        return result
+
+    @staticmethod
+    def get_zone_stats(zone_id, filters=None):
+        dims = TripAggregator.dimensions()
+        zone_info = dims.zone(zone_id)
+        if zone_info is None:
+            return None
+        zone_name, borough = zone_info
+
+        clauses, params = SampleEstimator.day_clauses(filters)
+        results = TripAggregator.run_queries({
+            "pickup": lambda conn: SampleEstimator.estimate(
+                conn, ZONE_MEASURES, ["s.pickup_location_id = ?"] + clauses, [zone_id] + params,
+                pairs=[("distance", "distance_count"), ("speed", "speed_count"), ("fare", "fare_count"),
+                       ("duration", "duration_count")]
+            ),
+            "dropoff": lambda conn: SampleEstimator.estimate(
+                conn, ["trips", "passengers"], clauses, params,
+                row_clauses=["s.dropoff_location_id = ?"], row_params=[zone_id]
+            ),
+            "borough_avg": lambda conn: SampleEstimator.estimate(
+                conn, ["speed", "speed_count"],
+                [f"s.pickup_location_id IN {dims.in_list(borough)}"] + clauses, params,
+                pairs=[("speed", "speed_count")]
+            ),
+        })
+        pickup = results["pickup"].get(None, SampleEstimator._empty())
+        dropoff = results["dropoff"].get(None, SampleEstimator._empty())
+        borough_avg = results["borough_avg"].get(None, SampleEstimator._empty())
+        ratio = SampleEstimator.ratio
+        p = pickup["total"]
+        result = TripAggregator._zone_stats_result(
+            zone_name, borough,
+            (_round(p.get("trips", 0), 0), ratio(pickup, "distance", "distance_count")[0],
+             ratio(pickup, "speed", "speed_count")[0], ratio(pickup, "fare", "fare_count")[0],
+             ratio(pickup, "duration", "duration_count")[0], _round(p.get("passengers", 0), 0)),
+            (_round(dropoff["total"].get("trips", 0), 0), _round(dropoff["total"].get("passengers", 0), 0)),
+            ratio(borough_avg, "speed", "speed_count")[0]
+        )
+
+        pickups = p.get("trips", 0)
+        pickup_passengers = SampleEstimator.total_interval(pickup, "passengers")
+        dropoff_passengers = SampleEstimator.total_interval(dropoff, "passengers")
+        result["approximation"] = SampleEstimator._approximation(
+            pickup["rows"] + dropoff["rows"] + borough_avg["rows"], {
+                "pickupCount": SampleEstimator.total_interval(pickup, "trips"),
+                "dropoffCount": SampleEstimator.total_interval(dropoff, "trips"),
+                # Pickups in a zone are a whole-strata count, so the ratio's uncertainty is the dropoffs'
+                "coverageRatio": _interval(dropoff["total"].get("trips", 0), dropoff["var"].get("trips", 0), 2,
+                                           1.0 / pickups) if pickups else [0, 0],
+                "pickupPassengers": pickup_passengers,
+                "dropoffPassengers": dropoff_passengers,
+                "totalPassengers": [a + b for a, b in zip(pickup_passengers, dropoff_passengers)],
+                "avgDistance": SampleEstimator.ratio_interval(pickup, "distance", "distance_count"),
+                "avgSpeed": SampleEstimator.ratio_interval(pickup, "speed", "speed_count"),
+                "avgFare": SampleEstimator.ratio_interval(pickup, "fare", "fare_count"),
+                "avgDuration": SampleEstimator.ratio_interval(pickup, "duration", "duration_count", 1, 1 / 60),
+                "boroughAvgSpeed": SampleEstimator.ratio_interval(borough_avg, "speed", "speed_count"),
+            }
+        )
+        return result
+
+
+if __name__ == "__main__":
+    # Accuracy + latency check: approx=True against the exact answers on the current database
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Compare the sample-based answers with the exact ones")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per call and mode")
+    args = parser.parse_args()
+
+    conn = TripAggregator.connect()
+    if not SampleEstimator.ready(conn):
+        conn.close()
+        sys.exit("trip_sample has not been drawn; run the ETL pipeline first")
+    sample_rows, strata, population = conn.execute(
+        "SELECT SUM(sampled), COUNT(*), SUM(population) FROM trip_sample_strata"
+    ).fetchone()
+    zone_id = conn.execute(
+        "SELECT pickup_location_id FROM trip_sample_strata GROUP BY 1 ORDER BY SUM(population) DESC LIMIT 1"
+    ).fetchone()[0]
+    conn.close()
+    print(f"Sample: {sample_rows} of {population} trips in {strata} strata")
+
+    week = {"borough": "all", "start_date": "2019-01-05", "end_date": "2019-01-12"}
+    calls = [
+        ("summary", lambda a: TripAggregator.get_global_summary({"borough": "all"}, approx=a)),
+        ("summary week", lambda a: TripAggregator.get_global_summary(dict(week), approx=a)),
+        ("summary Queens", lambda a: TripAggregator.get_global_summary(dict(week, borough="Queens"), approx=a)),
+        ("hourly", lambda a: TripAggregator.get_hourly_stats(dict(week), approx=a)),
+        ("gaps", lambda a: TripAggregator.get_coverage_gaps(dict(week), approx=a)),
+        ("borough Manhattan", lambda a: TripAggregator.get_borough_stats("Manhattan", dict(week), approx=a)),
+        (f"zone {zone_id}", lambda a: TripAggregator.get_zone_stats(zone_id, dict(week), approx=a)),
+    ]
+
+    def intervals(result):
+        """[(figure, exact-side value getter, interval)] for every interval in an approximate result"""
+        if isinstance(result, list):
+            return [(f"{g['zone']}.ratio", g["ratio"], g["ratioInterval"]) for g in result]
+        if "approximation" in result.get("summary", {}):
+            result = result["summary"]
+        if "approximation" in result:
+            return [(name, result[name], bounds) for name, bounds in result["approximation"]["intervals"].items()]
+        return [(f"{h}.{name}", d[name], bounds) for h, d in result.items() for name, bounds in d["intervals"].items()]
+
+    def exact_value(result, name):
+        if isinstance(result, list):
+            return next((g["ratio"] for g in result if f"{g['zone']}.ratio" == name), None)
+        if "." in name:
+            hour, field = name.split(".")
+            return result[int(hour)][field]
+        return result.get("summary", result)[name]
+
+    covered = total = 0
+    for name, call in calls:
+        timings = {}
+        for approx in (False, True):
+            call(approx)
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                result = call(approx)
+                samples.append(time.perf_counter() - start)
+            timings[approx] = (statistics.median(samples), result)
+        (exact_s, exact), (approx_s, approx) = timings[False], timings[True]
+        hits = checked = 0
+        worst = 0.0
+        for figure, estimate, (low, high) in intervals(approx):
+            truth = exact_value(exact, figure)
+            if truth is None:
+                continue
+            checked += 1
+            hits += low <= truth <= high
+            if truth:
+                worst = max(worst, abs(estimate - truth) / abs(truth))
+        covered, total = covered + hits, total + checked
+        print(f"{name:18} exact {exact_s * 1000:8.1f} ms | approx {approx_s * 1000:7.1f} ms | "
+              f"{hits}/{checked} intervals hold the exact value, worst error {worst * 100:.1f}%")
+    print(f"Interval coverage: {covered}/{total} ({covered / max(total, 1) * 100:.1f}%, nominal {CONFIDENCE:.0%})")
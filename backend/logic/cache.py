@@ -0,0 +1,168 @@
+# backend\logic\cache.py
+# Result Cache: Bounded LRU + TTL cache for aggregator results, keyed by endpoint and canonical filters and
+# invalidated as a whole when the data_version stamp the ETL writes to etl_state changes.
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    """One in-progress computation that concurrent misses on the same key wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _MISSING
+
+
+class ResultCache:
+    """
+    Thread-safe result cache shared by the API's TripAggregator-backed endpoints.
+    - at most `max_entries` results and `max_bytes` of their JSON size; least recently used go first
+    - each result lives `ttl` seconds at most
+    - `version` is a callable returning the current data version; every lookup checks it and a change
+      drops all entries, so results never outlive the data they were computed from
+    - concurrent misses on one key compute it once: the first caller runs compute(), the others wait for
+      its result instead of running the same aggregation side by side
+    Cached values are shared between requests and must not be mutated by callers.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024, ttl=300, version=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = version
+        self._entries = OrderedDict() # key -> (value, size, expires_at)
+        self._inflight = {} # key -> _Flight of the caller computing it
+        self._bytes = 0
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0,
+            "invalidations": 0, "oversize": 0, "coalesced": 0
+        }
+
+    @staticmethod
+    def canonical_filters(filters):
+        """
+        Filters as a hashable, order-independent key: unset values (None, '') are dropped and
+        zone ids compare as integers, so ?zone_id=012 and zone_id=12 share an entry
+        """
+        items = []
+        for key, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            if key == 'zone_id' and str(value).strip().isdigit():
+                value = int(value)
+            items.append((key, value if isinstance(value, (int, float)) else str(value)))
+        return tuple(sorted(items))
+
+    def key(self, name, filters=None, *args):
+        return (name, args, self.canonical_filters(filters))
+
+    def get_or_compute(self, name, filters, compute, *args):
+        """Cached result of compute() for (name, args, filters); computes and stores it on a miss"""
+        key = self.key(name, filters, *args)
+        version = self._check_version()
+        value = self._get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.value is not _MISSING:
+                return flight.value
+            return compute() # The leader failed: let each waiter raise (or succeed) on its own
+
+        try:
+            value = flight.value = compute()
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+        self._put(key, value, version)
+        return value
+
+    def current_version(self):
+        """Current data version (None without a version callable); entries from an older one are dropped"""
+        return self._check_version()
+
+    def _check_version(self):
+        """Reads the data version and clears the cache when it moved; returns it"""
+        if self.version is None:
+            return None
+        current = self.version()
+        with self._lock:
+            if current != self._data_version:
+                if self._entries:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._bytes = 0
+                self._data_version = current
+        return current
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return _MISSING
+            value, size, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def _put(self, key, value, version):
+        size = len(json.dumps(value, separators=(',', ':'), default=str))
+        with self._lock:
+            # A result computed before an invalidation may mix old and new data: don't keep it
+            if version != self._data_version:
+                return
+            if size > self.max_bytes:
+                self._stats["oversize"] += 1
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["data_version"] = self._data_version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        stats["ttl"] = self.ttl
+        return stats
@@ -0,0 +1,376 @@
+# backend\logic\columnar.py
+# Columnar Execution Backend: Holds the trips fact columns as compact NumPy arrays sorted by pickup time and
+# answers the dashboard aggregations with vectorized kernels (per-day row-offset slices, bincount grouping).
+
+import sys
+import math
+import time
+import threading
+import numpy as np
+
+try:
+    from backend.logic.aggregators import TripAggregator
+    from backend.logic.snapshot import TripSnapshot
+    from backend.logic.dimensions import DimensionCache
+    from backend.dal.connection import get_connection_pool
+except ImportError:
+    from aggregators import TripAggregator
+    from snapshot import TripSnapshot
+    from dimensions import DimensionCache
+    from dal.connection import get_connection_pool
+
+
+class ColumnarTripStore:
+    """
+    Read-only copy of the trips columns the aggregations need (see SNAPSHOT_COLUMNS in logic/snapshot.py):
+    - pickup_time_id (int32) sorted ascending, so a date filter is a slice between per-day row offsets
+    - pickup/dropoff location (int16, NULL -> 0) used directly as np.bincount group keys
+    - fare/total/distance as int32 cents (exact sums), speed as float64 (NULL outliers -> NaN),
+      passengers as int8 and duration as float32
+    When the ETL has written a snapshot matching the database, the columns are np.memmap views of its
+    files (instant startup, one page-cache copy shared by every worker process); otherwise they are
+    read from SQLite into memory.
+    Every query returns exactly what the SQL path returns, by reusing TripAggregator's result shapers.
+    Trips without a pickup_time_id are left out, as they are from trip_rollups.
+    """
+
+    REFRESH_SECONDS = 5  # How often shared() checks the database for new loads
+    _shared = {}
+    _lock = threading.Lock()
+
+    def __init__(self, db_path, snapshot_dir=None):
+        self.db_path = db_path
+        self.checked_at = 0
+        start = time.perf_counter()
+        conn = get_connection_pool(db_path).connect()
+        try:
+            self.signature = TripSnapshot.data_signature(conn)
+            self._load_zones(conn)
+            manifest, columns = TripSnapshot.load(snapshot_dir or TripSnapshot.default_dir(db_path))
+            if manifest and tuple(manifest['signature']) == self.signature:
+                self.source = "snapshot"
+                first_day, offsets = manifest['days']['first_day'], np.asarray(manifest['days']['row_offsets'])
+            else:
+                self.source = "database"
+                columns = TripSnapshot.read_columns(conn)
+                first_day, offsets = TripSnapshot.day_index(columns['pickup_time_id'])
+        finally:
+            conn.close()
+        self._set_columns(columns, first_day, offsets)
+        self.load_seconds = round(time.perf_counter() - start, 3)
+
+    @classmethod
+    def shared(cls, db_path):
+        """Process-wide store for a database, rebuilt when the ETL has committed new data"""
+        store = cls._shared.get(db_path)
+        now = time.monotonic()
+        if store and now - store.checked_at < cls.REFRESH_SECONDS:
+            return store
+        with cls._lock:
+            store = cls._shared.get(db_path)
+            if store:
+                conn = get_connection_pool(db_path).connect()
+                try:
+                    current = TripSnapshot.data_signature(conn)
+                finally:
+                    conn.close()
+                if current == store.signature:
+                    store.checked_at = now
+                    return store
+            store = cls(db_path)
+            store.checked_at = now
+            cls._shared[db_path] = store
+            return store
+
+    def _load_zones(self, conn):
+        # The SQL path's dimension snapshot (same location order, same borough codes)
+        dims = DimensionCache.get(conn, self.db_path)
+        self.loc_to_borough = dims.loc_to_borough
+        self.zone_info = dims.zone_info
+        self.boroughs = dims.boroughs
+        self.zone_names = sorted({zone for zone, _ in dims.zone_info.values() if zone is not None})
+
+    def _set_columns(self, columns, first_day, day_offsets):
+        self.time = columns['pickup_time_id']
+        self.pu = columns['pickup_location_id']
+        self.do = columns['dropoff_location_id']
+        self.fare_c = columns['fare_cents']
+        self.total_c = columns['total_cents']
+        self.dist_c = columns['distance_cents']
+        self.speed = columns['speed_mph']
+        self.passengers = columns['passenger_count']
+        self.duration = columns['trip_duration_seconds']
+        self.first_day = first_day
+        self.day_offsets = day_offsets
+
+        # Group-key space and per-location lookups (index = location_id)
+        self.n_locations = int(max(self.pu.max(initial=0), self.do.max(initial=0), max(self.zone_info, default=0))) + 1
+        self.borough_code = np.full(self.n_locations, -1, dtype=np.int16)
+        self.zone_name_code = np.full(self.n_locations, -1, dtype=np.int16)
+        self.in_zones = np.zeros(self.n_locations, dtype=bool)
+        for loc, (zone, borough) in self.zone_info.items():
+            self.in_zones[loc] = True
+            if borough is not None:
+                self.borough_code[loc] = self.boroughs.index(borough)
+            if zone is not None:
+                self.zone_name_code[loc] = self.zone_names.index(zone)
+
+    # --- Kernels ---
+
+    def _day_offset(self, day):
+        """Row where a day (days since 1970-01-01) starts; clamped to the loaded range"""
+        k = min(max(day - self.first_day, 0), len(self.day_offsets) - 1)
+        return int(self.day_offsets[k])
+
+    def _slice(self, filters):
+        """Date filter -> contiguous slice of the time-sorted arrays via the per-day row offsets"""
+        first, last = TripAggregator.time_key_range(
+            (filters or {}).get('start_date'), (filters or {}).get('end_date')
+        )
+        lo = int(self.day_offsets[0]) if first is None else self._day_offset(first // 24)
+        hi = int(self.day_offsets[-1]) if last is None else self._day_offset(last // 24 + 1)
+        return slice(lo, max(lo, hi))
+
+    def _borough_mask(self, locations, borough):
+        """Rows whose location lies in the borough (a borough with no zones matches nothing)"""
+        if borough not in self.boroughs:
+            return np.zeros(len(locations), dtype=bool)
+        return self.borough_code[locations] == self.boroughs.index(borough)
+
+    def _count(self, keys):
+        return np.bincount(keys, minlength=self.n_locations)
+
+    def _sum(self, keys, weights):
+        return np.bincount(keys, weights=weights, minlength=self.n_locations)
+
+    @staticmethod
+    def _avg(values):
+        """SQL AVG: mean of the non-NULL (non-NaN) values, None if there are none"""
+        valid = ~np.isnan(values)
+        n = int(np.count_nonzero(valid))
+        return float(values[valid].sum(dtype=np.float64) / n) if n else None
+
+    def _underserved(self, sl, borough=None):
+        """Zones with dropoffs > 2x pickups in the slice: (ratios, location ids) highest ratio first"""
+        pu_counts = self._count(self.pu[sl])
+        do_counts = self._count(self.do[sl])
+        candidates = self.in_zones & (do_counts > 0) & (pu_counts > 0)
+        if borough:
+            candidates &= self.borough_code == (self.boroughs.index(borough) if borough in self.boroughs else -2)
+        locs = np.flatnonzero(candidates)
+        ratios = do_counts[locs] / pu_counts[locs]
+        keep = ratios > 2.0
+        locs, ratios = locs[keep], ratios[keep]
+        order = np.lexsort((locs, -ratios))
+        return locs[order], do_counts, pu_counts
+
+    # --- Queries (same signatures and results as TripAggregator) ---
+
+    def get_global_summary(self, filters):
+        sl = self._slice(filters)
+        pu, speed = self.pu[sl], self.speed[sl]
+        fare_c, total_c, dist_c, passengers = self.fare_c[sl], self.total_c[sl], self.dist_c[sl], self.passengers[sl]
+        if filters.get('zone_id'):
+            mask = pu == int(filters['zone_id'])
+            pu, speed, fare_c, total_c, dist_c, passengers = (
+                a[mask] for a in (pu, speed, fare_c, total_c, dist_c, passengers)
+            )
+
+        speed0 = np.nan_to_num(speed)
+        normal_speed = speed <= 80
+        counts = self._count(pu)
+        measures = [
+            self._sum(pu, fare_c) / 100,
+            self._sum(pu, total_c) / 100,
+            self._sum(pu, dist_c) / 100,
+            self._sum(pu, speed0),
+            self._sum(pu, passengers),
+            self._sum(pu, speed > 80),
+            self._sum(pu, (dist_c < 100) & (fare_c > 10000)),
+            self._sum(pu, np.where(normal_speed, speed0, 0)),
+            self._sum(pu, normal_speed),
+        ]
+        rows = []
+        for loc in np.flatnonzero(counts):
+            fare, rev, dist, speed_sum, pass_count, speed_anom, fare_anom, f_sum, f_count = (m[loc] for m in measures)
+            rows.append((
+                int(loc) or None, int(counts[loc]), float(fare), float(rev), float(dist), float(speed_sum),
+                int(pass_count), int(speed_anom), int(fare_anom), float(f_sum), int(f_count)
+            ))
+
+        selected_borough = filters.get('borough') if filters.get('borough') != 'all' else None
+        return TripAggregator._summary_result(rows, self.loc_to_borough, selected_borough)
+
+    def get_hourly_stats(self, filters):
+        sl = self._slice(filters)
+        pu, hours, speed = self.pu[sl], self.time[sl] % 24, self.speed[sl]
+        if filters.get('zone_id'):
+            mask = pu == int(filters['zone_id'])
+        elif filters.get('borough') and filters.get('borough') != 'all':
+            mask = self._borough_mask(pu, filters['borough'])
+        else:
+            mask = None
+        if mask is not None:
+            hours, speed = hours[mask], speed[mask]
+
+        valid = ~np.isnan(speed)
+        counts = np.bincount(hours, minlength=24)
+        speed_sums = np.bincount(hours, weights=np.where(valid, speed, 0), minlength=24)
+        speed_counts = np.bincount(hours, weights=valid, minlength=24)
+        rows = [
+            (h, int(counts[h]), float(speed_sums[h] / speed_counts[h]) if speed_counts[h] else None)
+            for h in range(24) if counts[h]
+        ]
+        return TripAggregator._hourly_result(rows)
+
+    def get_coverage_gaps(self, filters=None):
+        filters = filters or {}
+        borough = filters.get('borough') if filters.get('borough') != 'all' else None
+        locs, do_counts, pu_counts = self._underserved(self._slice(filters), borough)
+        rows = [
+            (*self.zone_info[int(loc)], int(do_counts[loc]), int(pu_counts[loc]), int(loc))
+            for loc in locs[:5]
+        ]
+        return TripAggregator._gaps_result(rows)
+
+    def get_borough_stats(self, borough, filters=None):
+        sl = self._slice(filters)
+        is_citywide = borough == "all"
+        pu, do = self.pu[sl], self.do[sl]
+        pu_mask = np.ones(len(pu), dtype=bool) if is_citywide else self._borough_mask(pu, borough)
+        do_mask = np.ones(len(do), dtype=bool) if is_citywide else self._borough_mask(do, borough)
+
+        # 1. Main stats (pickups in the borough)
+        trips = int(np.count_nonzero(pu_mask))
+        main_stats = (
+            trips,
+            self._avg(self.speed[sl][pu_mask]),
+            float(self.dist_c[sl][pu_mask].sum(dtype=np.int64) / 100 / trips) if trips else None,
+            int(self.passengers[sl][pu_mask].sum(dtype=np.int64)) if trips else None
+        )
+        # 2. Inbound passengers
+        dropoff_passengers = int(self.passengers[sl][do_mask].sum(dtype=np.int64))
+
+        # 3. Top 3 zones by pickups, grouped by zone name like the SQL path
+        pu_in = pu[pu_mask]
+        name_codes = self.zone_name_code[pu_in[self.in_zones[pu_in]]]
+        name_counts = np.bincount(name_codes[name_codes >= 0], minlength=len(self.zone_names))
+        top = np.lexsort((np.arange(len(name_counts)), -name_counts))[:3]
+        top_zones = [{"zone": self.zone_names[i], "trips": int(name_counts[i])} for i in top if name_counts[i]]
+
+        # 4. Underserved zones
+        locs, _, _ = self._underserved(sl, None if is_citywide else borough)
+        underserved = [{"zone": self.zone_info[int(loc)][0], "id": int(loc)} for loc in locs]
+
+        # 5. Zones in the borough
+        zone_count = len(self.zone_info) if is_citywide else sum(1 for _, b in self.zone_info.values() if b == borough)
+
+        return TripAggregator._borough_result(borough, main_stats, dropoff_passengers, top_zones, underserved, zone_count)
+
+    def get_zone_stats(self, zone_id, filters=None):
+        if zone_id not in self.zone_info:
+            return None
+        zone_name, borough = self.zone_info[zone_id]
+        sl = self._slice(filters)
+        pu, do = self.pu[sl], self.do[sl]
+
+        pick = pu == zone_id
+        trips = int(np.count_nonzero(pick))
+        pickup_stats = (
+            trips,
+            float(self.dist_c[sl][pick].sum(dtype=np.int64) / 100 / trips) if trips else None,
+            self._avg(self.speed[sl][pick]),
+            float(self.fare_c[sl][pick].sum(dtype=np.int64) / 100 / trips) if trips else None,
+            self._avg(self.duration[sl][pick].astype(np.float64)),
+            int(self.passengers[sl][pick].sum(dtype=np.int64)) if trips else None
+        )
+        drop = do == zone_id
+        dropoff_res = (int(np.count_nonzero(drop)), int(self.passengers[sl][drop].sum(dtype=np.int64)))
+        borough_avg = self._avg(self.speed[sl][self._borough_mask(pu, borough)]) if borough is not None else None
+
+        return TripAggregator._zone_stats_result(zone_name, borough, pickup_stats, dropoff_res, borough_avg)
+
+
+# Filter sets and metrics the SQL and columnar backends are checked against each other on
+PARITY_FILTERS = [
+    {"borough": "all"},
+    {"borough": "all", "start_date": "2019-01-05", "end_date": "2019-01-12"},
+    {"borough": "Manhattan", "start_date": "2019-01-10"},
+    {"borough": "Queens", "end_date": "2019-01-09"},
+    {"borough": "all", "zone_id": None, "start_date": "2019-01-02"}, # zone_id: the first zone of the database
+    {"borough": "Nowhere"},
+]
+
+
+def parity_queries(zone_ids):
+    """
+    [(label, call)] covering every metric the columnar backend answers, for PARITY_FILTERS and zone_ids
+    (the first one fills the zone filter); each call runs on whichever backend TripAggregator.backend selects
+    """
+    queries = []
+    for f in PARITY_FILTERS:
+        f = dict(f, zone_id=zone_ids[0]) if "zone_id" in f else f
+        queries += [
+            (f"summary {f}", lambda f=f: TripAggregator.get_global_summary(dict(f))),
+            (f"hourly {f}", lambda f=f: TripAggregator.get_hourly_stats(dict(f))),
+            (f"gaps {f}", lambda f=f: TripAggregator.get_coverage_gaps(dict(f))),
+            (f"borough {f}", lambda f=f: TripAggregator.get_borough_stats(f['borough'], dict(f))),
+            (f"report {f}", lambda f=f: _without_timestamp(TripAggregator.get_detailed_report(dict(f)))),
+        ]
+    for zone_id in zone_ids:
+        queries.append((f"zone {zone_id}", lambda z=zone_id: TripAggregator.get_zone_stats(z, PARITY_FILTERS[1])))
+    return queries
+
+
+def _without_timestamp(report):
+    report["metadata"].pop("generatedAt", None)
+    return report
+
+
+def parity_differences(a, b, path="$"):
+    """
+    Where two results differ: exact match, except floats may differ in the last rounded digit
+    (different summation order). [] when they agree.
+    """
+    if isinstance(a, dict) and isinstance(b, dict):
+        if a.keys() != b.keys():
+            return [f"{path}: keys {sorted(a)} != {sorted(b)}"]
+        return [d for k in a for d in parity_differences(a[k], b[k], f"{path}.{k}")]
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return [f"{path}: {len(a)} items != {len(b)}"]
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in parity_differences(x, y, f"{path}[{i}]")]
+    if isinstance(a, float) or isinstance(b, float):
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=1e-9, abs_tol=0.0101):
+            return []
+    elif a == b and type(a) == type(b):
+        return []
+    return [f"{path}: {a!r} != {b!r}"]
+
+
+if __name__ == "__main__":
+    # Parity check: every query through the SQL backend and the columnar backend must return the same JSON
+    # (tests/test_columnar_parity.py runs the same matrix on a seeded database)
+    TripAggregator.backend = 'columnar'
+    start = time.perf_counter()
+    store = TripAggregator.columnar_engine()  # Warm the shared store the aggregator will use
+    print(f"Loaded {len(store.time):,} trips from the {store.source} in {time.perf_counter() - start:.3f}s")
+
+    queries = parity_queries(list(store.zone_info)[:3] + [161, 999])
+    failures, timings = 0, {"sql": 0.0, "columnar": 0.0}
+    for name, query in queries:
+        results = {}
+        for backend in ("sql", "columnar"):
+            TripAggregator.backend = backend
+            t0 = time.perf_counter()
+            results[backend] = query()
+            timings[backend] += time.perf_counter() - t0
+        diffs = parity_differences(results["sql"], results["columnar"])
+        if diffs:
+            failures += 1
+            print(f"MISMATCH {name}: " + "; ".join(diffs[:5]))
+    TripAggregator.backend = 'sql'
+
+    print(f"{len(queries) - failures}/{len(queries)} queries match "
+          f"(sql {timings['sql'] * 1000:.0f} ms, columnar {timings['columnar'] * 1000:.0f} ms total)")
+    sys.exit(1 if failures else 0)
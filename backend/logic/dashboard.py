@@ -0,0 +1,201 @@
+# backend\logic\dashboard.py
+# Dashboard Engine: Builds the /api/dashboard bundle - the panels of one filter change computed together from one
+# pickup pass (zone x hour) and one dropoff pass over the cached zone dimensions, with per-pass and per-panel timings.
+
+import os
+import sys
+import time
+
+try:
+    from backend.logic.aggregators import TripAggregator
+    from backend.logic.report import ReportEngine
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.aggregators import TripAggregator
+    from logic.report import ReportEngine
+
+# Each panel is the payload of its standalone endpoint for the same filters. revenue is the congestion index of
+# the filtered scope (the summary pass computes it anyway; /api/trips/revenue answers citywide over all dates),
+# and zone is None without a zone_id.
+PANEL_CALLS = {
+    "summary": lambda f: TripAggregator.get_global_summary(f)['summary'],
+    "hourly": lambda f: TripAggregator.get_hourly_stats(f),
+    "gaps": lambda f: TripAggregator.get_coverage_gaps(f),
+    "revenue": lambda f: TripAggregator.get_global_summary(f)['congestion'],
+    "borough": lambda f: TripAggregator.get_borough_stats(f.get('borough') or 'all', f),
+    "zone": lambda f: TripAggregator.get_zone_stats(f['zone_id'], f) if f.get('zone_id') else None,
+    "quantiles": lambda f: TripAggregator.get_quantiles(f),
+}
+DASHBOARD_PANELS = tuple(PANEL_CALLS)
+# What the map view refreshes on every filter change
+DEFAULT_PANELS = ("summary", "hourly", "gaps", "revenue")
+# Shared passes each panel is derived from; panels without an entry run their own reads next to the passes
+PANEL_PASSES = {
+    "summary": ("pickup",),
+    "hourly": ("pickup",),
+    "revenue": ("pickup",),
+    "gaps": ("pickup", "dropoff"),
+    "borough": ("pickup", "dropoff"),
+}
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class DashboardEngine:
+    """
+    Runs the pickup pass (ReportEngine.pickup_pass: every measure per pickup zone and hour) and the dropoff
+    pass once, side by side on pooled connections together with the reads of the zone and quantiles panels,
+    then derives every requested panel from those rows and the cached zone dimensions in Python. The payloads match the
+    standalone aggregators (see __main__), which cost one to five statements per panel.
+    """
+
+    @staticmethod
+    def build(filters, panels=DEFAULT_PANELS):
+        """{"panels": {name: payload}, "timings": {"passes", "panels", "totalMs"}} for the requested panels"""
+        start = time.perf_counter()
+        panels = [p for p in DASHBOARD_PANELS if p in set(panels)]
+        if TripAggregator.columnar_engine():
+            return DashboardEngine.build_from_parts(filters, panels)
+
+        passes = {name for p in panels for name in PANEL_PASSES.get(p, ())}
+        queries = {}
+        if "pickup" in passes:
+            queries["pickup"] = lambda conn: ReportEngine.pickup_pass(conn.cursor(), filters)
+        if "dropoff" in passes:
+            queries["dropoff"] = lambda conn: ReportEngine.dropoff_pass(conn.cursor(), filters)
+        own_reads = [p for p in panels if p not in PANEL_PASSES]
+        for panel in own_reads:
+            queries[panel] = lambda conn, call=PANEL_CALLS[panel]: call(filters)
+        results = TripAggregator.run_queries(queries)
+
+        payloads = {panel: results[panel] for panel in own_reads}
+        timings = {panel: _ms(results.timings[panel]) for panel in own_reads}
+        if passes:
+            zones = TripAggregator.dimensions().zone_info
+            by_zone = ReportEngine._by_zone(results.get("pickup", ()))
+            for panel in panels:
+                if panel in PANEL_PASSES:
+                    panel_start = time.perf_counter()
+                    payloads[panel] = DashboardEngine.derive(
+                        panel, filters, zones, results.get("pickup", ()), by_zone, results.get("dropoff", {})
+                    )
+                    timings[panel] = _ms(time.perf_counter() - panel_start)
+
+        return {
+            "panels": {panel: payloads[panel] for panel in panels},
+            "timings": {
+                "passes": {
+                    name: _ms(results.timings[name]) for name in ("pickup", "dropoff") if name in results
+                },
+                "panels": timings,
+                "totalMs": _ms(time.perf_counter() - start),
+            },
+        }
+
+    @staticmethod
+    def derive(panel, filters, zones, pickup_rows, by_zone, dropoff):
+        """One shared-pass panel from the pass rows (the same filter semantics as its aggregator)"""
+        borough = filters.get('borough')
+        scoped = bool(borough) and borough != 'all'
+        zone_id = filters.get('zone_id')
+        try:
+            zone_key = int(zone_id) if zone_id else None
+        except (TypeError, ValueError):
+            zone_key = zone_id # Matches no zone, as in SQL
+
+        if panel in ("summary", "revenue"):
+            scope = {loc: t for loc, t in by_zone.items() if loc == zone_key} if zone_id else by_zone
+            summary = ReportEngine._global_summary(scope, zones, borough if scoped else None)
+            return summary['summary'] if panel == "summary" else summary['congestion']
+        if panel == "hourly":
+            if zone_id:
+                keep = lambda loc: loc == zone_key
+            elif scoped:
+                keep = lambda loc: loc in zones and zones[loc][1] == borough
+            else:
+                keep = None
+            return ReportEngine._hourly(pickup_rows, keep)
+        if panel == "gaps":
+            return TripAggregator._gaps_result(
+                ReportEngine._gaps(by_zone, dropoff, zones, borough if scoped else None, limit=5)
+            )
+        if panel == "borough":
+            return ReportEngine._borough_stats(by_zone, dropoff, zones, borough or 'all')
+        raise ValueError(f"{panel} is not derived from the shared passes")
+
+    @staticmethod
+    def build_from_parts(filters, panels=DEFAULT_PANELS):
+        """
+        The bundle from the standalone aggregators, one call per panel. Used with the columnar backend,
+        whose aggregators are in-memory kernels, and as the parity reference for build().
+        """
+        start = time.perf_counter()
+        payloads, timings = {}, {}
+        for panel in (p for p in DASHBOARD_PANELS if p in set(panels)):
+            panel_start = time.perf_counter()
+            payloads[panel] = PANEL_CALLS[panel](dict(filters))
+            timings[panel] = _ms(time.perf_counter() - panel_start)
+        return {
+            "panels": payloads,
+            "timings": {"passes": {}, "panels": timings, "totalMs": _ms(time.perf_counter() - start)},
+        }
+
+
+if __name__ == "__main__":
+    # Parity + latency check: the shared-pass bundle against one aggregator call per panel
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Compare DashboardEngine with per-panel aggregator calls")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per filter set and engine")
+    args = parser.parse_args()
+
+    conn = TripAggregator.connect()
+    zone_ids = [r[0] for r in conn.execute(
+        "SELECT pickup_location_id FROM trips GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 2"
+    )]
+    conn.close()
+
+    filter_sets = [
+        {"borough": "all"},
+        {"borough": "all", "start_date": "2019-01-05", "end_date": "2019-01-12"},
+        {"borough": "Manhattan", "start_date": "2019-01-10"},
+        {"borough": "Queens", "end_date": "2019-01-09"},
+        {"borough": "Nowhere"},
+    ] + [
+        {"borough": "all", "zone_id": str(z), "start_date": "2019-01-02", "end_date": "2019-01-09"} for z in zone_ids
+    ] + [{"borough": "Brooklyn", "zone_id": "999"}]
+
+    def timed(build, filters, panels):
+        """(panels payload, median seconds, statements per call)"""
+        statements = []
+        conn = TripAggregator.connect()  # Held so nested checkouts share it and the trace sees every statement
+        conn.set_trace_callback(statements.append)
+        try:
+            result = build(dict(filters), panels)
+        finally:
+            conn.set_trace_callback(None)
+            conn.close()
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            build(dict(filters), panels)
+            samples.append(time.perf_counter() - start)
+        return result["panels"], statistics.median(samples), len(statements)
+
+    failures, totals = 0, {"parts": 0.0, "bundle": 0.0}
+    for filters in filter_sets:
+        panels = DEFAULT_PANELS + ("borough",) + (("zone",) if filters.get("zone_id") else ())
+        old, old_s, old_n = timed(DashboardEngine.build_from_parts, filters, panels)
+        new, new_s, new_n = timed(DashboardEngine.build, filters, panels)
+        totals["parts"] += old_s
+        totals["bundle"] += new_s
+        diff = [p for p in old if old[p] != new[p]]
+        failures += bool(diff)
+        print(f"{'DIFF ' + ','.join(diff) if diff else 'ok  '} {filters}: {old_n} statements {old_s * 1000:.1f} ms -> "
+              f"{new_n} statements {new_s * 1000:.1f} ms")
+    print(f"{len(filter_sets) - failures}/{len(filter_sets)} bundles match; "
+          f"total {totals['parts'] * 1000:.0f} ms -> {totals['bundle'] * 1000:.0f} ms")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,118 @@
+# backend\logic\dimensions.py
+# Dimension Cache: Process-wide snapshot of taxi_zones (zone, borough and service zone per location, and each
+# borough's zone ids as arrays), reloaded only when the ETL bumps zones_version, so spatial filters become
+# literal IN lists or NumPy masks instead of per-request lookups and joins against the dimension table.
+
+import os
+import sys
+import sqlite3
+import threading
+import numpy as np
+
+try:
+    from backend.dal.connection import DB_PATH, get_connection_pool
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from dal.connection import DB_PATH, get_connection_pool
+
+
+class ZoneDimensions:
+    """
+    One immutable load of taxi_zones. Location ids are in table order (ascending), like
+    "SELECT ... FROM taxi_zones" without an ORDER BY, which the summary's post-aggregation relies on.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.loc_to_borough = {loc: borough for loc, borough, _, _ in rows}
+        self.zone_info = {loc: (zone, borough) for loc, borough, zone, _ in rows}
+        self.service_zones = {loc: service_zone for loc, _, _, service_zone in rows}
+        self.boroughs = sorted({borough for _, borough, _, _ in rows if borough is not None})
+        self.zone_ids = np.array([loc for loc, _, _, _ in rows], dtype=np.int64)
+        self.borough_zone_ids = {
+            borough: np.array([loc for loc, b, _, _ in rows if b == borough], dtype=np.int64) for borough in self.boroughs
+        }
+        # Per-location lookups (index = location_id): borough position in self.boroughs, -1 = none
+        size = int(self.zone_ids.max(initial=0)) + 1
+        self.borough_code = np.full(size, -1, dtype=np.int16)
+        for code, borough in enumerate(self.boroughs):
+            self.borough_code[self.borough_zone_ids[borough]] = code
+        self._in_lists = {}
+
+    def zone(self, zone_id):
+        """(zone, borough) of a location id (int or numeric string), or None"""
+        try:
+            return self.zone_info.get(int(zone_id))
+        except (TypeError, ValueError):
+            return None
+
+    def borough_ids(self, borough):
+        """Zone ids of a borough, every zone id for 'all', none for an unknown borough (or None)"""
+        if borough == 'all':
+            return self.zone_ids
+        return self.borough_zone_ids.get(borough, self.zone_ids[:0])
+
+    def in_list(self, borough):
+        """borough_ids() as a SQL literal for `column IN (...)` - integers only, so nothing to bind"""
+        text = self._in_lists.get(borough)
+        if text is None:
+            text = self._in_lists[borough] = f"({', '.join(str(loc) for loc in self.borough_ids(borough).tolist())})"
+        return text
+
+    def borough_mask(self, locations, borough):
+        """Elementwise `location in borough_ids(borough)` for an integer array (ids outside taxi_zones never match)"""
+        locations = np.asarray(locations)
+        mask = np.zeros(len(locations), dtype=bool)
+        known = (locations >= 0) & (locations < len(self.borough_code))
+        if borough == 'all':
+            mask[known] = np.isin(locations[known], self.zone_ids)
+        elif borough in self.borough_zone_ids:
+            mask[known] = self.borough_code[locations[known]] == self.boroughs.index(borough)
+        return mask
+
+    def zone_count(self, borough='all'):
+        return len(self.borough_ids(borough))
+
+
+class DimensionCache:
+    """Shared ZoneDimensions per database file; get() compares zones_version and reloads when it moved"""
+
+    _shared = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def zones_version(cur):
+        """etl_state.zones_version (bumped by TripDAL.insert_zones); data_version on databases without it"""
+        try:
+            row = cur.execute(
+                "SELECT value FROM etl_state WHERE key IN ('zones_version', 'data_version') ORDER BY key = 'zones_version' DESC"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None # Database created before etl_state existed
+        return row[0] if row else None
+
+    @classmethod
+    def get(cls, cur=None, db_path=None):
+        """Current ZoneDimensions; cur is any open connection or cursor on the database (else one is borrowed)"""
+        db_path = db_path or DB_PATH
+        conn = None if cur is not None else get_connection_pool(db_path).connect()
+        try:
+            reader = cur if cur is not None else conn
+            version = cls.zones_version(reader)
+            dims = cls._shared.get(db_path)
+            if dims is not None and dims.version == version:
+                return dims
+            with cls._lock:
+                dims = cls._shared.get(db_path)
+                if dims is None or dims.version != version:
+                    rows = reader.execute("SELECT location_id, borough, zone, service_zone FROM taxi_zones").fetchall()
+                    dims = cls._shared[db_path] = ZoneDimensions(rows, version)
+                return dims
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._shared.clear()
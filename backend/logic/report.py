@@ -0,0 +1,402 @@
+# backend\logic\report.py
+# Report Engine: Builds the /api/report payload from two grouped passes over the fact source (pickup zone x hour
+# and dropoff zone; a zone report adds seeks for its own hours and destinations), post-aggregated in Python.
+
+import os
+import sys
+import time
+
+try:
+    from backend.logic.aggregators import TripAggregator
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.aggregators import TripAggregator
+
+# Measures of the pickup pass, per (pickup zone, hour) group (TRIP_EXPRESSIONS / ROLLUP_EXPRESSIONS keys)
+PICKUP_MEASURES = [
+    "trips", "fare", "revenue", "distance", "speed", "passengers", "speed_anomalies", "fare_anomalies",
+    "f_speed_sum", "f_speed_count", "speed_count", "distance_count"
+]
+M = {name: i for i, name in enumerate(PICKUP_MEASURES)}
+
+# Per-zone measure order expected by TripAggregator._summary_result
+SUMMARY_MEASURES = [M[n] for n in (
+    "trips", "fare", "revenue", "distance", "speed", "passengers", "speed_anomalies", "fare_anomalies",
+    "f_speed_sum", "f_speed_count"
+)]
+# What a zone report reads for every zone: pickups for the gap ratios, speeds for the borough baseline
+ZONE_SCOPE_MEASURES = ("trips", "speed", "speed_count")
+# Pickup-side rollup rows in primary key order ('+' keeps SQLite off idx_rollups_pickup_side): when every zone's
+# totals are read, walking the table is several times cheaper than a lookup per row from the side index
+ROLLUP_PICKUP_BY_KEY = ["+dropoff_location_id = 0", "pickup_location_id > 0"]
+
+
+def _nulls_first(value):
+    """Sort key matching SQLite's order for NULL and integer/text keys"""
+    return (value is not None, value)
+
+
+class ReportEngine:
+    """
+    Every report section (summary, top zones or destinations, gaps, hourly trend, borough metadata,
+    zone-versus-borough comparison) is derived from the same grouped rows:
+    - pickup pass: PICKUP_MEASURES per (pickup_location_id, hour) over the date range, at most zones x 24 rows
+      (a zone report reads only ZONE_SCOPE_MEASURES for the zones its gaps and borough baseline cover, and its
+      own hours through a zone seek; an unknown borough reads only what the summary's choke points need)
+    - dropoff pass: trips and passengers per dropoff_location_id over the date range (a zone report's gap zones)
+    Both read trip_rollups when they are ready and the covering trips indexes otherwise. The results
+    match TripAggregator._detailed_report_from_parts, which runs 8-12 statements for the same payload.
+    """
+
+    @staticmethod
+    def build(filters):
+        zone_id = filters.get('zone_id')
+        borough = filters.get('borough')
+        dims = TripAggregator.dimensions()
+        zones = dims.zone_info
+        queries = {}
+        if not zone_id and borough and borough != 'all' and not len(dims.borough_ids(borough)):
+            # Unknown borough: every section is empty except the summary's choke points, which count citywide
+            # zones, so only per-zone trips and speeds are read
+            queries["pickup"] = lambda conn: ReportEngine.pickup_pass(
+                conn.cursor(), filters, by_hour=False, measures=("trips", "speed"), by_key=True
+            )
+            return ReportEngine._scope_report(filters, zones, TripAggregator.run_queries(queries)["pickup"], {})
+        if not zone_id:
+            # The passes are independent, so they run side by side on separate pooled connections
+            queries["pickup"] = lambda conn: ReportEngine.pickup_pass(conn.cursor(), filters)
+            queries["dropoff"] = lambda conn: ReportEngine.dropoff_pass(conn.cursor(), filters)
+            results = TripAggregator.run_queries(queries)
+            return ReportEngine._scope_report(filters, zones, results["pickup"], results["dropoff"])
+
+        # A zone report reads its own rows through seeks; beyond that it only needs pickup and dropoff counts of
+        # the zones its gaps can list and pickup speeds of its borough, read as id lists (primary key seeks)
+        zone_info = dims.zone(zone_id)
+        b_name = zone_info[1] if zone_info else borough
+        every_zone = not borough or borough == 'all' # The gaps then cover the whole city
+        gap_ids = dims.borough_ids('all' if every_zone else borough)
+        baseline_ids = dims.borough_zone_ids.get(b_name, gap_ids[:0])
+        scope_list = ReportEngine._id_list(gap_ids, baseline_ids)
+        gap_list = ReportEngine._id_list(gap_ids)
+        queries["zone"] = lambda conn: ReportEngine.pickup_pass(conn.cursor(), filters, zone_id=zone_id)
+        queries["destinations"] = lambda conn: ReportEngine.destinations(conn.cursor(), filters, zone_id)
+        if scope_list:
+            queries["pickup"] = lambda conn: ReportEngine.pickup_pass(
+                conn.cursor(), filters, by_hour=False, measures=ZONE_SCOPE_MEASURES,
+                locations=ReportEngine._seek_list(conn.cursor(), scope_list, every_zone, filters)
+            )
+        if gap_list:
+            queries["dropoff"] = lambda conn: ReportEngine.dropoff_pass(
+                conn.cursor(), filters, locations=ReportEngine._seek_list(conn.cursor(), gap_list, every_zone, filters)
+            )
+        results = TripAggregator.run_queries(queries)
+        return ReportEngine._zone_report(
+            filters, zones, results.get("pickup", []), results["zone"], results.get("dropoff", {}),
+            results["destinations"]
+        )
+
+    @staticmethod
+    def _id_list(*id_arrays):
+        """Union of location id arrays as a SQL literal for `column IN (...)`, or None when it is empty"""
+        ids = sorted(set().union(*(a.tolist() for a in id_arrays)))
+        return f"({', '.join(map(str, ids))})" if ids else None
+
+    @staticmethod
+    def _seek_list(cur, id_list, every_zone, filters):
+        """
+        id_list where it pays to read zone by zone: on the rollups (key seeks instead of a lookup per row from the
+        side index) and when it narrows the read or a date range bounds each seek of the (zone, time) trips
+        indexes; for every zone and every date one covering-index scan of trips beats a seek per zone
+        """
+        narrows = not every_zone or TripAggregator.time_clauses(filters)[0]
+        return id_list if narrows or TripAggregator.rollups_ready(cur) else None
+
+    @staticmethod
+    def pickup_pass(cur, filters, zone_id=None, by_hour=True, measures=PICKUP_MEASURES, locations=None, by_key=False):
+        """
+        [(pickup_location_id, hour, *PICKUP_MEASURES)] over the date range, for every zone, one zone_id or
+        the zones of a `locations` IN literal (by_key: read rollups in ROLLUP_PICKUP_BY_KEY order).
+        Measures not asked for (and the hour, when not by_hour) are NULL, so row positions never change.
+        """
+        table, e, where_clauses = TripAggregator.fact_source(cur, "pickup")
+        if by_key and table == "trip_rollups":
+            where_clauses = list(ROLLUP_PICKUP_BY_KEY)
+        time_where, params = TripAggregator.time_clauses(filters)
+        where_clauses += time_where
+        if zone_id:
+            where_clauses.append("pickup_location_id = ?")
+            params.append(zone_id)
+        elif locations:
+            where_clauses.append(f"pickup_location_id IN {locations}")
+        cur.execute(f"""
+            SELECT pickup_location_id, {e['hour'] if by_hour else 'NULL'} as hour,
+                {', '.join(e[m] if m in measures else 'NULL' for m in PICKUP_MEASURES)}
+            FROM {table}
+            {f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""}
+            GROUP BY 1, 2
+        """, params)
+        return cur.fetchall()
+
+    @staticmethod
+    def dropoff_pass(cur, filters, locations=None):
+        """{dropoff_location_id: (trips, passengers)} over the date range, for every zone or a `locations` IN literal"""
+        table, e, where_clauses = TripAggregator.fact_source(cur, "dropoff")
+        time_where, params = TripAggregator.time_clauses(filters)
+        where_clauses += time_where
+        if locations:
+            where_clauses.append(f"dropoff_location_id IN {locations}")
+        cur.execute(f"""
+            SELECT dropoff_location_id, {e['trips']}, {e['passengers']}
+            FROM {table}
+            {f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""}
+            GROUP BY 1
+        """, params)
+        return {r[0]: (r[1] or 0, r[2] or 0) for r in cur.fetchall()}
+
+    @staticmethod
+    def destinations(cur, filters, zone_id):
+        """
+        {dropoff_location_id: (trips, speed_sum, speed_count)} for trips starting in zone_id.
+        Rollups only keep per-side totals, so this always seeks the (pickup zone, time) trips index.
+        """
+        time_where, params = TripAggregator.time_clauses(filters)
+        cur.execute(f"""
+            SELECT dropoff_location_id, COUNT(*), SUM(speed_mph), COUNT(speed_mph)
+            FROM trips
+            WHERE {' AND '.join(['pickup_location_id = ?'] + time_where)}
+            GROUP BY 1
+        """, [zone_id] + params)
+        return {r[0]: (r[1], r[2] or 0, r[3]) for r in cur.fetchall()}
+
+    # --- Post-aggregation ---
+
+    @staticmethod
+    def _by_zone(pickup_rows):
+        """{pickup_location_id: PICKUP_MEASURES summed over hours} (NULL sums count as 0)"""
+        totals = {}
+        for r in pickup_rows:
+            t = totals.get(r[0])
+            if t is None:
+                t = totals[r[0]] = [0] * len(PICKUP_MEASURES)
+            for i, value in enumerate(r[2:]):
+                if value:
+                    t[i] += value
+        return totals
+
+    @staticmethod
+    def _global_summary(by_zone, zones, selected_borough):
+        """get_global_summary() ({"summary", "congestion"}) from per-zone totals"""
+        rows = [
+            (loc, *(t[i] for i in SUMMARY_MEASURES))
+            for loc, t in sorted(by_zone.items(), key=lambda x: _nulls_first(x[0]))
+        ]
+        loc_to_borough = {loc: z[1] for loc, z in zones.items()}
+        return TripAggregator._summary_result(rows, loc_to_borough, selected_borough)
+
+    @staticmethod
+    def _summary(by_zone, zones, selected_borough):
+        """get_global_summary()['summary'] from per-zone totals"""
+        return ReportEngine._global_summary(by_zone, zones, selected_borough)['summary']
+
+    @staticmethod
+    def _hourly(pickup_rows, keep=None):
+        """get_hourly_stats() for the pickup zones passing keep (all when None)"""
+        hours = {}
+        for r in pickup_rows:
+            if keep is None or keep(r[0]):
+                h = hours.setdefault(r[1], [0, 0, 0])
+                h[0] += r[2 + M["trips"]] or 0
+                h[1] += r[2 + M["speed"]] or 0
+                h[2] += r[2 + M["speed_count"]] or 0
+        return TripAggregator._hourly_result([
+            (hour, trips, speed / count if count else None)
+            for hour, (trips, speed, count) in sorted(hours.items(), key=lambda x: _nulls_first(x[0]))
+        ])
+
+    @staticmethod
+    def _avg(by_zone, locs, measure, count):
+        total = sum(by_zone[loc][M[measure]] for loc in locs)
+        n = sum(by_zone[loc][M[count]] for loc in locs)
+        return total / n if n else None
+
+    @staticmethod
+    def _ranked_groups(counts, zones, key, limit):
+        """
+        Sums {location_id: (trips, speed_sum, speed_count)} by key(zone, borough) over known zones and
+        ranks the groups by trips, then key: [(key, trips, avg_speed)]
+        """
+        groups = {}
+        for loc, (trips, speed, speed_count) in counts.items():
+            if loc in zones:
+                g = groups.setdefault(key(*zones[loc]), [0, 0, 0])
+                g[0] += trips
+                g[1] += speed
+                g[2] += speed_count
+        ranked = sorted(groups.items(), key=lambda x: (-x[1][0], tuple(map(_nulls_first, x[0]))))[:limit]
+        return [(k, g[0], g[1] / g[2] if g[2] else 0) for k, g in ranked]
+
+    @staticmethod
+    def _gaps(by_zone, dropoff, zones, borough=None, limit=None):
+        """get_coverage_gaps() rows (zone, borough, dropoffs, pickups, location_id), dropoff/pickup ratio > 2"""
+        gaps = []
+        for loc, (dropoffs, _) in dropoff.items():
+            pickups = by_zone[loc][M["trips"]] if loc in by_zone else 0
+            if loc in zones and pickups and dropoffs * 1.0 / pickups > 2.0:
+                if not borough or zones[loc][1] == borough:
+                    gaps.append((zones[loc][0], zones[loc][1], dropoffs, pickups, loc))
+        gaps.sort(key=lambda g: (-(g[2] * 1.0 / g[3]), g[4]))
+        return gaps[:limit] if limit else gaps
+
+    @staticmethod
+    def _scope_report(filters, zones, pickup_rows, dropoff):
+        """Citywide / borough report"""
+        borough = filters.get('borough')
+        scoped = borough and borough != 'all'
+        by_zone = ReportEngine._by_zone(pickup_rows)
+        in_borough = lambda loc: loc in zones and zones[loc][1] == borough
+
+        summary = ReportEngine._summary(by_zone, zones, borough if borough != 'all' else None)
+        pickup_counts = {
+            loc: (t[M["trips"]], t[M["speed"]], t[M["speed_count"]])
+            for loc, t in by_zone.items() if not scoped or in_borough(loc)
+        }
+        top_zones = [
+            {"zone": k[0], "borough": k[1], "trips": trips, "speed": round(speed, 1)}
+            for k, trips, speed in ReportEngine._ranked_groups(pickup_counts, zones, lambda z, b: (z, b), 5)
+        ]
+        gaps = TripAggregator._gaps_result(
+            ReportEngine._gaps(by_zone, dropoff, zones, borough if scoped else None, limit=5)
+        )
+        hourly_stats = ReportEngine._hourly(pickup_rows, in_borough if scoped else None)
+
+        b_stats = ReportEngine._borough_stats(by_zone, dropoff, zones, borough) if scoped else None
+        return TripAggregator._report_result(filters, summary, top_zones, gaps, hourly_stats, b_stats)
+
+    @staticmethod
+    def _borough_stats(by_zone, dropoff, zones, borough):
+        """get_borough_stats() from per-zone totals; borough 'all' is citywide, zones outside taxi_zones included"""
+        citywide = borough == "all"
+        in_borough = lambda loc: citywide or (loc in zones and zones[loc][1] == borough)
+        locs = [loc for loc in by_zone if in_borough(loc)]
+        main_stats = (
+            sum(by_zone[loc][M["trips"]] for loc in locs),
+            ReportEngine._avg(by_zone, locs, "speed", "speed_count"),
+            ReportEngine._avg(by_zone, locs, "distance", "distance_count"),
+            sum(by_zone[loc][M["passengers"]] for loc in locs)
+        )
+        dropoff_passengers = sum(p for loc, (_, p) in dropoff.items() if in_borough(loc))
+        pickup_counts = {
+            loc: (by_zone[loc][M["trips"]], by_zone[loc][M["speed"]], by_zone[loc][M["speed_count"]]) for loc in locs
+        }
+        top_3 = [
+            {"zone": k[0], "trips": trips}
+            for k, trips, _ in ReportEngine._ranked_groups(pickup_counts, zones, lambda z, b: (z,), 3)
+        ]
+        underserved = [
+            {"zone": g[0], "id": g[4]}
+            for g in ReportEngine._gaps(by_zone, dropoff, zones, None if citywide else borough)
+        ]
+        zone_count = len(zones) if citywide else sum(1 for z in zones.values() if z[1] == borough)
+        return TripAggregator._borough_result(borough, main_stats, dropoff_passengers, top_3, underserved, zone_count)
+
+    @staticmethod
+    def _zone_report(filters, zones, pickup_rows, zone_rows, dropoff, destinations):
+        """Single pickup zone report, compared against its borough"""
+        borough = filters.get('borough')
+        zone_id = filters['zone_id']
+        try:
+            zone_key = int(zone_id)
+        except (TypeError, ValueError):
+            zone_key = zone_id # Matches no zone, as in SQL
+        zone_name, b_name = zones.get(zone_key) or ("Unknown Zone", borough)
+        by_zone = ReportEngine._by_zone(pickup_rows)
+        zone_totals = ReportEngine._by_zone(zone_rows)
+
+        summary = ReportEngine._summary(zone_totals, zones, borough if borough != 'all' else None)
+        top_zones = [
+            {"zone": k[0], "borough": k[1], "trips": trips, "speed": round(speed, 1)}
+            for k, trips, speed in ReportEngine._ranked_groups(destinations, zones, lambda z, b: (z, b), 5)
+        ]
+        zone_avg_speed = ReportEngine._avg(zone_totals, list(zone_totals), "speed", "speed_count")
+        borough_locs = [loc for loc in by_zone if b_name is not None and loc in zones and zones[loc][1] == b_name]
+        borough_baseline = ReportEngine._avg(by_zone, borough_locs, "speed", "speed_count")
+        gaps = TripAggregator._gaps_result(
+            ReportEngine._gaps(by_zone, dropoff, zones, borough if borough != 'all' else None, limit=5)
+        )
+        hourly_stats = ReportEngine._hourly(zone_rows)
+
+        return TripAggregator._zone_report_result(
+            filters, zone_name, b_name, zone_avg_speed or 0, borough_baseline or 0,
+            summary, top_zones, gaps, hourly_stats
+        )
+
+if __name__ == "__main__":
+    # Parity + latency check: the single-pass engine against the report assembled from the other aggregators
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Compare ReportEngine with the per-section report")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per filter set and engine")
+    args = parser.parse_args()
+
+    conn = TripAggregator.connect()
+    rollups = TripAggregator.rollups_ready(conn.cursor())
+    zone_ids = [r[0] for r in conn.execute(
+        "SELECT pickup_location_id FROM trips GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 2"
+    )]
+    conn.close()
+    print(f"Fact source: {'trip_rollups' if rollups else 'trips'}")
+
+    filter_sets = [
+        {"borough": "all"},
+        {"borough": "all", "start_date": "2019-01-05", "end_date": "2019-01-12"},
+        {"borough": "Manhattan", "start_date": "2019-01-10"},
+        {"borough": "Queens", "end_date": "2019-01-09"},
+        {"borough": "Brooklyn", "start_date": "2019-01-02", "end_date": "2019-01-20"},
+        {"borough": "Nowhere"},
+    ] + [
+        {"borough": "all", "zone_id": str(z), "start_date": "2019-01-02", "end_date": "2019-01-09"} for z in zone_ids
+    ] + [
+        {"borough": "Queens", "zone_id": str(zone_ids[0]), "start_date": "2019-01-05"},
+        {"borough": "all", "zone_id": "999"},
+        {"borough": "Nowhere", "zone_id": "999"},
+    ]
+
+    def timed(build, filters):
+        """(result, median seconds, statements per call)"""
+        statements = []
+        conn = TripAggregator.connect()  # Held so nested checkouts share it and the trace sees every statement
+        conn.set_trace_callback(statements.append)
+        try:
+            result = build(dict(filters))
+        finally:
+            conn.set_trace_callback(None)
+            conn.close()
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            build(dict(filters))
+            samples.append(time.perf_counter() - start)
+        return result, statistics.median(samples), len(statements)
+
+    failures, totals = 0, {"parts": 0.0, "engine": 0.0}
+    for filters in filter_sets:
+        old, old_s, old_n = timed(TripAggregator._detailed_report_from_parts, filters)
+        new, new_s, new_n = timed(ReportEngine.build, filters)
+        totals["parts"] += old_s
+        totals["engine"] += new_s
+        old["metadata"].pop("generatedAt")
+        new["metadata"].pop("generatedAt")
+        match = old == new
+        failures += not match
+        print(f"{'ok  ' if match else 'DIFF'} {filters}: {old_n} statements {old_s * 1000:.1f} ms -> "
+              f"{new_n} statements {new_s * 1000:.1f} ms")
+        if not match:
+            for key in old:
+                if old[key] != new[key]:
+                    print(f"    {key}: {old[key]!r}\n    {' ' * len(key)}  {new[key]!r}")
+
+    print(f"{len(filter_sets) - failures}/{len(filter_sets)} reports match; median total "
+          f"{totals['parts'] * 1000:.0f} ms -> {totals['engine'] * 1000:.0f} ms "
+          f"({totals['parts'] / max(totals['engine'], 1e-9):.1f}x)")
+    sys.exit(1 if failures else 0)
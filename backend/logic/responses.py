@@ -0,0 +1,205 @@
+# backend\logic\responses.py
+# HTTP Responses: ETags for the API's cached results (data version + endpoint + canonical filters), If-None-Match
+# checks, and gzip/deflate bodies negotiated from Accept-Encoding. Shared by run.py and asgi.py; the encoded and
+# compressed bytes of hot responses are kept, so a repeated view costs neither a JSON dump nor a compression.
+
+import os
+import sys
+import gzip
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    from backend.logic.cache import ResultCache
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.cache import ResultCache
+
+# Cache-Control per endpoint class. Aggregates only change when the ETL commits, so browsers and proxies may reuse
+# them briefly and revalidate with the ETag after that. The report is stamped with its generation time, so it is
+# always revalidated, map geometry changes only when the zones are reloaded, and exports are never stored.
+CACHE_CONTROL = {
+    "panels": "public, max-age=15, must-revalidate",
+    "report": "private, no-cache",
+    "map": "public, max-age=3600, must-revalidate",
+    "export": "no-store",
+    "auth": "no-store",
+    "health": "no-store",
+}
+# Bodies below this many bytes go out uncompressed (the headers would cost more than they save)
+MIN_COMPRESS_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN', 1024))
+COMPRESS_LEVEL = 6
+ENCODERS = {
+    "gzip": lambda body: gzip.compress(body, COMPRESS_LEVEL, mtime=0),
+    "deflate": lambda body: zlib.compress(body, COMPRESS_LEVEL), # HTTP "deflate" is the zlib format
+}
+
+
+def encode_json(data):
+    """Response body bytes: compact JSON with sorted keys, as Flask's jsonify writes it outside debug mode"""
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def negotiate(accept_encoding):
+    """Preferred content coding the client accepts: 'gzip', 'deflate' or None (identity)"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    best = None
+    for coding in ENCODERS:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+def response_headers(etag, cache_control, coding=None):
+    """ETag, Cache-Control and Vary of a cached response (a 304 sends the same ones, without a coding)"""
+    headers = {"ETag": f'W/"{etag}"', "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if coding:
+        headers["Content-Encoding"] = coding
+    return headers
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match with weak comparison: '*' or any listed tag equal to etag, W/ prefixes ignored"""
+    tags = [t.strip() for t in (if_none_match or '').split(',') if t.strip()]
+    return '*' in tags or any(t.removeprefix('W/').strip('"') == etag for t in tags)
+
+
+class EncodedResponse:
+    """One response body: its identity bytes and, made on first request, its compressed forms"""
+
+    __slots__ = ("etag", "body", "variants")
+
+    def __init__(self, etag, body):
+        self.etag = etag
+        self.body = body
+        self.variants = {}
+
+    def size(self):
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def encoded(self, accept_encoding):
+        """(bytes, content coding or None) for a request's Accept-Encoding"""
+        coding = negotiate(accept_encoding) if len(self.body) >= MIN_COMPRESS_BYTES else None
+        if coding is None:
+            return self.body, None
+        variant = self.variants.get(coding)
+        if variant is None:
+            variant = self.variants[coding] = ENCODERS[coding](self.body)
+        return variant, coding
+
+
+class ResponseCache:
+    """
+    Bounded LRU of EncodedResponses keyed by ETag. The ETag is a digest of the data version, the endpoint
+    and its canonical filters as ResultCache keys them, so it is known before the result is computed: a matching
+    If-None-Match is answered 304 without touching the result cache, and a hit here skips JSON encoding
+    and compression. A new data version changes every tag, so stale entries simply age out.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # etag -> EncodedResponse
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    @staticmethod
+    def etag(version, name, filters=None, *args):
+        key = repr((version, name, args, ResultCache.canonical_filters(filters)))
+        return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(etag)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, etag, data):
+        """Encodes data as the body for etag and keeps it; returns the EncodedResponse"""
+        entry = EncodedResponse(etag, encode_json(data))
+        with self._lock:
+            previous = self._entries.pop(etag, None)
+            if previous is not None:
+                self._bytes -= previous.size()
+            self._entries[etag] = entry
+            self._bytes += entry.size()
+            self._evict()
+        return entry
+
+    def encoded(self, entry, accept_encoding):
+        """entry.encoded(), counting a newly compressed variant against the byte budget"""
+        before = len(entry.variants)
+        body, coding = entry.encoded(accept_encoding)
+        if len(entry.variants) != before:
+            with self._lock:
+                if self._entries.get(entry.etag) is entry:
+                    self._bytes += len(body)
+                    self._evict()
+        return body, coding
+
+    def conditional(self, etag, produce, cache_control, if_none_match=None, accept_encoding=None, missing=None):
+        """
+        (status, body, headers) for the data produce() returns under etag: 304 when If-None-Match holds
+        the tag, else the kept (or newly encoded) body in the best coding Accept-Encoding allows.
+        missing: error message for a 404 when produce() returns None (not kept)
+        """
+        if etag_matches(if_none_match, etag):
+            with self._lock:
+                self._stats["not_modified"] += 1
+            return 304, b'', response_headers(etag, cache_control)
+        entry = self.get(etag)
+        if entry is None:
+            data = produce()
+            if data is None and missing is not None:
+                return 404, encode_json({"error": missing}), {}
+            entry = self.put(etag, data)
+        body, coding = self.encoded(entry, accept_encoding)
+        return 200, body, response_headers(etag, cache_control, coding)
+
+    def respond(self, result_cache, name, filters, compute, *args, part=None, **conditional):
+        """
+        conditional() for result_cache.get_or_compute(name, filters, compute, *args), or its `part` key.
+        The tag is taken before computing, so a result that lands after an ETL commit is tagged with the
+        older version and revalidates as changed on the next request.
+        """
+        etag = self.etag(result_cache.current_version(), name, filters, part, *args)
+
+        def produce():
+            data = result_cache.get_or_compute(name, filters, compute, *args)
+            return data if part is None else data[part]
+        return self.conditional(etag, produce, **conditional)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size()
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,139 @@
+# backend\logic\sketches.py
+# Quantile Sketches: Mergeable log-bucket sketches of speed, fare and duration, kept by the ETL per (pickup zone, day)
+# in trip_sketches and merged at query time, so percentiles need neither a sort nor a read of the trips table.
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Every reported quantile is within RELATIVE_ACCURACY of a value of the requested rank (DDSketch-style buckets:
+# bucket k holds (MIN_VALUE * GAMMA^(k-1), MIN_VALUE * GAMMA^k]). Counts add and subtract exactly, so a chunk is
+# folded into a stored sketch and taken out again like the rollup sums.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = np.log(GAMMA)
+# Values at or below MIN_VALUE (the cleaner keeps zero speeds, fares and durations) share bucket 0 and read back
+# as 0; values above MAX_VALUE are counted in the last bucket
+MIN_VALUE = 0.01
+MAX_VALUE = 1e6
+BUCKETS = int(np.ceil(np.log(MAX_VALUE / MIN_VALUE) / LOG_GAMMA)) + 1
+
+# Sketched measure -> trips column (trip_sketches.measure holds the key)
+SKETCH_MEASURES = {
+    "speed": "speed_mph",
+    "fare": "fare_amount",
+    "duration": "trip_duration_seconds",
+}
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """Dense bucket-count arrays (length BUCKETS) and their stored form: int32 (bucket, count) pairs"""
+
+    @staticmethod
+    def bucket_index(values):
+        """Bucket of each value (float array without NaNs)"""
+        values = np.asarray(values, dtype=np.float64)
+        index = np.zeros(len(values), dtype=np.int64)
+        above = values > MIN_VALUE
+        index[above] = np.minimum(np.ceil(np.log(values[above] / MIN_VALUE) / LOG_GAMMA), BUCKETS - 1)
+        return index
+
+    @staticmethod
+    def from_values(values):
+        """Dense counts of the non-NaN values"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return np.bincount(QuantileSketch.bucket_index(values), minlength=BUCKETS).astype(np.int64)
+
+    @staticmethod
+    def grouped(groups, values):
+        """Yields (group, dense counts) for every group with values; groups are integer labels, one per value"""
+        keep = ~np.isnan(values)
+        keys = np.asarray(groups)[keep].astype(np.int64) * BUCKETS + QuantileSketch.bucket_index(values[keep])
+        keys, counts = np.unique(keys, return_counts=True)
+        owners = keys // BUCKETS
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(keys)]):
+            dense = np.zeros(BUCKETS, dtype=np.int64)
+            dense[keys[start:end] % BUCKETS] = counts[start:end]
+            yield int(owners[start]), dense
+
+    @staticmethod
+    def encode(counts):
+        """Dense counts -> blob of little-endian int32 (bucket, count) pairs for the non-empty buckets"""
+        buckets = np.flatnonzero(counts)
+        return np.column_stack((buckets, counts[buckets])).astype('<i4').tobytes()
+
+    @staticmethod
+    def decode(blob):
+        """Blob from encode() (or None) -> dense counts"""
+        counts = np.zeros(BUCKETS, dtype=np.int64)
+        if blob:
+            pairs = np.frombuffer(blob, dtype='<i4').reshape(-1, 2)
+            counts[pairs[:, 0]] = pairs[:, 1]
+        return counts
+
+    @staticmethod
+    def merge(blobs):
+        """Dense counts of the union of any number of stored sketches (one bincount over all their pairs)"""
+        pairs = [np.frombuffer(blob, dtype='<i4').reshape(-1, 2) for blob in blobs if blob]
+        if not pairs:
+            return np.zeros(BUCKETS, dtype=np.int64)
+        pairs = np.concatenate(pairs)
+        return np.bincount(pairs[:, 0], weights=pairs[:, 1], minlength=BUCKETS).astype(np.int64)
+
+    @staticmethod
+    def bucket_value(index):
+        """Value reported for a bucket: the point with equal relative error to both of its ends"""
+        index = np.asarray(index, dtype=np.float64)
+        return np.where(index > 0, MIN_VALUE * GAMMA ** index * 2 / (GAMMA + 1), 0.0)
+
+    @staticmethod
+    def quantiles(counts, qs=QUANTILES):
+        """Values at ranks q * (n - 1) of the sketched distribution, or Nones when it is empty"""
+        total = int(counts.sum())
+        if not total:
+            return [None] * len(qs)
+        cumulative = np.cumsum(counts)
+        index = np.searchsorted(cumulative, [q * (total - 1) for q in qs], side='right')
+        return QuantileSketch.bucket_value(index).tolist()
+
+
+if __name__ == "__main__":
+    # Sketch vs exact percentiles (np.quantile over the trips rows) for the dashboard's filter shapes
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logic.aggregators import TripAggregator
+
+    parser = argparse.ArgumentParser(description="Compare sketch percentiles with exact ones on the current database")
+    parser.add_argument('--zone', type=int, default=161, help="Zone id for the single-zone check")
+    args = parser.parse_args()
+
+    checks = {
+        "all": {"borough": "all"},
+        "week": {"borough": "all", "start_date": "2019-01-07", "end_date": "2019-01-13"},
+        "Manhattan": {"borough": "Manhattan"},
+        f"zone {args.zone}": {"borough": "all", "zone_id": args.zone},
+    }
+    worst = 0.0
+    for label, filters in checks.items():
+        start = time.perf_counter()
+        result = TripAggregator.get_quantiles(filters)
+        sketch_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        exact = TripAggregator.get_quantiles(filters, exact=True)
+        exact_ms = (time.perf_counter() - start) * 1000
+
+        errors = []
+        for measure in SKETCH_MEASURES:
+            for key, value in exact[measure].items():
+                if key.startswith('p') and value:
+                    errors.append(abs(result[measure][key] - value) / value)
+        error = max(errors, default=0.0)
+        worst = max(worst, error)
+        print(f"{label:<12} {result['source']:<8} {sketch_ms:8.1f} ms | exact sort {exact_ms:8.1f} ms | "
+              f"max relative error {error:.2%}")
+    print(f"Worst relative error {worst:.2%} (bound {RELATIVE_ACCURACY:.0%} plus rank rounding)")
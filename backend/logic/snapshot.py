@@ -0,0 +1,162 @@
+# backend\logic\snapshot.py
+# Columnar Trip Snapshot: Exports the trips fact columns as one .npy file per column (sorted by pickup time)
+# plus a JSON manifest with dtypes, row counts and a per-day row-offset index, for np.memmap readers.
+
+import os
+import glob
+import json
+import time
+import datetime
+import sqlite3
+import numpy as np
+
+# pickup_time_id for trips without one (sorts first, never inside a date range)
+NULL_TIME = int(np.iinfo(np.int32).min)
+
+# (array name, trips column, dtype, multiplier, value stored for NULL)
+# Money and distance are kept as integer cents so sums are exact; speed/duration keep NULL as NaN.
+SNAPSHOT_COLUMNS = [
+    ("pickup_time_id", "pickup_time_id", "int32", 1, NULL_TIME),
+    ("pickup_location_id", "pickup_location_id", "int16", 1, 0),
+    ("dropoff_location_id", "dropoff_location_id", "int16", 1, 0),
+    ("fare_cents", "fare_amount", "int32", 100, 0),
+    ("total_cents", "total_amount", "int32", 100, 0),
+    ("distance_cents", "trip_distance", "int32", 100, 0),
+    ("speed_mph", "speed_mph", "float64", 1, None),
+    ("passenger_count", "passenger_count", "int8", 1, 0),
+    ("trip_duration_seconds", "trip_duration_seconds", "float32", 1, None),
+]
+
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_VERSION = 1
+
+
+class TripSnapshot:
+    """Writes and opens the memory-mappable trips snapshot"""
+
+    @staticmethod
+    def default_dir(db_path):
+        """Snapshots live next to the database they were exported from"""
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'trips_snapshot')
+
+    @staticmethod
+    def data_signature(conn):
+        """Cheap change detector: highest trip_id plus rows recorded by the ingestion manifest"""
+        max_id = conn.execute("SELECT MAX(trip_id) FROM trips").fetchone()[0]
+        try:
+            loaded = conn.execute("SELECT COALESCE(SUM(rows_loaded), 0) FROM ingestion_manifest").fetchone()[0]
+        except sqlite3.OperationalError:
+            loaded = None
+        return max_id, loaded
+
+    @staticmethod
+    def read_columns(conn, batch_size=200000):
+        """Reads SNAPSHOT_COLUMNS from trips into typed arrays, stably sorted by pickup_time_id"""
+        cur = conn.execute(f"SELECT {', '.join(c[1] for c in SNAPSHOT_COLUMNS)} FROM trips")
+        parts = {name: [] for name, *_ in SNAPSHOT_COLUMNS}
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            raw = np.array(rows, dtype=np.float64).reshape(-1, len(SNAPSHOT_COLUMNS)) # NULL -> NaN
+            for i, (name, _, dtype, scale, null) in enumerate(SNAPSHOT_COLUMNS):
+                values = raw[:, i] * scale if scale != 1 else raw[:, i]
+                if null is not None:
+                    values = np.rint(np.nan_to_num(values, nan=null))
+                parts[name].append(values.astype(dtype))
+
+        columns = {
+            name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+            for name, _, dtype, _, _ in SNAPSHOT_COLUMNS
+        }
+        order = np.argsort(columns["pickup_time_id"], kind='stable')
+        return {name: values[order] for name, values in columns.items()}
+
+    @staticmethod
+    def day_index(pickup_time_id):
+        """
+        Per-day row offsets for a time-sorted key array: (first_day, offsets) where the rows of
+        day first_day + k are offsets[k]:offsets[k + 1]. Days are counted from 1970-01-01.
+        """
+        valid = pickup_time_id[np.searchsorted(pickup_time_id, NULL_TIME, side='right'):]
+        if not len(valid):
+            return 0, np.full(1, len(pickup_time_id), dtype=np.int64)
+        first_day, last_day = int(valid[0]) // 24, int(valid[-1]) // 24
+        bounds = np.arange(first_day, last_day + 2, dtype=np.int64) * 24
+        return first_day, np.searchsorted(pickup_time_id, bounds, side='left').astype(np.int64)
+
+    @staticmethod
+    def write(db_path, directory=None):
+        """
+        Exports the snapshot. Column files carry a generation suffix and the manifest is replaced
+        atomically last, so processes that already mapped the previous generation keep working.
+        Returns the manifest.
+        """
+        directory = directory or TripSnapshot.default_dir(db_path)
+        os.makedirs(directory, exist_ok=True)
+        start = time.perf_counter()
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            signature = TripSnapshot.data_signature(conn)
+            columns = TripSnapshot.read_columns(conn)
+        finally:
+            conn.close()
+
+        generation = time.strftime('%Y%m%d%H%M%S') + f"-{os.getpid()}"
+        files = {}
+        for name, _, dtype, _, null in SNAPSHOT_COLUMNS:
+            files[name] = f"{name}.{generation}.npy"
+            np.save(os.path.join(directory, files[name]), columns[name])
+
+        first_day, offsets = TripSnapshot.day_index(columns["pickup_time_id"])
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "generation": generation,
+            "created_at": datetime.datetime.now().isoformat(timespec='seconds'),
+            "rows": int(len(columns["pickup_time_id"])),
+            "signature": list(signature),
+            "sorted_by": "pickup_time_id",
+            "columns": {
+                name: {"file": files[name], "dtype": dtype, "null": null}
+                for name, _, dtype, _, null in SNAPSHOT_COLUMNS
+            },
+            "days": {
+                "first_day": first_day,
+                "first_date": (datetime.date(1970, 1, 1) + datetime.timedelta(days=first_day)).isoformat(),
+                "row_offsets": offsets.tolist()
+            }
+        }
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        # Older generations are no longer referenced (open maps survive the unlink)
+        current = set(files.values())
+        for path in glob.glob(os.path.join(directory, "*.npy")):
+            if os.path.basename(path) not in current:
+                os.remove(path)
+
+        manifest["seconds"] = round(time.perf_counter() - start, 3)
+        return manifest
+
+    @staticmethod
+    def load(directory):
+        """(manifest, {name: read-only np.memmap}) or (None, None) when there is no usable snapshot"""
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None, None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            return None, None
+        columns = {}
+        for name, spec in manifest["columns"].items():
+            try:
+                columns[name] = np.load(os.path.join(directory, spec["file"]), mmap_mode='r')
+            except OSError:
+                return None, None # Generation replaced while we were opening it
+            if columns[name].dtype != np.dtype(spec["dtype"]) or len(columns[name]) != manifest["rows"]:
+                return None, None
+        return manifest, columns
@@ -1,11 +1,12 @@
 # backend\run.py
 # Main Backend Server: Flask application that defines all API endpoints for dashboard data, authentication, and health checks.
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 import json
+import gzip
 import sqlite3
 import logging
 
@@ -29,7 +30,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.security.validator import RequestValidator
 from backend.logic.aggregators import TripAggregator
+from backend.logic.cache import ResultCache
+from backend.logic.dimensions import DimensionCache
+from backend.logic.responses import CACHE_CONTROL, ResponseCache, etag_matches
 from backend.security.auth_logic import AuthLogic
+from backend.dal.connection import DB_PATH, get_connection_pool
+from backend.dal.executor import get_query_executor
+from backend.etl.processing.zone_simplifier import ZONE_DETAIL_LEVELS
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for frontend integration
@@ -52,15 +59,44 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'nyc-taxi-secret-key')
 tokens = {} # In-memory token storage (resets on restart)
 
 def get_db_path():
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'taxi_data.db')
+    return DB_PATH
+
+# Result cache for every aggregator-backed endpoint; emptied whenever the ETL commits new data
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 512)),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MB', 32)) * 1024 * 1024,
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 300)),
+    version=TripAggregator.data_version
+)
+
+# Encoded and compressed bodies of recent responses, by ETag
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MB', 16)) * 1024 * 1024
+)
 
-# Performance Cache
-import time
-summary_cache = {
-    "data": None,
-    "timestamp": 0,
-    "filters": None
-}
+def cached_response(endpoint_class, name, filters, compute, *args, part=None, missing=None):
+    """
+    JSON response for a result_cache entry (or its `part` key) with a weak ETag from the data version and the
+    canonical filters: If-None-Match on it gets a 304 before anything is computed, and the body goes out
+    gzip/deflate-compressed per Accept-Encoding with the endpoint class's Cache-Control.
+    """
+    status, body, headers = response_cache.respond(
+        result_cache, name, filters, compute, *args, part=part, missing=missing,
+        cache_control=CACHE_CONTROL[endpoint_class],
+        if_none_match=request.headers.get('If-None-Match'),
+        accept_encoding=request.headers.get('Accept-Encoding')
+    )
+    return app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+def date_error():
+    """400 response for a malformed start_date/end_date (the aggregators turn them into time keys), else None"""
+    valid, message = RequestValidator.validate_date_params(request.args)
+    return None if valid else (jsonify({"error": message}), 400)
+
+def approx_requested():
+    """?approx=true answers from the stratified trip sample, with confidence intervals (exact by default)"""
+    return request.args.get('approx', '').lower() in ('1', 'true', 'yes')
 
 @app.route('/api/auth/signup', methods=['POST'])
 def signup():
@@ -74,11 +110,8 @@ def signup():
     hashed_password = AuthLogic.hash_password(password)
     
     try:
-        conn = sqlite3.connect(get_db_path(), timeout=30)
-        cur = conn.cursor()
-        cur.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (email, hashed_password))
-        conn.commit()
-        conn.close()
+        with get_connection_pool().writer() as conn:
+            conn.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (email, hashed_password))
         return jsonify({"message": "User created successfully"}), 201
     except sqlite3.IntegrityError:
         return jsonify({"error": "User already exists"}), 409
@@ -92,16 +125,13 @@ def login():
     password = data.get('password')
 
     try:
-        conn = sqlite3.connect(get_db_path(), timeout=30)
-        cur = conn.cursor()
-        cur.execute("SELECT password_hash FROM users WHERE email = ?", (email,))
-        row = cur.fetchone()
-        conn.close()
+        with get_connection_pool().connect() as conn:
+            row = conn.execute("SELECT password_hash FROM users WHERE email = ?", (email,)).fetchone()
 
         if row and AuthLogic.verify_password(password, row[0]):
             token = AuthLogic.generate_token()
             tokens[token] = email # Store session
-            return jsonify({"token": token, "email": email}), 200
+            return jsonify({"token": token, "email": email}), 200, {"Cache-Control": CACHE_CONTROL["auth"]}
         else:
             return jsonify({"error": "Invalid credentials"}), 401
     except Exception as e:
@@ -109,7 +139,14 @@ def login():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "service": "NYC Taxi API"})
+    return jsonify({
+        "status": "healthy",
+        "service": "NYC Taxi API",
+        "db_pool": get_connection_pool().stats(),
+        "query_executor": get_query_executor().stats(),
+        "result_cache": result_cache.stats(),
+        "response_cache": response_cache.stats()
+    }), 200, {"Cache-Control": CACHE_CONTROL["health"]}
 
 @app.before_request
 def log_request():
@@ -120,33 +157,22 @@ def get_trip_summary():
     """Returns combined mobility metrics (Optimized single-pass)"""
     try:
         from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
         filters = {
             "start_date": request.args.get('start_date'),
             "end_date": request.args.get('end_date'),
             "borough": request.args.get('borough', 'all'),
             "zone_id": request.args.get('zone_id')
         }
-        
-        # Cache Logic: Valid for 30 seconds
-        now = time.time()
-        if summary_cache["data"] and (now - summary_cache["timestamp"] < 30) and (summary_cache["filters"] == filters):
-            # Caching successful
-            return jsonify(summary_cache["data"])
 
         # Super-Aggregator pass
-        full_data = TripAggregator.get_global_summary(filters)
-        
-        # Merge summary with extra health metrics (choke points)
-        response_data = full_data['summary']
-        
-        # Update Cache
-        summary_cache.update({
-            "data": response_data,
-            "timestamp": now,
-            "filters": filters
-        })
-        
-        return jsonify(response_data)
+        approx = approx_requested()
+        return cached_response(
+            "panels", "global_summary", filters, lambda: TripAggregator.get_global_summary(filters, approx=approx),
+            approx, part='summary'
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -156,8 +182,11 @@ def get_congestion_report():
     try:
         from backend.logic.aggregators import TripAggregator
         # Call super-aggregator - it's fast now!
-        full_data = TripAggregator.get_global_summary({"borough": "all"})
-        return jsonify(full_data['congestion'])
+        filters = {"borough": "all"}
+        return cached_response(
+            "panels", "global_summary", filters, lambda: TripAggregator.get_global_summary(filters), False,
+            part='congestion'
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -166,14 +195,19 @@ def get_hourly_activity():
     """Returns trip volume and speed by hour for Rush Hour analysis"""
     try:
         from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
         filters = {
             "start_date": request.args.get('start_date'),
             "end_date": request.args.get('end_date'),
             "borough": request.args.get('borough', 'all'),
             "zone_id": request.args.get('zone_id')
         }
-        data = TripAggregator.get_hourly_stats(filters)
-        return jsonify(data)
+        approx = approx_requested()
+        return cached_response(
+            "panels", "hourly_stats", filters, lambda: TripAggregator.get_hourly_stats(filters, approx=approx), approx
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -182,14 +216,100 @@ def get_coverage_gaps():
     """Returns top 5 underserved zones (Filtered)"""
     try:
         from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
         filters = {
             "start_date": request.args.get('start_date'),
             "end_date": request.args.get('end_date'),
             "borough": request.args.get('borough', 'all'),
             "zone_id": request.args.get('zone_id')
         }
-        data = TripAggregator.get_coverage_gaps(filters)
-        return jsonify(data)
+        approx = approx_requested()
+        return cached_response(
+            "panels", "coverage_gaps", filters, lambda: TripAggregator.get_coverage_gaps(filters, approx=approx), approx
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/trips/quantiles', methods=['GET'])
+def get_trip_quantiles():
+    """Returns p50/p90/p99 of speed, fare and duration (merged quantile sketches)"""
+    try:
+        from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
+        filters = {
+            "start_date": request.args.get('start_date'),
+            "end_date": request.args.get('end_date'),
+            "borough": request.args.get('borough', 'all'),
+            "zone_id": request.args.get('zone_id')
+        }
+        return cached_response("panels", "quantiles", filters, lambda: TripAggregator.get_quantiles(filters))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Returns several panels for one filter set from shared scans (?panels=summary,hourly,gaps,revenue,...)"""
+    try:
+        from backend.logic.aggregators import TripAggregator
+        from backend.logic.dashboard import DASHBOARD_PANELS, DEFAULT_PANELS
+        invalid = date_error()
+        if invalid:
+            return invalid
+        filters = {
+            "start_date": request.args.get('start_date'),
+            "end_date": request.args.get('end_date'),
+            "borough": request.args.get('borough', 'all'),
+            "zone_id": request.args.get('zone_id')
+        }
+        requested = request.args.get('panels')
+        panels = [p.strip() for p in requested.split(',') if p.strip()] if requested else list(DEFAULT_PANELS)
+        unknown = [p for p in panels if p not in DASHBOARD_PANELS]
+        if unknown:
+            return jsonify({"error": f"Unknown panels: {', '.join(unknown)}. Choose from {', '.join(DASHBOARD_PANELS)}"}), 400
+        return cached_response(
+            "panels", "dashboard", filters, lambda: TripAggregator.get_dashboard(filters, panels),
+            tuple(sorted(set(panels)))
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/trips/export', methods=['GET'])
+def export_trips():
+    """
+    Raw trips for the date/borough/zone filters: ?format=csv|ndjson streams them in keyset batches (optional ?limit
+    caps the rows), ?format=json returns one page of ?limit rows with a next_cursor to pass back as ?cursor=
+    """
+    try:
+        from backend.logic.export import TripExporter, EXPORT_FORMATS, MAX_PAGE_SIZE, PAGE_SIZE
+        valid, message = RequestValidator.validate_export_params(request.args, EXPORT_FORMATS, MAX_PAGE_SIZE)
+        if not valid:
+            return jsonify({"error": message}), 400
+        filters = {
+            "start_date": request.args.get('start_date'),
+            "end_date": request.args.get('end_date'),
+            "borough": request.args.get('borough', 'all'),
+            "zone_id": request.args.get('zone_id')
+        }
+        fmt = request.args.get('format', 'csv')
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        try:
+            after_id = TripExporter.decode_cursor(cursor, filters) if cursor else 0
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        headers = {"Cache-Control": CACHE_CONTROL["export"]}
+        if fmt == 'json':
+            return jsonify(TripExporter.page(filters, cursor, limit or PAGE_SIZE)), 200, headers
+        headers["Content-Disposition"] = f"attachment; filename=trips.{fmt}"
+        return app.response_class(
+            stream_with_context(TripExporter.stream(fmt, filters, after_id, limit)),
+            mimetype=EXPORT_FORMATS[fmt], headers=headers
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -198,12 +318,18 @@ def get_borough_stats(borough):
     """Returns aggregated stats for a specific borough"""
     try:
         from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
         filters = {
             "start_date": request.args.get('start_date'),
             "end_date": request.args.get('end_date')
         }
-        data = TripAggregator.get_borough_stats(borough, filters)
-        return jsonify(data)
+        approx = approx_requested()
+        return cached_response(
+            "panels", "borough_stats", filters, lambda: TripAggregator.get_borough_stats(borough, filters, approx=approx),
+            borough, approx
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -212,153 +338,119 @@ def get_report():
     """Returns detailed diagnostic report data"""
     try:
         from backend.logic.aggregators import TripAggregator
+        invalid = date_error()
+        if invalid:
+            return invalid
         filters = {
             "start_date": request.args.get('start_date'),
             "end_date": request.args.get('end_date'),
             "borough": request.args.get('borough', 'all'),
             "zone_id": request.args.get('zone_id')
         }
-        data = TripAggregator.get_detailed_report(filters)
-        return jsonify(data)
+        return cached_response("report", "detailed_report", filters, lambda: TripAggregator.get_detailed_report(filters))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Precomputed map payloads, memoized per (level, format) and invalidated by etag
+zone_payload_cache = {}
+
 @app.route('/api/zones', methods=['GET'])
 def get_zones():
-    """Returns spatial data for the map"""
+    """
+    Returns spatial data for the map.
+    ?level=0..3 picks a simplification level (0 = full detail), ?format=geojson|topojson.
+    Serves the gzip payload precomputed by the ETL as-is; falls back to raw geometry if none exists.
+    """
     try:
-        # We can reuse the DAL or call it directly
-        from backend.dal.trip_dal import TripDAL
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'taxi_data.db')
-        dal = TripDAL(db_path)
-        
-        conn = sqlite3.connect(db_path, timeout=30)
-        cur = conn.cursor()
-        cur.execute("SELECT location_id, borough, zone, geojson FROM taxi_zones")
-        rows = cur.fetchall()
-        
-        zones = []
-        for r in rows:
-            zones.append({
-                "id": r[0],
-                "borough": r[1],
-                "zone": r[2],
-                "geometry": json.loads(r[3]) if r[3] else None
-            })
-        return jsonify(zones)
+        levels = [detail['level'] for detail in ZONE_DETAIL_LEVELS]
+        try:
+            level = int(request.args.get('level', 0))
+        except ValueError:
+            level = None
+        if level not in levels:
+            return jsonify({"error": f"level must be one of {', '.join(map(str, levels))}"}), 400
+        fmt = request.args.get('format', 'geojson')
+        if fmt not in ('geojson', 'topojson'):
+            return jsonify({"error": "format must be 'geojson' or 'topojson'"}), 400
+
+        conn = get_connection_pool().connect()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT etag FROM zone_payloads WHERE level = ? AND format = ?", (level, fmt))
+                row = cur.fetchone()
+            except sqlite3.OperationalError:
+                row = None # Database created before zone_payloads existed
+
+            if row:
+                etag = row[0]
+                cached = zone_payload_cache.get((level, fmt))
+                if not cached or cached[0] != etag:
+                    cur.execute("SELECT payload FROM zone_payloads WHERE level = ? AND format = ?", (level, fmt))
+                    cached = (etag, bytes(cur.fetchone()[0]))
+                    zone_payload_cache[(level, fmt)] = cached
+                return _zone_payload_response(*cached)
+
+            if fmt == 'topojson':
+                return jsonify({"error": "TopoJSON payloads have not been built; run the ETL pipeline"}), 404
+
+            # Legacy path: full-precision geometry, serialized once per zones_version
+            etag = ResponseCache.etag(DimensionCache.zones_version(cur), "zones")
+
+            def legacy_zones():
+                cur.execute("SELECT location_id, borough, zone, geojson FROM taxi_zones")
+                zones = []
+                for r in cur.fetchall():
+                    zones.append({
+                        "id": r[0],
+                        "borough": r[1],
+                        "zone": r[2],
+                        "geometry": json.loads(r[3]) if r[3] else None
+                    })
+                return zones
+
+            status, body, headers = response_cache.conditional(
+                etag, legacy_zones, CACHE_CONTROL["map"],
+                if_none_match=request.headers.get('If-None-Match'),
+                accept_encoding=request.headers.get('Accept-Encoding')
+            )
+        finally:
+            conn.close()
+        return app.response_class(body, status=status, headers=headers, mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _zone_payload_response(etag, payload):
+    """Stored gzip bytes go out untouched; only clients without gzip support get them inflated"""
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = app.response_class(status=304)
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = app.response_class(payload, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(gzip.decompress(payload), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = CACHE_CONTROL["map"]
+    response.set_etag(etag)
+    return response
+
 @app.route('/api/zones/<int:zone_id>/stats', methods=['GET'])
 def get_zone_stats(zone_id):
     """Returns detailed statistics for a specific zone"""
     try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'taxi_data.db')
-        conn = sqlite3.connect(db_path, timeout=30)
-        cur = conn.cursor()
-        
-        # Get zone info
-        cur.execute("SELECT zone, borough FROM taxi_zones WHERE location_id = ?", (zone_id,))
-        zone_info = cur.fetchone()
-        
-        if not zone_info:
-            return jsonify({"error": "Zone not found"}), 404
-        
-        zone_name, borough = zone_info
-        
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        where_clauses = ["pickup_location_id = ?"]
-        params = [zone_id]
-        
-        if start_date:
-            where_clauses.append("pickup_date >= ?")
-            params.append(start_date)
-        if end_date:
-            where_clauses.append("pickup_date <= ?")
-            params.append(end_date)
-        
-        where_str = f"WHERE {' AND '.join(where_clauses)}"
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) as trip_count,
-                AVG(trip_distance) as avg_distance,
-                AVG(speed_mph) as avg_speed,
-                AVG(fare_amount) as avg_fare,
-                AVG(trip_duration_seconds) as avg_duration,
-                SUM(passenger_count) as total_passengers
-            FROM trips
-            {where_str}
-        """, params)
-        
-        pickup_stats = cur.fetchone()
-        
-        do_where_clauses = ["dropoff_location_id = ?"]
-        do_params = [zone_id]
-        if start_date:
-            do_where_clauses.append("pickup_date >= ?")
-            do_params.append(start_date)
-        if end_date:
-            do_where_clauses.append("pickup_date <= ?")
-            do_params.append(end_date)
-        do_where_str = f"WHERE {' AND '.join(do_where_clauses)}"
-
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) as dropoff_count,
-                SUM(passenger_count) as dropoff_passengers
-            FROM trips
-            {do_where_str}
-        """, do_params)
-        
-        dropoff_res = cur.fetchone()
-        dropoff_count = dropoff_res[0] or 0
-        dropoff_passengers = dropoff_res[1] or 0
-        
-        b_where_clauses = ["z.borough = ?"]
-        b_params = [borough]
-        if start_date:
-            b_where_clauses.append("t.pickup_date >= ?")
-            b_params.append(start_date)
-        if end_date:
-            b_where_clauses.append("t.pickup_date <= ?")
-            b_params.append(end_date)
-        b_where_str = f"WHERE {' AND '.join(b_where_clauses)}"
-
-        cur.execute(f"""
-            SELECT AVG(t.speed_mph) as borough_avg_speed
-            FROM trips t
-            JOIN taxi_zones z ON t.pickup_location_id = z.location_id
-            {b_where_str}
-        """, b_params)
-        
-        borough_avg = cur.fetchone()[0] or 0
-        
-        # Calculate coverage ratio
-        pickup_count = pickup_stats[0] or 0
-        pickup_passengers = pickup_stats[5] or 0
-        coverage_ratio = round(dropoff_count / pickup_count, 2) if pickup_count > 0 else 0
-        
-        stats = {
-            "zone": zone_name,
-            "borough": borough,
-            "pickupCount": pickup_count,
-            "dropoffCount": dropoff_count,
-            "coverageRatio": coverage_ratio,
-            "pickupPassengers": pickup_passengers,
-            "dropoffPassengers": dropoff_passengers,
-            "totalPassengers": pickup_passengers + dropoff_passengers,
-            "avgDistance": round(pickup_stats[1], 2) if pickup_stats[1] else 0,
-            "avgSpeed": round(pickup_stats[2], 2) if pickup_stats[2] else 0,
-            "avgFare": round(pickup_stats[3], 2) if pickup_stats[3] else 0,
-            "avgDuration": round(pickup_stats[4] / 60, 1) if pickup_stats[4] else 0,  # Convert to minutes
-            "boroughAvgSpeed": round(borough_avg, 2),
-            "speedComparison": round(((pickup_stats[2] or 0) / borough_avg * 100) - 100, 1) if borough_avg > 0 else 0
+        invalid = date_error()
+        if invalid:
+            return invalid
+        filters = {
+            "start_date": request.args.get('start_date'),
+            "end_date": request.args.get('end_date')
         }
-        
-        conn.close()
-        return jsonify(stats)
-        
+        approx = approx_requested()
+        return cached_response(
+            "panels", "zone_stats", filters, lambda: TripAggregator.get_zone_stats(zone_id, filters, approx=approx),
+            zone_id, approx, missing="Zone not found"
+        )
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
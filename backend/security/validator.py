@@ -1,6 +1,8 @@
 # backend\security\validator.py
 # Request Validation Layer: Validates incoming API request parameters to ensure security and data integrity.
 
+import datetime
+
 class RequestValidator:
     """Security Layer: Validates incoming API request parameters"""
     
@@ -31,3 +33,45 @@ class RequestValidator:
         # 3. Future expansions: borough name validation against DB lookup
         
         return True, ""
+
+    @staticmethod
+    def validate_date_params(params):
+        """
+        Validates the start_date/end_date filters every aggregator endpoint takes.
+        Expected: YYYY-MM-DD (anything after the first 10 characters is ignored, as in TripAggregator.time_key_range)
+        """
+        for key in ('start_date', 'end_date'):
+            if params.get(key):
+                try:
+                    datetime.date.fromisoformat(params[key][:10])
+                except ValueError:
+                    return False, f"'{key}' must be a YYYY-MM-DD date."
+        return True, ""
+
+    @staticmethod
+    def validate_export_params(params, formats, max_page_size):
+        """
+        Validates parameters for the /api/trips/export endpoint.
+        Expected: format (one of formats), limit (positive int, at most max_page_size for JSON pages),
+        start_date/end_date (YYYY-MM-DD), zone_id (int)
+        """
+        fmt = params.get('format', 'csv')
+        if fmt not in formats:
+            return False, f"format must be one of {', '.join(formats)}."
+
+        if params.get('limit'):
+            try:
+                limit = int(params['limit'])
+            except ValueError:
+                return False, "'limit' must be an integer."
+            if limit < 1 or (fmt == 'json' and limit > max_page_size):
+                return False, f"'limit' must be between 1 and {max_page_size} for JSON pages." if fmt == 'json' else "'limit' must be positive."
+
+        valid, message = RequestValidator.validate_date_params(params)
+        if not valid:
+            return False, message
+
+        if params.get('zone_id') and not str(params['zone_id']).strip().isdigit():
+            return False, "'zone_id' must be an integer."
+
+        return True, ""
@@ -18,6 +18,8 @@ CREATE TABLE IF NOT EXISTS taxi_zones (
 );
 
 -- 3. Create Dimension: TIME_DIM
+-- Hour grain: time_id = hours since 1970-01-01 00:00, so a date range is an integer key range
+-- (day d covers d*24 .. d*24+23) and the ETL assigns keys without a lookup.
 CREATE TABLE IF NOT EXISTS time_dim (
     time_id INTEGER PRIMARY KEY AUTOINCREMENT,
     datetime TIMESTAMP NOT NULL,
@@ -26,7 +28,7 @@ CREATE TABLE IF NOT EXISTS time_dim (
     day_of_month INTEGER,
     month INTEGER,
     year INTEGER,
-    is_weekend BOOLEAN
+    is_weekend BOOLEAN -- day_of_week: Monday = 0 ... Sunday = 6
 );
 
 -- 4. Create Fact Table: TRIPS
@@ -76,13 +78,173 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- 7. Performance Indexes
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_location ON trips(pickup_location_id);
-CREATE INDEX IF NOT EXISTS idx_trips_dropoff_location ON trips(dropoff_location_id);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_time ON trips(pickup_time_id);
-CREATE INDEX IF NOT EXISTS idx_trips_payment_type ON trips(payment_type_id);
-CREATE INDEX IF NOT EXISTS idx_trips_speed ON trips(speed_mph);
-CREATE INDEX IF NOT EXISTS idx_trips_total_amount ON trips(total_amount);
+-- 7. ETL Bookkeeping: INGESTION_MANIFEST / INGESTION_CHUNKS / DATA_QUALITY
+-- One row per source file (fingerprint + resume point) and one row per committed chunk.
+-- The chunk's trip_id range lets a chunk be re-committed (or a changed file purged) idempotently.
+CREATE TABLE IF NOT EXISTS ingestion_manifest (
+    source_path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL, -- sha256 of the file contents
+    file_size INTEGER,
+    file_mtime REAL,
+    last_chunk INTEGER NOT NULL DEFAULT -1, -- index of the last committed chunk
+    rows_read INTEGER NOT NULL DEFAULT 0, -- source rows consumed (resume offset)
+    rows_loaded INTEGER NOT NULL DEFAULT 0, -- rows written to trips after cleaning
+    status TEXT NOT NULL DEFAULT 'in_progress', -- in_progress | complete
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ingestion_chunks (
+    source_path TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    first_trip_id INTEGER,
+    last_trip_id INTEGER,
+    row_count INTEGER NOT NULL,
+    committed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_path, chunk_index),
+    FOREIGN KEY (source_path) REFERENCES ingestion_manifest(source_path)
+);
+
+-- Per-chunk data-quality accounting: rows entering cleaning and the rows each rule rejected.
+-- A row failing several rules is counted by each of them.
+CREATE TABLE IF NOT EXISTS data_quality (
+    source_path TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    rule TEXT NOT NULL, -- name from TRIP_CLEANING_RULES in etl/processing/cleaner.py
+    rows_in INTEGER NOT NULL,
+    rejected INTEGER NOT NULL,
+    PRIMARY KEY (source_path, chunk_index, rule),
+    FOREIGN KEY (source_path) REFERENCES ingestion_manifest(source_path)
+);
+
+CREATE VIEW IF NOT EXISTS data_quality_by_file AS
+SELECT source_path, rule, SUM(rows_in) AS rows_in, SUM(rejected) AS rejected,
+       ROUND(100.0 * SUM(rejected) / MAX(SUM(rows_in), 1), 3) AS rejected_pct
+FROM data_quality
+GROUP BY source_path, rule;
+
+-- Small key/value state shared by the ETL and the API (e.g. rollups_ready = '1')
+CREATE TABLE IF NOT EXISTS etl_state (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 8. Map Payloads: ZONE_PAYLOADS
+-- Precomputed, gzip-compressed zone geometry per detail level and format (geojson | topojson),
+-- built by the ETL so /api/zones serves stored bytes without any per-request JSON work.
+CREATE TABLE IF NOT EXISTS zone_payloads (
+    level INTEGER NOT NULL, -- 0 = full detail, higher = more simplified
+    format TEXT NOT NULL,
+    tolerance REAL NOT NULL, -- Douglas-Peucker tolerance in degrees
+    raw_bytes INTEGER NOT NULL, -- uncompressed JSON size
+    payload BLOB NOT NULL, -- gzip-compressed JSON
+    etag TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (level, format)
+);
+
+-- 9. Rollups: TRIP_ROLLUPS
+-- Additive measures per (pickup zone, dropoff zone, pickup hour), maintained by the ETL in each chunk's
+-- transaction. Location 0 means "any": (pu, 0, t) rows are pickup-side totals, (0, do, t) dropoff-side totals.
+CREATE TABLE IF NOT EXISTS trip_rollups (
+    pickup_location_id INTEGER NOT NULL,
+    dropoff_location_id INTEGER NOT NULL,
+    pickup_time_id INTEGER NOT NULL, -- time_dim key (hour grain)
+    trip_count INTEGER NOT NULL DEFAULT 0,
+    fare_sum REAL NOT NULL DEFAULT 0,
+    revenue_sum REAL NOT NULL DEFAULT 0,
+    distance_sum REAL NOT NULL DEFAULT 0,
+    speed_sum REAL NOT NULL DEFAULT 0,
+    speed_count INTEGER NOT NULL DEFAULT 0, -- trips with a speed (outliers are stored as NULL)
+    passenger_sum INTEGER NOT NULL DEFAULT 0,
+    speed_anomalies INTEGER NOT NULL DEFAULT 0, -- speed_mph > 80
+    fare_anomalies INTEGER NOT NULL DEFAULT 0, -- trip_distance < 1 AND fare_amount > 100
+    f_speed_sum REAL NOT NULL DEFAULT 0, -- speed sum over speed_mph <= 80
+    f_speed_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (pickup_location_id, dropoff_location_id, pickup_time_id)
+) WITHOUT ROWID;
+
+-- Pickup-side rows are found by (0, time range) here; dropoff-side rows by the primary key prefix (0, dropoff zone)
+CREATE INDEX IF NOT EXISTS idx_rollups_pickup_side ON trip_rollups(dropoff_location_id, pickup_time_id);
+DROP INDEX IF EXISTS idx_rollups_dropoff_side;
+
+-- 10. Performance Indexes
+-- Composite, covering indexes for the aggregator query shapes (guarded by backend/dal/query_plans.py).
+-- Date-range queries seek on pickup_time_id, zone-scoped queries on (zone, pickup_time_id); either way every
+-- measure the aggregators read is in the index, so no trips row is visited.
+CREATE INDEX IF NOT EXISTS idx_trips_time_pickup_zone ON trips(
+    pickup_time_id, pickup_location_id, dropoff_location_id, pickup_hour, passenger_count,
+    trip_distance, speed_mph, fare_amount, total_amount, trip_duration_seconds
+);
+CREATE INDEX IF NOT EXISTS idx_trips_pickup_zone_time ON trips(
+    pickup_location_id, pickup_time_id, dropoff_location_id, pickup_hour, passenger_count,
+    trip_distance, speed_mph, fare_amount, total_amount, trip_duration_seconds
+);
+CREATE INDEX IF NOT EXISTS idx_trips_dropoff_zone_time ON trips(dropoff_location_id, pickup_time_id, passenger_count);
 CREATE INDEX IF NOT EXISTS idx_time_dim_hour ON time_dim(hour);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_date ON trips(pickup_date);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_hour ON trips(pickup_hour);
+-- Superseded by the composites above: the first three are their leading columns, and the planner
+-- preferred idx_trips_pickup_hour for unfiltered hourly stats, visiting every trips row
+DROP INDEX IF EXISTS idx_trips_pickup_location;
+DROP INDEX IF EXISTS idx_trips_dropoff_location;
+DROP INDEX IF EXISTS idx_trips_pickup_time;
+DROP INDEX IF EXISTS idx_trips_pickup_hour;
+-- No query filters or sorts on these columns, and each one was kept up to date on every ETL insert
+DROP INDEX IF EXISTS idx_trips_payment_type;
+DROP INDEX IF EXISTS idx_trips_speed;
+DROP INDEX IF EXISTS idx_trips_total_amount;
+DROP INDEX IF EXISTS idx_trips_pickup_date;
+
+-- 11. Stratified Sample: TRIP_SAMPLE_STRATA / TRIP_SAMPLE
+-- Up to N trips per (pickup zone, pickup day) stratum for the API's approx=true mode (logic/approx.py),
+-- maintained by the ETL once per loaded file or commit group. The sample of a stratum is its N trips with the smallest
+-- random sample_key (bottom-k), so merging a chunk's candidates into it keeps it a uniform sample; sample_rank
+-- orders them by key, which lets a query read fewer rows per stratum (logic/approx.py).
+-- Date and zone filters select whole strata, so trip counts come from population exactly; other measures
+-- are scaled by weight = population / sampled.
+CREATE TABLE IF NOT EXISTS trip_sample_strata (
+    pickup_location_id INTEGER NOT NULL,
+    day INTEGER NOT NULL, -- pickup_time_id / 24 (days since the epoch)
+    population INTEGER NOT NULL DEFAULT 0, -- trips in the stratum
+    sampled INTEGER NOT NULL DEFAULT 0, -- of which in trip_sample
+    PRIMARY KEY (pickup_location_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS trip_sample (
+    day INTEGER NOT NULL,
+    pickup_location_id INTEGER NOT NULL,
+    sample_rank INTEGER NOT NULL, -- 1 = smallest sample_key; any first m of a stratum are a uniform sample of m
+    sample_key INTEGER NOT NULL, -- random(); the stratum keeps its smallest keys
+    trip_id INTEGER NOT NULL,
+    dropoff_location_id INTEGER,
+    pickup_time_id INTEGER NOT NULL,
+    passenger_count INTEGER,
+    trip_distance REAL,
+    speed_mph REAL,
+    fare_amount REAL,
+    total_amount REAL,
+    trip_duration_seconds REAL,
+    weight REAL NOT NULL DEFAULT 1, -- stratum population / sampled
+    PRIMARY KEY (day, pickup_location_id, sample_rank)
+) WITHOUT ROWID;
+
+-- Single-zone approximate queries (pickup zone = strata, dropoff zone = a domain across strata), and the
+-- strata of a date range (exact pickup counts, rows per stratum under the row budget)
+CREATE INDEX IF NOT EXISTS idx_trip_sample_pickup_zone ON trip_sample(pickup_location_id, day);
+CREATE INDEX IF NOT EXISTS idx_trip_sample_dropoff_zone ON trip_sample(dropoff_location_id, day);
+CREATE INDEX IF NOT EXISTS idx_trip_sample_strata_day ON trip_sample_strata(day);
+
+-- 12. Quantile Sketches: TRIP_SKETCHES
+-- Log-bucket histograms of speed_mph, fare_amount and trip_duration_seconds per (pickup zone, pickup day),
+-- maintained by the ETL once per loaded file or commit group (bucket counts add and subtract like the rollup sums).
+-- The API merges the sketches of the strata a filter selects for p50/p90/p99 (logic/sketches.py).
+CREATE TABLE IF NOT EXISTS trip_sketches (
+    day INTEGER NOT NULL, -- pickup_time_id / 24 (days since the epoch)
+    pickup_location_id INTEGER NOT NULL,
+    measure TEXT NOT NULL, -- 'speed' | 'fare' | 'duration'
+    value_count INTEGER NOT NULL, -- trips with a value (NULL speeds are not counted)
+    buckets BLOB NOT NULL, -- int32 (bucket, count) pairs of the non-empty buckets
+    PRIMARY KEY (day, pickup_location_id, measure)
+);
+
+-- Single-zone percentiles read one zone's days
+CREATE INDEX IF NOT EXISTS idx_trip_sketches_zone ON trip_sketches(pickup_location_id, day);
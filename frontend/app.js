@@ -38,6 +38,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Initialize Map
     const map = L.map('map').setView([40.7128, -74.0060], 11);
+    const ZONE_DETAIL_LEVEL = 2; // Zoom 11-12 band, see ZONE_DETAIL_LEVELS in zone_simplifier.py
     L.tileLayer('https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png', {
         attribution: '&copy; OpenStreetMap &copy; CARTO'
     }).addTo(map);
@@ -126,49 +127,51 @@ document.addEventListener('DOMContentLoaded', () => {
             const resp = await fetch(url);
             if (!resp.ok) throw new Error(`API Error: ${resp.status}`);
 
-            const data = await resp.json();
+            renderSummary(await resp.json());
+        } catch (err) {
+            console.error('Error fetching summary:', err);
+        }
+    }
 
-            // Update metrics
-            const healthElem = document.getElementById('systemHealth');
-            const speedElem = document.getElementById('avgMobilitySpeed');
-            const anomaliesElem = document.getElementById('totalAnomalies');
-            const tripsElem = document.getElementById('totalTripsHeader');
-            const passengersElem = document.getElementById('totalPassengersHeader');
-
-            healthElem.textContent = `${data.systemHealth || 0}%`;
-            speedElem.textContent = `${data.avgMobilitySpeed || 0} MPH`;
-            anomaliesElem.textContent = (data.totalAnomalies || 0).toLocaleString();
-            tripsElem.textContent = (data.totalTrips || 0).toLocaleString();
-            passengersElem.textContent = (data.totalPassengers || 0).toLocaleString();
-
-            // Handle No-Data feedback
-            const noDataAlert = document.getElementById('noDataAlert');
-            if (data.totalTrips === 0) {
-                noDataAlert.classList.remove('hidden');
-            } else {
-                noDataAlert.classList.add('hidden');
-            }
+    function renderSummary(data) {
+        // Update metrics
+        const healthElem = document.getElementById('systemHealth');
+        const speedElem = document.getElementById('avgMobilitySpeed');
+        const anomaliesElem = document.getElementById('totalAnomalies');
+        const tripsElem = document.getElementById('totalTripsHeader');
+        const passengersElem = document.getElementById('totalPassengersHeader');
+
+        healthElem.textContent = `${data.systemHealth || 0}%`;
+        speedElem.textContent = `${data.avgMobilitySpeed || 0} MPH`;
+        anomaliesElem.textContent = (data.totalAnomalies || 0).toLocaleString();
+        tripsElem.textContent = (data.totalTrips || 0).toLocaleString();
+        passengersElem.textContent = (data.totalPassengers || 0).toLocaleString();
+
+        // Handle No-Data feedback
+        const noDataAlert = document.getElementById('noDataAlert');
+        if (data.totalTrips === 0) {
+            noDataAlert.classList.remove('hidden');
+        } else {
+            noDataAlert.classList.add('hidden');
+        }
 
-            // Populate Anomaly Tooltip
-            if (data.anomalyDetails) {
-                document.getElementById('speedAnomCount').textContent = data.anomalyDetails.speed.toLocaleString();
-                document.getElementById('fareAnomCount').textContent = data.anomalyDetails.fare.toLocaleString();
-            }
+        // Populate Anomaly Tooltip
+        if (data.anomalyDetails) {
+            document.getElementById('speedAnomCount').textContent = data.anomalyDetails.speed.toLocaleString();
+            document.getElementById('fareAnomCount').textContent = data.anomalyDetails.fare.toLocaleString();
+        }
 
-            [healthElem, speedElem, anomaliesElem, tripsElem, passengersElem].forEach(el => {
-                const card = el.closest('.stat-card');
-                if (card) card.classList.remove('loading');
-            });
+        [healthElem, speedElem, anomaliesElem, tripsElem, passengersElem].forEach(el => {
+            const card = el.closest('.stat-card');
+            if (card) card.classList.remove('loading');
+        });
 
-            // Add a "Diagnostic Status" check
-            const healthCard = healthElem.closest('.stat-card');
-            if (data.systemHealth < 95) {
-                healthCard.style.color = '#ff7b72'; // Warning red
-            } else {
-                healthCard.style.color = '#3fb950'; // Healthy green
-            }
-        } catch (err) {
-            console.error('Error fetching summary:', err);
+        // Add a "Diagnostic Status" check
+        const healthCard = healthElem.closest('.stat-card');
+        if (data.systemHealth < 95) {
+            healthCard.style.color = '#ff7b72'; // Warning red
+        } else {
+            healthCard.style.color = '#3fb950'; // Healthy green
         }
     }
 
@@ -198,7 +201,8 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log("🗺️ Loading Diagnostic Maps...");
         loadingState.classList.remove('hidden');
         try {
-            const resp = await fetch(`${API_BASE}/zones`);
+            // Simplified geometry for the overview zoom band (precomputed and gzip-served by the API)
+            const resp = await fetch(`${API_BASE}/zones?level=${ZONE_DETAIL_LEVEL}`);
             if (!resp.ok) throw new Error(`API Error: ${resp.status}`);
 
             const zones = await resp.json();
@@ -296,15 +300,18 @@ document.addEventListener('DOMContentLoaded', () => {
             if (activeZoneId) url.searchParams.append('zone_id', activeZoneId);
 
             const resp = await fetch(url);
-            const gaps = await resp.json();
-            console.log("Economic Gaps Updated:", gaps);
-            gapZones = gaps;
-
-            // Trigger map refresh to apply new gap highlights
-            updateMapFilter();
+            applyCoverageGaps(await resp.json());
         } catch (err) { console.error("Error loading coverage gaps:", err); }
     }
 
+    function applyCoverageGaps(gaps) {
+        console.log("Economic Gaps Updated:", gaps);
+        gapZones = gaps;
+
+        // Trigger map refresh to apply new gap highlights
+        updateMapFilter();
+    }
+
     // Update Map Styling and View based on Filter
     function updateMapFilter() {
         if (!geoLayer) return;
@@ -362,54 +369,56 @@ document.addEventListener('DOMContentLoaded', () => {
             if (activeZoneId) url.searchParams.append('zone_id', activeZoneId);
 
             const resp = await fetch(url);
-            const data = await resp.json();
+            renderHourlyChart(await resp.json());
+        } catch (err) {
+            console.error('Error loading hourly chart:', err);
+        } finally {
+            chartLoadingOverlay.classList.add('hidden');
+        }
+    }
 
-            const chartStatus = Chart.getChart("mainChart");
-            if (chartStatus !== undefined) chartStatus.destroy();
+    function renderHourlyChart(data) {
+        const chartStatus = Chart.getChart("mainChart");
+        if (chartStatus !== undefined) chartStatus.destroy();
 
-            const ctx = document.getElementById('mainChart').getContext('2d');
+        const ctx = document.getElementById('mainChart').getContext('2d');
 
-            // Peak hour identification (Rush Hour)
-            const hours = Object.keys(data);
-            const counts = Object.values(data).map(d => d.trips);
-            const maxVal = Math.max(...counts);
+        // Peak hour identification (Rush Hour)
+        const hours = Object.keys(data);
+        const counts = Object.values(data).map(d => d.trips);
+        const maxVal = Math.max(...counts);
 
-            new Chart(ctx, {
-                type: 'bar',
-                data: {
-                    labels: hours.map(h => `${h}:00`),
-                    datasets: [{
-                        label: 'Trip Volume',
-                        data: counts,
-                        backgroundColor: counts.map(c => c === maxVal && c > 0 ? '#f0883e' : '#58a6ff'),
-                        borderRadius: 4
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        legend: { display: false },
-                        tooltip: {
-                            callbacks: {
-                                label: (context) => {
-                                    const hour = context.label.split(':')[0];
-                                    const speed = data[hour].speed;
-                                    return [`Trips: ${context.raw}`, `Avg Speed: ${speed} MPH` + (speed < 5 && context.raw > 0 ? ' (⚠️ Congested)' : '')];
-                                }
+        new Chart(ctx, {
+            type: 'bar',
+            data: {
+                labels: hours.map(h => `${h}:00`),
+                datasets: [{
+                    label: 'Trip Volume',
+                    data: counts,
+                    backgroundColor: counts.map(c => c === maxVal && c > 0 ? '#f0883e' : '#58a6ff'),
+                    borderRadius: 4
+                }]
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    legend: { display: false },
+                    tooltip: {
+                        callbacks: {
+                            label: (context) => {
+                                const hour = context.label.split(':')[0];
+                                const speed = data[hour].speed;
+                                return [`Trips: ${context.raw}`, `Avg Speed: ${speed} MPH` + (speed < 5 && context.raw > 0 ? ' (⚠️ Congested)' : '')];
                             }
                         }
-                    },
-                    scales: {
-                        y: { beginAtZero: true, grid: { color: 'rgba(255,255,255,0.1)' } },
-                        x: { grid: { display: false } }
                     }
+                },
+                scales: {
+                    y: { beginAtZero: true, grid: { color: 'rgba(255,255,255,0.1)' } },
+                    x: { grid: { display: false } }
                 }
-            });
-        } catch (err) {
-            console.error('Error loading hourly chart:', err);
-        } finally {
-            chartLoadingOverlay.classList.add('hidden');
-        }
+            }
+        });
     }
 
     async function loadChart() {
@@ -474,20 +483,51 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // One /api/dashboard request for the summary cards, coverage gaps and (on the rush-hour tab) the hourly
+    // chart, computed server-side from shared scans; falls back to the per-panel endpoints if it fails
+    async function refreshPanels() {
+        const rushHour = activeTab === 'rush-hour';
+        // The congestion chart comes from its own citywide endpoint
+        const congestionChart = rushHour ? null : loadChart();
+        if (rushHour) chartLoadingOverlay.classList.remove('hidden');
+        try {
+            const startDate = startDateInput.value;
+            const endDate = endDateInput.value;
+            const borough = boroughFilter.value;
+
+            const url = new URL(`${API_BASE}/dashboard`);
+            url.searchParams.append('panels', rushHour ? 'summary,gaps,hourly' : 'summary,gaps');
+            if (startDate) url.searchParams.append('start_date', startDate);
+            if (endDate) url.searchParams.append('end_date', endDate);
+            if (borough !== 'all') url.searchParams.append('borough', borough);
+            if (activeZoneId) url.searchParams.append('zone_id', activeZoneId);
+
+            const resp = await fetch(url);
+            if (!resp.ok) throw new Error(`API Error: ${resp.status}`);
+            const bundle = await resp.json();
+            console.log("Dashboard timings (ms):", bundle.timings);
+
+            renderSummary(bundle.panels.summary);
+            applyCoverageGaps(bundle.panels.gaps);
+            if (rushHour) renderHourlyChart(bundle.panels.hourly);
+        } catch (err) {
+            console.error('Error loading dashboard bundle:', err);
+            await Promise.all([updateSummary(), loadCoverageGaps(), rushHour ? loadHourlyChart() : null]);
+        } finally {
+            if (rushHour) chartLoadingOverlay.classList.add('hidden');
+        }
+        await congestionChart;
+    }
+
     const refreshDashboard = debounce(() => {
-        const p1 = updateSummary();
-        const p2 = loadChart();
-        const p3 = loadCoverageGaps();
-        Promise.all([p1, p2, p3]).then(() => console.log("✨ Dashboard Refresh Complete"));
+        refreshPanels().then(() => console.log("✨ Dashboard Refresh Complete"));
     }, 400);
 
     startDateInput.addEventListener('change', refreshDashboard);
     endDateInput.addEventListener('change', refreshDashboard);
 
     boroughFilter.addEventListener('change', () => {
-        updateSummary();
-        loadChart();
-        loadCoverageGaps();
+        refreshPanels();
         updateMapFilter();
     });
 
@@ -0,0 +1,25 @@
+# tests\conftest.py
+# Shared test setup: the backend reads TAXI_DB_PATH when it is first imported, so it is pointed at a throwaway
+# database here, before any test module imports it. The database is seeded once per session.
+
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix="taxi-tests-")
+os.environ["TAXI_DB_PATH"] = os.path.join(TEST_DIR, "taxi_test.db")
+
+
+@pytest.fixture(scope="session")
+def seeded_db():
+    """Schema, 263 zones and a month of synthetic trips, with rollups and sketches built (see dal/query_plans.py)"""
+    from backend.dal.query_plans import seed_database
+
+    seed_database(os.environ["TAXI_DB_PATH"], trips=20000)
+    yield os.environ["TAXI_DB_PATH"]
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
@@ -0,0 +1,35 @@
+# tests\test_columnar_parity.py
+# The NumPy columnar backend must answer every metric exactly as the SQL backend does (logic/columnar.py).
+
+import pytest
+
+from backend.logic.aggregators import TripAggregator
+from backend.logic.columnar import parity_differences, parity_queries
+
+ZONE_IDS = [1, 2, 12, 161, 999] # Known zones, and one that does not exist
+QUERIES = parity_queries(ZONE_IDS)
+
+
+@pytest.fixture
+def backend_switch(seeded_db):
+    """Runs a call on a given backend, restoring the default afterwards"""
+    def run(backend, call):
+        TripAggregator.backend = backend
+        try:
+            return call()
+        finally:
+            TripAggregator.backend = 'sql'
+    return run
+
+
+@pytest.mark.parametrize("label,call", QUERIES, ids=[label for label, _ in QUERIES])
+def test_columnar_matches_sql(backend_switch, label, call):
+    expected = backend_switch('sql', call)
+    actual = backend_switch('columnar', call)
+    assert parity_differences(expected, actual) == []
+
+
+def test_columnar_store_loads_every_trip(backend_switch):
+    store = backend_switch('columnar', TripAggregator.columnar_engine)
+    summary = backend_switch('sql', lambda: TripAggregator.get_global_summary({"borough": "all"}))
+    assert len(store.time) == summary["summary"]["totalTrips"] > 0
@@ -0,0 +1,11 @@
+# tests\test_query_plans.py
+# EXPLAIN QUERY PLAN regression check (dal/query_plans.py): every aggregator query shape, on the rollups and on
+# the trips fallback, must stay within the plans its SHAPES entry declares.
+
+from backend.dal.query_plans import FILTERS, SHAPES, run_checks
+
+
+def test_no_query_plan_regressions(seeded_db):
+    checked, failures = run_checks(seeded_db)
+    assert checked >= len(SHAPES) * len(FILTERS) * 2 # At least one statement per shape, filter and fact source
+    assert failures == [], "\n".join(failures)